@@ -24,5 +24,5 @@ setup(name='waymarkedtrails-api',
                 'wmt_api.api.slopes',
                 'wmt_api.output'
                ],
-      python_requires = ">=3.6",
+      python_requires = ">=3.11",
       )
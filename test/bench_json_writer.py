@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Microbenchmark for the JSON writer.
+
+Usage: PYTHONPATH=. python test/bench_json_writer.py
+"""
+import timeit
+
+from wmt_api.common.json_writer import JsonWriter
+
+GEOMETRY = '{"type":"LineString","coordinates":[%s]}'\
+           % ','.join(f'[{i * 10.5:.2f},{i * 7.25:.2f}]' for i in range(20))
+
+def route_list(num=100):
+    out = JsonWriter().start_object().keyval('bbox', [1.0, 2.0, 3.0, 4.0])
+    out.key('results').start_array()
+    for i in range(num):
+        out.start_object()\
+           .keyval('type', 'relation')\
+           .keyval('id', 100000 + i)\
+           .keyval('name', f'Wanderweg Nr. {i} – Höhenweg')\
+           .keyval('group', 'REG')\
+           .keyval('itinerary', ['Start', 'Mitte', 'Ziel'])\
+           .keyval_not_none('ref', str(i))\
+           .keyval('symbol_id', f'swiss_{i}')\
+           .end_object().next()
+    return out.end_array().end_object().as_bytes()
+
+
+def feature_collection(num=2000):
+    out = JsonWriter().start_object().keyval('type', 'FeatureCollection')
+    out.key('features').start_array()
+    for i in range(num):
+        out.start_object()\
+           .keyval('type', 'Feature')\
+           .key('geometry').raw(GEOMETRY).next()\
+           .keyval('id', i)\
+           .key('properties').start_object()\
+               .keyval('type', 'way')\
+               .keyval('top_relations', [i, i + 1])\
+               .keyval('child_relations', [])\
+               .keyval('style', 'foo')\
+           .end_object()\
+        .end_object().next()
+    return out.end_array().end_object().as_bytes()
+
+
+def main():
+    for func in (route_list, feature_collection):
+        num, total = timeit.Timer(func).autorange()
+        print(f"{func.__name__:20} {total / num * 1000:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
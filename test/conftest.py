@@ -5,6 +5,7 @@
 import asyncio
 import os
 import itertools
+import types
 
 import pytest
 import falcon
@@ -24,20 +25,33 @@ def mapname(request):
 
 
 @pytest.fixture()
-def context(mapname, event_loop):
+def api_settings():
+    """ Settings that overwrite the API configuration. Tests can change them
+        by parametrizing this fixture.
+    """
+    return {}
+
+
+@pytest.fixture()
+def context(mapname, api_settings, event_loop):
     url = sa.engine.url.URL.create('postgresql+psycopg', database=TEST_DATABASE)
     context = Context(mapname, url=url)
 
+    if api_settings:
+        settings = dict(vars(context.api_config)) if context.api_config else {}
+        settings.update(api_settings)
+        context.api_config = types.SimpleNamespace(**settings)
+
     yield context
 
-    event_loop.run_until_complete(context.engine.dispose())
+    event_loop.run_until_complete(context.dispose())
 
 
 @pytest.fixture
 def wmt_call(context):
     app = create_app(context)
     async def _get(url, params=None, expect_success=True, as_json=True,
-                   headers={}):
+                   headers={}, as_bytes=False, as_response=False):
         async with testing.ASGIConductor(app) as conductor:
             response = await conductor.simulate_get(url, params=params, headers=headers)
             if expect_success:
@@ -47,10 +61,15 @@ def wmt_call(context):
                 assert response.json is not None,\
                        f"Response is not valid json: {response.text}"
 
+            if as_response:
+                return response.status, response
+
             if response.status_code >=300 and response.status_code < 400:
                 out_text = response.headers['location']
             elif as_json:
                 out_text = response.json
+            elif as_bytes:
+                out_text = response.content
             else:
                 out_text = response.text
 
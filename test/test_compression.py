@@ -0,0 +1,172 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import gzip
+
+import aiofiles
+import pytest
+import falcon
+import falcon.asgi
+import falcon.testing
+
+from wmt_api.common.compression import CompressionMiddleware, GzipEncoder, choose_encoder
+
+BODY = b'{"features": [%s]}' % b','.join([b'{"type": "Feature"}'] * 200)
+
+
+class Resource:
+
+    def __init__(self):
+        self.calls = 0
+
+    async def on_get(self, req, resp):
+        self.calls += 1
+        resp.data = BODY
+        resp.context.cache_key = 'body'
+
+    async def on_get_etag(self, req, resp):
+        resp.etag = 'abc'
+        if 'abc' in (req.if_none_match or ()):
+            resp.status = falcon.HTTP_NOT_MODIFIED
+        else:
+            resp.data = BODY
+
+    async def on_get_small(self, req, resp):
+        resp.text = '{}'
+
+    async def on_get_png(self, req, resp):
+        resp.content_type = 'image/png'
+        resp.data = BODY
+
+    async def on_get_stream(self, req, resp):
+        async def _chunks():
+            for i in range(3):
+                yield BODY
+
+        resp.content_type = falcon.MEDIA_JSON
+        resp.stream = _chunks()
+
+
+@pytest.fixture
+def middleware():
+    return CompressionMiddleware(min_size=100)
+
+
+@pytest.fixture
+def client(middleware):
+    app = falcon.asgi.App(middleware=[middleware])
+    resource = Resource()
+    app.add_route('/', resource)
+    app.add_route('/etag', resource, suffix='etag')
+    app.add_route('/small', resource, suffix='small')
+    app.add_route('/png', resource, suffix='png')
+    app.add_route('/stream', resource, suffix='stream')
+
+    return falcon.testing.ASGIConductor(app)
+
+
+@pytest.mark.parametrize('header,encoding', [(None, None),
+                                             ('', None),
+                                             ('gzip', 'gzip'),
+                                             ('deflate, gzip;q=0.5', 'gzip'),
+                                             ('gzip;q=0', None),
+                                             ('identity', None),
+                                             ('*', 'gzip'),
+                                             ('*, gzip;q=0', None)])
+def test_choose_encoder(header, encoding):
+    encoder = choose_encoder(header, encoders=[GzipEncoder])
+
+    assert (encoder and encoder.name) == encoding
+
+
+@pytest.mark.asyncio
+async def test_compress_gzip(client):
+    async with client as conductor:
+        response = await conductor.simulate_get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.content) == BODY
+
+
+@pytest.mark.asyncio
+async def test_no_accept_encoding(client):
+    async with client as conductor:
+        response = await conductor.simulate_get('/')
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.content == BODY
+
+
+@pytest.mark.parametrize('url', ['/small', '/png'])
+@pytest.mark.asyncio
+async def test_not_compressed(client, url):
+    async with client as conductor:
+        response = await conductor.simulate_get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_compressed_body_is_cached(client, middleware):
+    async with client as conductor:
+        first = await conductor.simulate_get('/', headers={'Accept-Encoding': 'gzip'})
+        assert len(middleware.cache) == 1
+        second = await conductor.simulate_get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert first.content == second.content
+    assert len(middleware.cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_compress_stream(client):
+    async with client as conductor:
+        response = await conductor.simulate_get('/stream',
+                                                headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.content) == BODY * 3
+
+
+@pytest.mark.parametrize('encoding', [None, 'gzip'])
+@pytest.mark.asyncio
+async def test_etag_is_weak(client, encoding):
+    headers = {} if encoding is None else {'Accept-Encoding': encoding}
+    async with client as conductor:
+        response = await conductor.simulate_get('/etag', headers=headers)
+        assert response.headers['ETag'] == 'W/"abc"'
+
+        headers['If-None-Match'] = response.headers['ETag']
+        response = await conductor.simulate_get('/etag', headers=headers)
+
+    assert response.status == falcon.HTTP_NOT_MODIFIED
+    assert response.headers['ETag'] == 'W/"abc"'
+    assert 'Content-Encoding' not in response.headers
+
+
+
+@pytest.mark.asyncio
+async def test_compress_file_stream(tmp_path):
+    content = b''.join(b'<path d="M %d 0"/>\n' % i for i in range(10000))
+    (tmp_path / 'large.svg').write_bytes(content)
+
+    class FileResource:
+        async def on_get(self, req, resp):
+            resp.content_type = 'image/svg+xml'
+            resp.set_stream(await aiofiles.open(tmp_path / 'large.svg', 'rb'), len(content))
+
+    app = falcon.asgi.App(middleware=[CompressionMiddleware()])
+    app.add_route('/', FileResource())
+
+    async with falcon.testing.ASGIConductor(app) as conductor:
+        response = await conductor.simulate_get('/', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        assert gzip.decompress(response.content) == content
+        assert len(response.content) < len(content) / 4
+
+        response = await conductor.simulate_get('/')
+        assert response.headers['Content-Length'] == str(len(content))
+        assert response.content == content
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import types
+
+import sqlalchemy as sa
+
+from wmt_api.common.context import Context
+
+def _url(dbname):
+    return sa.engine.url.URL.create('postgresql+psycopg', database=dbname)
+
+
+def test_shared_engine():
+    engines = {}
+    hiking = Context('hiking', url=_url('test_wmt_api'), engines=engines)
+    slopes = Context('slopes', url=_url('test_wmt_api'), engines=engines)
+
+    assert hiking.engine is slopes.engine
+    assert len(engines) == 1
+
+
+def test_shared_engine_has_one_pool_statistics():
+    engines = {}
+    hiking = Context('hiking', url=_url('test_wmt_api'), engines=engines)
+    slopes = Context('slopes', url=_url('test_wmt_api'), engines=engines)
+
+    assert hiking.pool_statistics is slopes.pool_statistics
+    assert sa.event.contains(hiking.engine.sync_engine, 'connect',
+                             hiking.pool_statistics._on_connect)
+
+
+def test_different_pool_settings_do_not_share_engine(monkeypatch):
+    monkeypatch.setattr(Context, 'get_setting',
+                        lambda self, name, default=None:
+                            20 if self.mapname == 'hiking' and name == 'DB_POOL_SIZE'
+                            else default)
+    engines = {}
+    hiking = Context('hiking', url=_url('test_wmt_api'), engines=engines)
+    slopes = Context('slopes', url=_url('test_wmt_api'), engines=engines)
+
+    assert hiking.engine is not slopes.engine
+    assert hiking.engine.sync_engine.pool.size() == 20
+    assert slopes.engine.sync_engine.pool.size() == 5
+
+
+def test_separate_engines():
+    hiking = Context('hiking', url=_url('test_wmt_api'))
+    slopes = Context('slopes', url=_url('test_wmt_api'))
+
+    assert hiking.engine is not slopes.engine
+
+
+def test_different_databases_do_not_share_engine():
+    engines = {}
+    hiking = Context('hiking', url=_url('test_wmt_api'), engines=engines)
+    cycling = Context('cycling', url=_url('test_wmt_api_other'), engines=engines)
+
+    assert hiking.engine is not cycling.engine
+    assert len(engines) == 2
+
+
+def test_lazy_map_objects():
+    context = Context('hiking', url=_url('test_wmt_api'))
+
+    assert 'db' not in vars(context)
+    assert 'shield_factory' not in vars(context)
+
+    assert context.db is context.db
+    assert 'db' in vars(context)
+
+
+def test_statement_timeout_per_route():
+    context = Context('hiking', url=_url('test_wmt_api'))
+    context.api_config = types.SimpleNamespace(
+                            STATEMENT_TIMEOUTS={'/v1/list/by_area': 5})
+
+    assert context.statement_timeout('/v1/list/by_area') == 5
+    assert context.statement_timeout('/hiking/v1/list/by_area') == 5
+    assert context.statement_timeout('/v1/list/by_ids') is None
+    assert context.statement_timeout(None) is None
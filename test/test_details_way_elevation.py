@@ -64,6 +64,14 @@ async def test_relation_elevation(wmt_call, simple_route):
     check_elevation_response(
         (await wmt_call(f'/v1/details/relation/{simple_route}/way-elevation'))[1])
 
+@pytest.mark.parametrize("mapname", ["hiking"], indirect=True)
+async def test_relation_elevation_repeated(wmt_call, simple_route):
+    # The second request uses the cached raster blocks.
+    _, first = await wmt_call(f'/v1/details/relation/{simple_route}/way-elevation')
+    _, second = await wmt_call(f'/v1/details/relation/{simple_route}/way-elevation')
+
+    assert first == second
+
 @pytest.mark.parametrize("mapname", ["hiking"], indirect=True)
 async def test_relation_elevation_unknown(wmt_call, simple_route):
     status, _ = await wmt_call('/v1/details/relation/111/way-elevation', expect_success=False)
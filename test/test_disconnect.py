@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+
+import pytest
+import falcon.asgi
+import falcon.testing
+
+from wmt_api.common.disconnect import CancelOnDisconnect
+
+
+class Resource:
+
+    def __init__(self):
+        self.cancelled = False
+
+    async def on_get(self, req, resp):
+        resp.text = '{}'
+
+    async def on_get_slow(self, req, resp):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        resp.text = '{}'
+
+
+@pytest.fixture
+def resource():
+    return Resource()
+
+
+@pytest.fixture
+def app(resource):
+    app = falcon.asgi.App()
+    app.add_route('/', resource)
+    app.add_route('/slow', resource, suffix='slow')
+
+    return CancelOnDisconnect(app)
+
+
+@pytest.mark.asyncio
+async def test_normal_request(app):
+    async with falcon.testing.ASGIConductor(app) as conductor:
+        resp = await conductor.simulate_get('/')
+
+    assert resp.status_code == 200
+    assert resp.text == '{}'
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect(app, resource):
+    disconnect = asyncio.Event()
+    events = []
+
+    async def receive():
+        if not events:
+            events.append('request')
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(event):
+        events.append(event['type'])
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+             'method': 'GET', 'path': '/slow', 'query_string': b'', 'headers': []}
+
+    task = asyncio.create_task(app(scope, receive, send))
+    await asyncio.sleep(0.1)
+    disconnect.set()
+    await asyncio.wait_for(task, 1)
+
+    assert resource.cancelled
+    assert events == ['request']
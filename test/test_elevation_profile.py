@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+
+import numpy
+import pytest
+
+from scipy.ndimage import map_coordinates
+
+from wmt_api.output.elevation import simplify_profile, smooth_and_fill_list,\
+                                    compute_elevation_profile, open_dem
+
+TRANSFORM = [1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0]
+
+
+def reference_profile(xs, ys, eles, step, total, max_segment_len, max_deviation=5):
+    """ Point-by-point simplification as originally implemented.
+    """
+    max_steps = int(max_segment_len/step)
+    start = None
+    start_ele = None
+
+    for i, x, y, ele in zip(range(len(xs)), xs, ys, eles):
+        ele = float(ele)
+        if start is None:
+            start = 0
+            start_ele = ele
+            yield {'x': round(x, 2), 'y': round(y, 2), 'ele': int(ele), 'pos': 0}
+        else:
+            is_last = i == len(xs) - 1
+            if is_last or i >= start + max_steps or \
+               numpy.max(numpy.abs(numpy.linspace(start_ele, ele, i - start + 1)
+                                    - eles[start:i + 1])) > max_deviation:
+                start = i
+                start_ele = ele
+                yield {'x': round(x, 2), 'y': round(y, 2), 'ele': int(ele),
+                       'pos': round(total if is_last else i * step, 2)}
+
+
+def random_profile(rng, num):
+    return numpy.cumsum(rng.normal(0, rng.uniform(0.1, 4), num)) + 500
+
+
+def reference_indices(eles, max_steps):
+    return [p['x'] for p in reference_profile(list(range(len(eles))), [0] * len(eles),
+                                              eles, 1, len(eles) - 1, max_steps)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('max_steps', [0, 1, 2, 7, 50, 1000])
+def test_simplify_matches_reference(seed, max_steps):
+    rng = numpy.random.default_rng(seed)
+    eles = random_profile(rng, int(rng.integers(2, 3000)))
+
+    assert simplify_profile(eles, 5, max_steps) == reference_indices(eles, max_steps)
+
+
+@pytest.mark.parametrize('eles', [[100.0], [100.0, 300.0], [100.0] * 20,
+                                  [0.0, 10.0, 0.0, 10.0, 0.0], list(range(0, 200, 3))])
+def test_simplify_special_profiles(eles):
+    eles = numpy.array(eles)
+
+    assert simplify_profile(eles, 5, 10) == reference_indices(eles, 10)
+
+
+@pytest.fixture
+def dem_file(tmp_path):
+    rng = numpy.random.default_rng(42)
+    data = numpy.cumsum(numpy.cumsum(rng.integers(-3, 4, (100, 200)), axis=0), axis=1)
+    numpy.save(tmp_path / 'dem.npy', (data + 1000).astype(numpy.int16))
+    (tmp_path / 'dem.json').write_text(json.dumps({'transform': TRANSFORM,
+                                                   'nodata': -32768}))
+    return tmp_path / 'dem.npy'
+
+
+def reference_segment(dem_file, bounds, xs, ys, length, step, max_segment_len):
+    band, xmax, ymin, xmin, ymax = open_dem(dem_file).raster_array(bounds)
+    ny, nx = band.shape
+    xi = (nx - 1) * (numpy.clip(xs, xmin, xmax) - xmin) / (xmax - xmin)
+    yi = -(ny - 1) * (numpy.clip(ys, ymin, ymax) - ymax) / (ymax - ymin)
+    eles = smooth_and_fill_list(map_coordinates(band, [yi, xi], order=1, output=float))
+
+    return list(reference_profile(xs, ys, eles, step, length, max_segment_len)), eles
+
+
+@pytest.mark.parametrize('step,max_segment_len', [(2.0, 500), (5.0, 50), (1.5, 1), (3, 400)])
+def test_profile_matches_reference(dem_file, step, max_segment_len):
+    bounds = (1100, 4100, 2900, 4900)
+    num = 1200
+    xs = [float(x) for x in numpy.linspace(1105.0, 2895.0, num)]
+    ys = [float(y) for y in 4500 + 350 * numpy.sin(numpy.linspace(0, 6, num))]
+
+    profile = compute_elevation_profile(dem_file, bounds,
+                                        [{'sid': 1, 'length': 4711.3, 'x': xs, 'y': ys}],
+                                        step=step, max_segment_len=max_segment_len)
+
+    expected, eles = reference_segment(dem_file, bounds, xs, ys, 4711.3,
+                                       step, max_segment_len)
+    assert profile['segments'] == {'1': {'elevation': expected}}
+    assert profile['min_elevation'] == int(eles.min())
+    assert profile['max_elevation'] == int(eles.max())
+
+
+def test_profile_at_raster_edge(dem_file):
+    # The route starts outside the elevation model.
+    xs = [float(x) for x in numpy.linspace(900.0, 1400.0, 101)]
+    ys = [4500.0] * 101
+    profile = compute_elevation_profile(dem_file, (900, 4500, 1400, 4500),
+                                        [{'sid': 1, 'length': 500.0, 'x': xs, 'y': ys}],
+                                        step=5, max_segment_len=500)
+
+    inside = numpy.load(dem_file)[50, :41]
+    assert inside.min() - 5 <= profile['min_elevation'] <= inside.max()
+    assert inside.min() <= profile['max_elevation'] <= inside.max() + 5
+    assert all(inside.min() - 5 <= p['ele'] <= inside.max() + 5
+               for p in profile['segments']['1']['elevation'])
+
+
+def test_profile_with_nodata(dem_file, tmp_path):
+    data = numpy.load(dem_file)
+    data[40:60, 90:110] = -32768
+    numpy.save(tmp_path / 'holes.npy', data)
+    (tmp_path / 'holes.json').write_text((tmp_path / 'dem.json').read_text())
+
+    xs = [float(x) for x in numpy.linspace(1500.0, 2500.0, 201)]
+    ys = [4500.0] * 201
+    profile = compute_elevation_profile(tmp_path / 'holes.npy', (1500, 4500, 2500, 4500),
+                                        [{'sid': 1, 'length': 1000.0, 'x': xs, 'y': ys}],
+                                        step=5, max_segment_len=500)
+
+    valid = data[50, 50:151]
+    valid = valid[valid != -32768]
+    assert valid.min() - 5 <= profile['min_elevation']
+    assert profile['max_elevation'] <= valid.max() + 5
+
+
+def test_profile_outside_raster(dem_file):
+    profile = compute_elevation_profile(dem_file, (100, 100, 200, 100),
+                                        [{'sid': 1, 'length': 100.0,
+                                          'x': [100.0, 200.0], 'y': [100.0, 100.0]}],
+                                        step=50, max_segment_len=500)
+
+    assert profile == {'min_elevation': None, 'max_elevation': None, 'segments': {}}
@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+from types import SimpleNamespace
+
+import pytest
+import falcon
+import falcon.asgi
+import falcon.testing
+import sqlalchemy as sa
+
+from wmt_api.common.errors import APIError, QUERY_CANCELED
+from wmt_api.output.geojson import stream_geojson_response
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_row(i):
+    return SimpleNamespace(geometry='{"type":"Point","coordinates":[%d,0]}' % i,
+                           _mapping={'id': i, 'geometry': None})
+
+
+def query_canceled():
+    return sa.exc.DBAPIError('SELECT', {}, SimpleNamespace(sqlstate=QUERY_CANCELED))
+
+
+class FakeResult:
+
+    def __init__(self, num, fail_after):
+        self.num = num
+        self.fail_after = fail_after
+
+    async def partitions(self, size):
+        for start in range(0, self.num, size):
+            if start >= self.fail_after:
+                raise query_canceled()
+            yield [make_row(i) for i in range(start, min(start + size, self.num))]
+
+
+class FakeConnection:
+
+    def __init__(self, result):
+        self.result = result
+        self.closed = False
+
+    async def stream(self, sql):
+        return self.result
+
+    async def close(self):
+        self.closed = True
+
+
+class Resource:
+
+    def __init__(self, num, fail_after=None):
+        self.conn = FakeConnection(FakeResult(num, num if fail_after is None else fail_after))
+
+    async def connect(self, read_only=False, statement_timeout=None):
+        return self.conn
+
+    async def on_get(self, req, resp):
+        await stream_geojson_response(self, None, resp, chunk_size=10)
+
+
+async def api_error_handler(req, resp, exception, _):
+    resp.status = exception.status
+    resp.media = {'error': exception.msg}
+
+
+def make_app(resource):
+    app = falcon.asgi.App()
+    app.add_error_handler(APIError, api_error_handler)
+    app.add_route('/', resource)
+    return falcon.testing.ASGIConductor(app)
+
+
+@pytest.mark.parametrize('num', [0, 5, 10, 25])
+async def test_stream(num):
+    resource = Resource(num)
+    async with make_app(resource) as conductor:
+        resp = await conductor.simulate_get('/')
+
+    assert resp.status_code == 200
+    assert [f['id'] for f in json.loads(resp.text)['features']] == list(range(num))
+    assert resource.conn.closed
+
+
+async def test_stream_timeout_before_start():
+    resource = Resource(25, fail_after=0)
+    async with make_app(resource) as conductor:
+        resp = await conductor.simulate_get('/')
+
+    assert resp.status_code == 504
+    assert resp.json == {'error': 'Query took too long.'}
+    assert resource.conn.closed
+
+
+async def test_stream_timeout_after_start():
+    resource = Resource(25, fail_after=10)
+    async with make_app(resource) as conductor:
+        # The error escapes, so that the server aborts the connection.
+        with pytest.raises(sa.exc.DBAPIError):
+            await conductor.simulate_get('/')
+
+    assert resource.conn.closed
@@ -0,0 +1,112 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+import math
+from decimal import Decimal
+
+import pytest
+import falcon
+
+from wmt_api.common.json_writer import JsonWriter
+
+
+def test_empty_object():
+    assert JsonWriter().start_object().end_object()() == '{}'
+
+
+def test_empty_array():
+    assert JsonWriter().start_array().end_array()() == '[]'
+
+
+def test_nested_structures():
+    out = JsonWriter().start_object()\
+                      .keyval('name', 'Föhn / Tour')\
+                      .keyval('ids', [1, 2])\
+                      .key('sub').start_array()\
+                          .start_object().keyval('a', None).end_object().next()\
+                          .value(4.5).next()\
+                      .end_array().next()\
+                      .keyval_not_none('missing', None)\
+                      .keyval_not_none('level', 3, transform=lambda x: x * 10)\
+                    .end_object()
+
+    assert json.loads(out()) == {'name': 'Föhn / Tour', 'ids': [1, 2],
+                                 'sub': [{'a': None}, 4.5], 'level': 30}
+
+
+def test_output_is_utf8():
+    out = JsonWriter().start_array().value('Zürich').next().end_array()
+
+    assert out.as_bytes() == '["Zürich"]'.encode('utf-8')
+    assert out() == '["Zürich"]'
+
+
+@pytest.mark.parametrize('raw', ['{"x": 1}', b'{"x": 1}'])
+def test_raw_str_and_bytes(raw):
+    out = JsonWriter().start_object().key('geom').raw(raw).next().end_object()
+
+    assert json.loads(out()) == {'geom': {'x': 1}}
+
+
+def test_float_precision():
+    out = JsonWriter().start_array().float(1.23456, 2).next().end_array()
+
+    assert out() == '[1.23]'
+
+
+def test_non_string_dict_keys():
+    out = JsonWriter().value({1: 'a'})
+
+    assert json.loads(out()) == {'1': 'a'}
+
+
+def test_decimal_values():
+    out = JsonWriter().start_array().value(Decimal('1.50')).next()\
+                      .value({'ele': Decimal('345')}).end_array()
+
+    assert json.loads(out()) == [1.5, {'ele': 345.0}]
+
+
+@pytest.mark.parametrize('value,expected', [(float('nan'), 'NaN'),
+                                            (float('inf'), 'Infinity'),
+                                            (-float('inf'), '-Infinity')])
+def test_nonfinite_floats(value, expected):
+    assert JsonWriter().value(value)() == expected
+
+
+def test_nonfinite_floats_in_containers():
+    out = JsonWriter().value({'a': [1.0, float('nan')], 'b': None})
+
+    data = json.loads(out())
+    assert data['a'][0] == 1.0
+    assert math.isnan(data['a'][1])
+    assert data['b'] is None
+
+
+def test_raw_writer_output():
+    inner = JsonWriter().start_object().keyval('a', 1).end_object()
+
+    out = JsonWriter().start_object().key('inner').raw(inner()).next().end_object()
+
+    assert json.loads(out()) == {'inner': {'a': 1}}
+
+
+def test_flush():
+    out = JsonWriter().start_array()
+    chunks = []
+    for i in range(3):
+        out.value(i).next()
+        chunks.append(out.flush())
+    chunks.append(out.end_array().as_bytes())
+
+    assert b''.join(chunks) == b'[0,1,2]'
+
+
+def test_to_response():
+    resp = falcon.Response()
+    JsonWriter().start_object().keyval('a', 'ä').end_object().to_response(resp)
+
+    assert resp.status == 200
+    assert resp.data == '{"a":"ä"}'.encode('utf-8')
@@ -5,6 +5,7 @@
 import asyncio
 
 import pytest
+import sqlalchemy as sa
 
 pytestmark = [pytest.mark.parametrize("mapname", ["hiking"], indirect=True),
               pytest.mark.asyncio]
@@ -37,6 +38,26 @@ async def test_by_area_empty(wmt_call, simple_routes):
     assert len(data['results']) == 0
 
 
+@pytest.mark.parametrize('api_settings', [{'STATEMENT_TIMEOUTS': {'/v1/list/by_area': 5,
+                                                                  '/v1/list/segments': 5}}])
+async def test_by_area_with_statement_timeout(wmt_call, context, simple_routes):
+    _, data = await wmt_call('/v1/list/by_area', params={'bbox': '1, 1, 50, 50'})
+
+    assert len(data['results']) == 2
+
+    _, data = await wmt_call('/v1/list/segments',
+                             params={'bbox': '50, 50, 1, 1', 'relations':'1,3'})
+
+    assert len(data['features']) == 1
+
+    # The timeout must not stick to the connection in the pool.
+    conn = await context.connect()
+    try:
+        assert await conn.scalar(sa.text('SHOW statement_timeout')) == '0'
+    finally:
+        await conn.close()
+
+
 async def test_byids(wmt_call, simple_routes):
     _, data = await wmt_call('/v1/list/by_ids', params={'relations': '3,4,5'})
 
@@ -95,3 +95,14 @@ async def test_segments(wmt_call, simple_routes):
                                      'ways': '100,102', 'waysets': '100'})
 
     assert len(data['features']) == 4
+
+
+@pytest.mark.parametrize('params,num_features', [({'waysets': '100'}, 1),
+                                                 ({'ways': '100,101,102'}, 3),
+                                                 ({}, 0)])
+async def test_segments_single_type(wmt_call, simple_routes, params, num_features):
+    _, data = await wmt_call('/v1/list/segments',
+                             params={'bbox': '50, 50, 1, 1', **params})
+
+    assert data['type'] == 'FeatureCollection'
+    assert len(data['features']) == num_features
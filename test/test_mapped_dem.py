@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+
+import numpy
+import pytest
+
+from wmt_api.output.elevation import MappedDem, open_dem, compute_elevation_profile
+
+TRANSFORM = [1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0]
+
+
+@pytest.fixture
+def dem_file(tmp_path):
+    data = numpy.arange(200 * 100, dtype=numpy.int16).reshape(100, 200)
+    numpy.save(tmp_path / 'dem.npy', data)
+    (tmp_path / 'dem.json').write_text(json.dumps({'transform': TRANSFORM,
+                                                   'nodata': -32768}))
+    return tmp_path / 'dem.npy'
+
+
+def test_open_dem_is_shared(dem_file):
+    dem = open_dem(dem_file)
+
+    assert isinstance(dem, MappedDem)
+    assert open_dem(dem_file) is dem
+
+
+def test_raster_array_inside(dem_file):
+    dem = MappedDem(str(dem_file))
+
+    band, xmin, ymin, xmax, ymax = dem.raster_array((1100, 4800, 1200, 4900))
+
+    assert isinstance(band, numpy.memmap)
+    assert band.shape == (11, 11)
+    assert band[0, 0] == 10 * 200 + 10
+    assert (xmin, ymin, xmax, ymax) == (1200, 4800, 1100, 4900)
+
+
+def test_raster_array_partly_outside(dem_file):
+    dem = MappedDem(str(dem_file))
+
+    band, *_ = dem.raster_array((950, 4950, 1020, 5020))
+
+    assert band.shape == (8, 8)
+    assert numpy.isnan(band[0, 0])
+    assert numpy.isnan(band[:2, :]).all()
+    assert numpy.isnan(band[:, :5]).all()
+    assert band[2, 5] == 0
+    assert band[7, 7] == 5 * 200 + 2
+
+
+def test_compute_elevation_profile(dem_file):
+    ways = [{'sid': 12, 'length': 100.0,
+             'x': [1010.0, 1020.0, 1030.0, 1040.0, 1050.0, 1060.0, 1070.0, 1080.0, 1090.0, 1100.0],
+             'y': [4990.0, 4980.0, 4970.0, 4960.0, 4950.0, 4940.0, 4930.0, 4920.0, 4910.0, 4900.0]}]
+
+    profile = compute_elevation_profile(dem_file, (1010, 4900, 1100, 4990), ways,
+                                        step=10, max_segment_len=100)
+
+    assert profile['min_elevation'] <= profile['max_elevation']
+    assert list(profile['segments']) == ['12']
+    assert profile['segments']['12']['elevation'][0]['pos'] == 0
+
+
+def test_raster_array_nodata(tmp_path):
+    data = numpy.arange(20 * 10, dtype=numpy.int16).reshape(10, 20)
+    data[3:5, 4:7] = -9999
+    numpy.save(tmp_path / 'dem.npy', data)
+    (tmp_path / 'dem.json').write_text(json.dumps({'transform': TRANSFORM,
+                                                   'nodata': -9999}))
+
+    dem = MappedDem(str(tmp_path / 'dem.npy'))
+
+    # Windows inside the raster are not copied and keep the nodata value.
+    band, *_ = dem.raster_array((1000, 4910, 1190, 5000))
+
+    assert isinstance(band, numpy.memmap)
+    assert (band[3:5, 4:7] == -9999).all()
+
+    # Windows crossing the edge mark missing data as NaN.
+    band, *_ = dem.raster_array((1000, 4910, 1200, 5000))
+
+    assert band.shape == (10, 21)
+    assert numpy.isnan(band[3:5, 4:7]).all()
+    assert numpy.isnan(band[:, 20]).all()
+    assert numpy.isnan(band).sum() == 16
+    assert band[0, 0] == 0
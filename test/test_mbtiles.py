@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+import sqlite3
+import types
+
+import pytest
+
+from wmt_api.common.mbtiles import MBTiles
+from wmt_api.common.tile_cache import TileCache
+
+@pytest.fixture
+def store(tmp_path):
+    store = MBTiles(tmp_path / 'test.mbtiles', 'hiking', 'json')
+    yield store
+    store.close()
+
+
+def test_empty_store(store):
+    assert store.get_version() is None
+    assert store.get('2025-01-01', 12, 1, 2) is None
+
+
+def test_put_and_get(store):
+    assert store.put('2025-01-01', [(12, 1, 2, b'abc'), (12, 1, 3, b'def')])
+
+    assert store.get_version() == '2025-01-01'
+    assert store.get('2025-01-01', 12, 1, 2) == b'abc'
+    assert store.contains('2025-01-01', 12, 1, 3)
+    assert not store.contains('2025-01-01', 12, 1, 4)
+
+
+def test_missing(store):
+    store.put('2025-01-01', [(12, 1, 2, b'abc'), (12, 1, 3, b'def')])
+
+    assert store.missing('2025-01-01', [(12, 1, 2), (12, 1, 4), (12, 1, 3)]) == [(12, 1, 4)]
+    assert store.missing('2025-01-02', [(12, 1, 2)]) == [(12, 1, 2)]
+
+
+def test_get_other_version(store):
+    store.put('2025-01-01', [(12, 1, 2, b'abc')])
+
+    assert store.get('2025-01-02', 12, 1, 2) is None
+    assert store.get('2024-12-31', 12, 1, 2) is None
+
+
+def test_put_newer_version(store):
+    store.put('2025-01-01', [(12, 1, 2, b'abc')])
+    store.put('2025-01-02', [(12, 5, 5, b'new')])
+
+    assert store.get_version() == '2025-01-02'
+    assert store.get('2025-01-02', 12, 1, 2) is None
+    assert store.get('2025-01-02', 12, 5, 5) == b'new'
+
+
+def test_put_older_version(store):
+    store.put('2025-01-02', [(12, 1, 2, b'abc')])
+
+    assert not store.put('2025-01-01', [(12, 1, 2, b'old')])
+    assert store.get('2025-01-02', 12, 1, 2) == b'abc'
+
+
+def test_tms_row_order(store, tmp_path):
+    store.put('2025-01-01', [(12, 1, 0, b'abc')])
+
+    conn = sqlite3.connect(str(tmp_path / 'test.mbtiles'))
+    assert conn.execute('SELECT tile_row FROM tiles').fetchall() == [(4095, )]
+    conn.close()
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_opens_store_once(tmp_path):
+    settings = {'TILE_CACHE_DIR': str(tmp_path)}
+    context = types.SimpleNamespace(mapname='hiking',
+                                    get_setting=lambda name, default=None:
+                                                    settings.get(name, default))
+    cache = TileCache(context)
+
+    stores = await asyncio.gather(*(cache.get_store('json') for _ in range(3)))
+
+    assert stores[0] is stores[1] is stores[2]
+    assert await cache.get_store('json') is stores[0]
+    assert (tmp_path / 'hiking-json.mbtiles').exists()
+
+    stores[0].close()
@@ -0,0 +1,121 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import types
+
+import pytest
+import falcon.asgi
+import falcon.testing
+
+from wmt_api.common.access import InternalAccess
+from wmt_api.common.metrics import Histogram, MetricsMiddleware, measure
+
+
+class Resource:
+
+    async def on_get(self, req, resp, oid):
+        with measure('work'):
+            resp.text = '{"id": %d}' % oid
+
+
+@pytest.fixture
+def middleware():
+    return MetricsMiddleware()
+
+
+@pytest.fixture
+def client(middleware):
+    app = falcon.asgi.App(middleware=[middleware])
+    app.add_route('/item/{oid:int}', Resource())
+    app.add_route('/metrics', middleware)
+
+    return falcon.testing.ASGIConductor(app)
+
+
+def test_histogram_prometheus_format():
+    hist = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        hist.observe(value)
+
+    lines = []
+    hist.write_prometheus(lines, 'test_value', 'route="/x"')
+
+    assert lines == ['test_value_bucket{route="/x",le="1.0"} 2',
+                     'test_value_bucket{route="/x",le="10.0"} 3',
+                     'test_value_bucket{route="/x",le="+Inf"} 4',
+                     'test_value_sum{route="/x"} 56.5',
+                     'test_value_count{route="/x"} 4']
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(client):
+    resp = await client.simulate_get('/item/3')
+
+    assert resp.status_code == 200
+    timing = resp.headers['server-timing']
+    assert timing.startswith('db;dur=0.0;desc="0 queries", work;dur=')
+    assert ', total;dur=' in timing
+
+
+@pytest.mark.asyncio
+async def test_statistics_per_route_template(client, middleware):
+    for oid in range(3):
+        await client.simulate_get(f'/item/{oid}')
+
+    stats = middleware.endpoints['/item/{oid:int}']
+    assert stats.duration.count == 3
+    assert stats.queries.count == 3
+    assert stats.response_size.sum == 3 * len('{"id": 0}')
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint(client):
+    await client.simulate_get('/item/1')
+    resp = await client.simulate_get('/metrics')
+
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('text/plain')
+    assert '# TYPE wmt_request_duration_seconds histogram' in resp.text
+    assert 'wmt_request_duration_seconds_count{route="/item/{oid:int}"} 1' in resp.text
+    assert 'wmt_response_size_bytes_bucket{route="/item/{oid:int}",le="+Inf"} 1' in resp.text
+
+
+@pytest.mark.asyncio
+async def test_shared_pools_are_reported_once():
+    shared = types.SimpleNamespace(wait_time=Histogram())
+    shared.wait_time.observe(0.1)
+    contexts = [types.SimpleNamespace(mapname='hiking', pool_statistics=shared),
+                types.SimpleNamespace(mapname='cycling', pool_statistics=shared),
+                types.SimpleNamespace(mapname='slopes',
+                                      pool_statistics=types.SimpleNamespace(wait_time=Histogram()))]
+    middleware = MetricsMiddleware(contexts)
+    app = falcon.asgi.App()
+    app.add_route('/metrics', middleware)
+
+    resp = await falcon.testing.ASGIConductor(app).simulate_get('/metrics')
+
+    assert 'wmt_pool_wait_seconds_count{maps="hiking,cycling"} 1' in resp.text
+    assert 'wmt_pool_wait_seconds_count{maps="slopes"} 0' in resp.text
+    assert resp.text.count('wmt_pool_wait_seconds_count') == 2
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint_is_internal(client):
+    resp = await client.simulate_get('/metrics', remote_addr='203.0.113.5')
+
+    assert resp.status_code == 403
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('auth,status', [('Bearer secret', 200),
+                                         ('Bearer wrong', 403), (None, 403)])
+async def test_prometheus_endpoint_token(auth, status):
+    middleware = MetricsMiddleware(access=InternalAccess(networks=[], token='secret'))
+    app = falcon.asgi.App()
+    app.add_route('/metrics', middleware)
+
+    resp = await falcon.testing.ASGIConductor(app).simulate_get(
+                    '/metrics', headers={} if auth is None else {'Authorization': auth})
+
+    assert resp.status_code == status
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+import time
+import types
+from datetime import datetime, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from wmt_api.common.replicas import ReplicaSet
+
+pytestmark = pytest.mark.asyncio
+
+DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+STATUS = sa.Table('status', sa.MetaData(),
+                  sa.Column('part', sa.Text), sa.Column('date', sa.DateTime))
+
+
+class FakeEngine:
+    """ Engine of a database with the given state: an update date,
+        an exception raised on connect or a coroutine function
+        returning the date.
+    """
+
+    def __init__(self, url, state):
+        self.url = url
+        self.state = state
+        self.sync_engine = types.SimpleNamespace(pool=None)
+
+    def connect(self):
+        if isinstance(self.state, Exception):
+            raise self.state
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def scalar(self, _):
+        if callable(self.state):
+            return await self.state()
+        return self.state
+
+
+def make_replicas(primary, replicas, **kwargs):
+    context = types.SimpleNamespace(
+                engine=FakeEngine('primary', primary),
+                create_engine=lambda url, **_: FakeEngine(url, replicas[url]),
+                db=types.SimpleNamespace(status=types.SimpleNamespace(table=STATUS)))
+
+    return ReplicaSet(context, list(replicas), **kwargs)
+
+
+async def test_usable_replicas():
+    replicas = make_replicas(DATE, {'r1': DATE, 'r2': None, 'r3': OSError('unreachable')})
+
+    assert [e.url for e in await replicas.engines()] == ['r1']
+
+
+async def test_stale_replica():
+    replicas = make_replicas(DATE, {'r1': datetime(2024, 12, 31, tzinfo=timezone.utc)})
+
+    assert await replicas.engines() == []
+
+
+async def test_checks_run_in_background():
+    release = asyncio.Event()
+
+    async def _slow():
+        await release.wait()
+        return DATE
+
+    replicas = make_replicas(DATE, {'r1': DATE}, check_interval=0)
+    assert len(await replicas.engines()) == 1
+
+    replicas.replicas[0].engine.state = _slow
+    start = time.monotonic()
+    assert len(await asyncio.wait_for(replicas.engines(), 1)) == 1
+    assert time.monotonic() - start < 0.5
+
+    release.set()
+    await replicas.close()
+
+
+async def test_primary_error_keeps_state():
+    replicas = make_replicas(DATE, {'r1': DATE})
+    assert len(await replicas.engines()) == 1
+
+    replicas.context.engine.state = RuntimeError('primary broken')
+    replicas.replicas[0].engine.state = None
+    await replicas.check()
+
+    assert len(await replicas.engines()) == 1
+
+
+async def test_primary_error_on_first_check():
+    replicas = make_replicas(RuntimeError('primary broken'), {'r1': DATE})
+
+    assert await replicas.engines() == []
+
+
+async def test_hanging_replica_times_out():
+    async def _hang():
+        await asyncio.sleep(10)
+
+    replicas = make_replicas(DATE, {'r1': _hang, 'r2': DATE}, connect_timeout=0.1)
+
+    start = time.monotonic()
+    assert [e.url for e in await replicas.engines()] == ['r2']
+    assert time.monotonic() - start < 1
@@ -0,0 +1,99 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import os
+from datetime import datetime, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from wmt_api.common.context import Context
+
+pytestmark = [pytest.mark.parametrize("mapname", ["hiking"], indirect=True),
+              pytest.mark.asyncio]
+
+REPLICA_DATABASE = 'test_wmt_api_replica'
+
+def _url(dbname):
+    return sa.engine.url.URL.create('postgresql+psycopg', database=dbname)
+
+
+@pytest.fixture
+def replica(context):
+    assert os.system('dropdb --if-exists ' + REPLICA_DATABASE) == 0
+    assert os.system('createdb ' + REPLICA_DATABASE) == 0
+
+    engine = sa.create_engine(sa.engine.url.URL.create('postgresql',
+                                                       database=REPLICA_DATABASE))
+    with engine.begin() as conn:
+        conn.execute(sa.text(f"CREATE SCHEMA {context.db.site_config.DB_SCHEMA}"))
+    context.db.status.create(engine)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        yield conn
+
+    engine.dispose()
+
+
+@pytest.fixture
+def replica_context(mapname, context, db, event_loop):
+    replica_context = Context(mapname, url=context.engine.url,
+                              replicas=[_url(REPLICA_DATABASE)])
+
+    yield replica_context
+
+    event_loop.run_until_complete(replica_context.dispose())
+
+
+async def _current_database(context):
+    conn = await context.connect(read_only=True)
+    try:
+        return await conn.scalar(sa.text('SELECT current_database()'))
+    finally:
+        await conn.close()
+
+
+async def test_replica_is_used(replica_context, conn, status_table, replica):
+    date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    status_table.set_status(conn, 'base', date, 1)
+    status_table.set_status(replica, 'base', date, 1)
+
+    assert await _current_database(replica_context) == REPLICA_DATABASE
+
+
+async def test_stale_replica_is_not_used(replica_context, conn, status_table, replica):
+    status_table.set_status(conn, 'base', datetime(2025, 1, 2, tzinfo=timezone.utc), 2)
+    status_table.set_status(replica, 'base', datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+
+    assert await _current_database(replica_context) == replica_context.engine.url.database
+
+
+async def test_replica_without_data_is_not_used(replica_context, conn, status_table, replica):
+    status_table.set_status(conn, 'base', datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+
+    assert await _current_database(replica_context) == replica_context.engine.url.database
+
+
+async def test_unreachable_replica_is_not_used(mapname, context, conn, status_table):
+    status_table.set_status(conn, 'base', datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+    replica_context = Context(mapname, url=context.engine.url,
+                              replicas=[_url('test_wmt_api_doesnotexist')])
+
+    try:
+        assert await _current_database(replica_context) == context.engine.url.database
+    finally:
+        await replica_context.dispose()
+
+
+async def test_write_connections_use_primary(replica_context, conn, status_table, replica):
+    date = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    status_table.set_status(conn, 'base', date, 1)
+    status_table.set_status(replica, 'base', date, 1)
+
+    primary = await replica_context.connect()
+    try:
+        assert await primary.scalar(sa.text('SELECT current_database()'))\
+                 == replica_context.engine.url.database
+    finally:
+        await primary.close()
@@ -0,0 +1,122 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+
+import pytest
+
+from wmt_api.common.mbtiles import MBTiles
+from wmt_api.common.types import MAPWIDTH, Tile
+from wmt_api.seed import Seeder, bbox_from_lonlat
+
+
+class FakeTileAPI:
+
+    def __init__(self):
+        self.rendered = []
+
+    async def render_tile(self, tile, fmt):
+        self.rendered.append((tile.zoom, tile.x, tile.y))
+        return f'{fmt}:{tile.zoom}/{tile.x}/{tile.y}'.encode('utf-8')
+
+
+class FailingTileAPI:
+
+    async def render_tile(self, tile, fmt):
+        await asyncio.sleep(0.01)
+        raise RuntimeError('render failed')
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MBTiles(tmp_path / 'test.mbtiles', 'hiking', 'json')
+    yield store
+    store.close()
+
+
+def test_bbox_from_lonlat():
+    bbox = bbox_from_lonlat(-180, -90, 180, 90)
+
+    assert bbox.minx == pytest.approx(-MAPWIDTH)
+    assert bbox.maxx == pytest.approx(MAPWIDTH)
+    assert bbox.miny == pytest.approx(-MAPWIDTH, rel=1e-4)
+    assert bbox.maxy == pytest.approx(MAPWIDTH, rel=1e-4)
+
+
+def test_bbox_from_lonlat_swapped_corners():
+    bbox = bbox_from_lonlat(10, 48, 9, 47)
+
+    assert bbox.minx == pytest.approx(9 * MAPWIDTH / 180)
+    assert bbox.maxx == pytest.approx(10 * MAPWIDTH / 180)
+    assert 5900000 < bbox.miny < bbox.maxy < 6200000
+
+
+def test_bbox_tiles_match_tile_bbox():
+    bbox = bbox_from_lonlat(9.1, 47.1, 9.2, 47.2)
+
+    tiles = list(bbox.tiles(12))
+
+    assert len(tiles) == 6
+    for tile in tiles:
+        assert tile.bbox.minx < bbox.maxx and tile.bbox.maxx > bbox.minx
+        assert tile.bbox.miny < bbox.maxy and tile.bbox.maxy > bbox.miny
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('jobs', [1, 3])
+async def test_seeder(store, jobs):
+    api = FakeTileAPI()
+    tiles = [Tile(12, x, y) for x in range(10) for y in range(25)]
+
+    seeder = Seeder(api, store, 'json', '2025-01-01')
+    await seeder.run(tiles, jobs)
+
+    assert seeder.done == 250
+    assert seeder.skipped == 0
+    assert sorted(api.rendered) == sorted((t.zoom, t.x, t.y) for t in tiles)
+    assert store.get('2025-01-01', 12, 3, 7) == b'json:12/3/7'
+
+
+@pytest.mark.asyncio
+async def test_seeder_skips_existing_tiles(store):
+    store.put('2025-01-01', [(12, 1, 1, b'old'), (12, 2, 2, b'old')])
+    api = FakeTileAPI()
+
+    seeder = Seeder(api, store, 'json', '2025-01-01')
+    await seeder.run([Tile(12, x, x) for x in range(4)], 2)
+
+    assert seeder.skipped == 2
+    assert sorted(api.rendered) == [(12, 0, 0), (12, 3, 3)]
+    assert store.get('2025-01-01', 12, 1, 1) == b'old'
+
+
+@pytest.mark.asyncio
+async def test_seeder_rerenders_old_version(store):
+    store.put('2025-01-01', [(12, 1, 1, b'old')])
+    api = FakeTileAPI()
+
+    seeder = Seeder(api, store, 'json', '2025-01-02')
+    await seeder.run([Tile(12, 1, 1)], 1)
+
+    assert seeder.skipped == 0
+    assert store.get('2025-01-02', 12, 1, 1) == b'json:12/1/1'
+
+
+@pytest.mark.asyncio
+async def test_seeder_refuses_older_version(store):
+    store.put('2025-01-02', [(12, 1, 1, b'new')])
+
+    with pytest.raises(RuntimeError):
+        await Seeder(FakeTileAPI(), store, 'json', '2025-01-01').run([Tile(12, 0, 0)], 1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('jobs,num', [(1, 5), (2, 100)])
+async def test_seeder_fails_when_workers_die(store, jobs, num):
+    # With 5 tiles and one worker, the queue is full when the end
+    # markers are added.
+    seeder = Seeder(FailingTileAPI(), store, 'json', '2025-01-01')
+
+    with pytest.raises(RuntimeError, match='render failed'):
+        await asyncio.wait_for(seeder.run([Tile(12, x, 0) for x in range(num)], jobs), 5)
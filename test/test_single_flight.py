@@ -0,0 +1,105 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+
+import pytest
+
+from wmt_api.common.router import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+
+class Computation:
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.calls
+
+
+async def test_concurrent_calls_share_result():
+    flight = SingleFlight()
+    func = Computation()
+
+    tasks = [asyncio.create_task(flight.run('a', func)) for _ in range(5)]
+    await asyncio.sleep(0)
+    func.release.set()
+
+    assert await asyncio.gather(*tasks) == [1] * 5
+    assert func.calls == 1
+    assert not flight.futures
+
+
+async def test_different_keys_are_computed_separately():
+    flight = SingleFlight()
+    func = Computation()
+    func.release.set()
+
+    assert await asyncio.gather(flight.run('a', func), flight.run('b', func)) == [1, 2]
+
+
+async def test_later_calls_recompute():
+    flight = SingleFlight()
+    func = Computation()
+    func.release.set()
+
+    assert await flight.run('a', func) == 1
+    assert await flight.run('a', func) == 2
+
+
+async def test_exception_is_shared():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def _fail():
+        await release.wait()
+        raise ValueError('bad')
+
+    tasks = [asyncio.create_task(flight.run('a', _fail)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        assert isinstance(result, ValueError)
+
+
+async def test_cancelled_leader_is_replaced():
+    flight = SingleFlight()
+    func = Computation()
+
+    leader = asyncio.create_task(flight.run('a', func))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.run('a', func))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    func.release.set()
+
+    assert await follower == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+async def test_cancelled_follower_does_not_affect_leader():
+    flight = SingleFlight()
+    func = Computation()
+
+    leader = asyncio.create_task(flight.run('a', func))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.run('a', func))
+    await asyncio.sleep(0)
+
+    follower.cancel()
+    await asyncio.sleep(0)
+    func.release.set()
+
+    assert await leader == 1
+    with pytest.raises(asyncio.CancelledError):
+        await follower
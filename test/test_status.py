@@ -6,6 +6,9 @@ import asyncio
 
 import pytest
 from datetime import datetime, timezone
+from falcon import testing
+
+from wmt_api.frontend import create_app
 
 pytestmark = [pytest.mark.parametrize("mapname", ['hiking', 'slopes'], indirect=True),
               pytest.mark.asyncio]
@@ -22,3 +25,23 @@ async def test_status_ok(wmt_call, conn, status_table):
     _, data = await wmt_call('/v1/status')
     assert data['server_status'] == 'OK'
     assert datetime.fromisoformat(data['last_update']) == test_date
+
+
+async def test_status_pool(wmt_call, status_table):
+    await wmt_call('/v1/status')
+    _, data = await wmt_call('/v1/status/pool')
+
+    assert data['checkedout'] == 0
+    assert data['overflow_events'] == 0
+    assert data['timeouts'] == 0
+    assert data['wait_time']['count'] >= 1
+    assert data['wait_time']['buckets']['inf'] == data['wait_time']['count']
+
+
+async def test_status_pool_is_internal(context, status_table):
+    app = create_app(context)
+
+    async with testing.ASGIConductor(app) as conductor:
+        response = await conductor.simulate_get('/v1/status/pool', remote_addr='203.0.113.5')
+
+    assert response.status_code == 403
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from wmt_api.output.symbol_bundle import symbols_to_json, symbols_to_sprite
+
+SVG = '{http://www.w3.org/2000/svg}'
+XLINK_HREF = '{http://www.w3.org/1999/xlink}href'
+
+# Shield as written by the SVG surface of cairo.
+CAIRO_SHIELD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="24pt" height="15pt" viewBox="0 0 24 15" version="1.1">
+<defs>
+<g>
+<symbol overflow="visible" id="glyph0-0">
+<path style="stroke:none;" d="M 0.5 0 L 0.5 -8 L 4.5 -8 L 4.5 0 Z M 1 -0.5 L 4 -0.5 L 4 -7.5 L 1 -7.5 Z "/>
+</symbol>
+<symbol overflow="visible" id="glyph0-1">
+<path style="stroke:none;" d="M 1 0 L 1 -8 L 5.5 -8 L 5.5 -7 L 2 -7 L 2 0 Z "/>
+</symbol>
+</g>
+<clipPath id="clip1">
+  <path d="M 0 0 L 24 0 L 24 15 L 0 15 Z "/>
+</clipPath>
+</defs>
+<g id="surface1">
+<g clip-path="url(#clip1)" clip-rule="nonzero">
+<path style="fill-rule:nonzero;fill:rgb(100%,100%,100%);fill-opacity:1;stroke-width:1;stroke:rgb(0%,0%,0%);" d="M 0.5 0.5 L 23.5 0.5 L 23.5 14.5 L 0.5 14.5 Z "/>
+</g>
+<g style="fill:rgb(0%,0%,0%);fill-opacity:1;">
+  <use xlink:href="#glyph0-1" x="7" y="11"/>
+  <use xlink:href="#glyph0-0" x="12" y="11"/>
+</g>
+</g>
+</svg>
+"""
+
+SYMBOLS = [('a', b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" width="16px" height="20px"/>'),
+           ('b', None),
+           ('c', b'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 30 10"/>')]
+
+
+def test_json():
+    data = json.loads(symbols_to_json(SYMBOLS))
+
+    assert data == {'a': SYMBOLS[0][1].decode('utf-8'), 'b': None,
+                    'c': SYMBOLS[2][1].decode('utf-8')}
+
+
+def test_sprite():
+    sprite, index = symbols_to_sprite(SYMBOLS)
+
+    root = ET.fromstring(sprite)
+    assert root.get('width') == '30'
+    assert root.get('height') == '30'
+    assert len(root) == 2
+
+    assert json.loads(index) == {'a': {'x': 0, 'y': 0, 'width': 16, 'height': 20},
+                                 'c': {'x': 0, 'y': 20, 'width': 30, 'height': 10}}
+
+
+def test_empty_sprite():
+    sprite, index = symbols_to_sprite([])
+
+    assert ET.fromstring(sprite).get('height') == '0'
+    assert json.loads(index) == {}
+
+
+@pytest.mark.parametrize('attrs,size', [('width="12" height="8"', (12, 8)),
+                                        ('width="12px" height="8px"', (12, 8)),
+                                        ('width="6pt" height="3pt"', (8, 4)),
+                                        ('width="1in" height="25.4mm"', (96, 96)),
+                                        ('width="100%" height="100%" viewBox="0 0 7 5"', (7, 5)),
+                                        ('width="2em" height="1em" viewBox="0,0,20,10"', (20, 10)),
+                                        ('width="40" viewBox="0 0 20 10"', (40, 20)),
+                                        ('height="5mm" viewBox="0 0 20 10"', (37.8, 18.9))])
+def test_sprite_symbol_size(attrs, size):
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg" %s/>' % attrs.encode('utf-8')
+    _, index = symbols_to_sprite([('a', svg)])
+
+    data = json.loads(index)['a']
+    assert (data['width'], data['height']) == pytest.approx(size)
+
+
+def test_sprite_unusable_symbols():
+    symbols = [('a', b'<svg xmlns="http://www.w3.org/2000/svg" width="50%" height="1em"/>'),
+               ('b', b'<svg xmlns="http://www.w3.org/2000/svg"><rect/>'),
+               ('c', b'<svg xmlns="http://www.w3.org/2000/svg" width="3" height="4"/>')]
+    sprite, index = symbols_to_sprite(symbols)
+
+    assert len(ET.fromstring(sprite)) == 1
+    assert json.loads(index) == {'c': {'x': 0, 'y': 0, 'width': 3, 'height': 4}}
+
+
+def test_sprite_nested_svg_positions():
+    sprite, _ = symbols_to_sprite(SYMBOLS)
+
+    a, c = ET.fromstring(sprite)
+    assert [a.get(k) for k in ('x', 'y', 'width', 'height')] == ['0', '0', '16', '20']
+    assert [c.get(k) for k in ('x', 'y', 'width', 'height')] == ['0', '20', '30', '10']
+
+
+def test_sprite_cairo_shields():
+    sprite, index = symbols_to_sprite([('a', CAIRO_SHIELD), ('b', CAIRO_SHIELD)])
+
+    assert json.loads(index) == {'a': {'x': 0, 'y': 0, 'width': 32, 'height': 20},
+                                 'b': {'x': 0, 'y': 20, 'width': 32, 'height': 20}}
+
+    root = ET.fromstring(sprite)
+    assert root.get('height') == '40'
+
+    ids = [el.get('id') for el in root.iter() if el.get('id') is not None]
+    assert len(ids) == 8
+    assert len(set(ids)) == len(ids)
+
+    for shield in root:
+        shield_ids = {el.get('id') for el in shield.iter() if el.get('id') is not None}
+        refs = [el.get(XLINK_HREF)[1:] for el in shield.iter(f'{SVG}use')]
+        refs.extend(el.get('clip-path')[5:-1] for el in shield.iter()
+                    if el.get('clip-path') is not None)
+        assert len(refs) == 3
+        assert set(refs) <= shield_ids
@@ -0,0 +1,62 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import pytest
+
+from wmt_api.common.symbol_store import SymbolStore
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_symbol_from_memory(tmp_path):
+    (tmp_path / 'a.svg').write_bytes(b'<svg>a</svg>')
+    store = SymbolStore()
+
+    symbol = await store.get(str(tmp_path), 'a.svg')
+    assert symbol.data == b'<svg>a</svg>'
+    assert symbol.etag == 'a.svg'
+
+    (tmp_path / 'a.svg').unlink()
+
+    assert (await store.get(str(tmp_path), 'a.svg')).data == b'<svg>a</svg>'
+
+
+async def test_missing_symbol_is_cached(tmp_path):
+    store = SymbolStore()
+
+    assert await store.get(str(tmp_path), 'new.svg') is None
+
+    (tmp_path / 'new.svg').write_bytes(b'<svg/>')
+
+    assert await store.get(str(tmp_path), 'new.svg') is None
+
+
+async def test_missing_symbol_expires(tmp_path):
+    store = SymbolStore(negative_ttl=0)
+
+    assert await store.get(str(tmp_path), 'new.svg') is None
+
+    (tmp_path / 'new.svg').write_bytes(b'<svg/>')
+
+    assert (await store.get(str(tmp_path), 'new.svg')).data == b'<svg/>'
+
+
+async def test_large_symbol_is_streamed(tmp_path):
+    (tmp_path / 'large.svg').write_bytes(b'x' * 2000)
+    store = SymbolStore(max_file_size=1000)
+
+    symbol = await store.get(str(tmp_path), 'large.svg')
+    assert symbol.data is None
+    assert symbol.size == 2000
+
+    async with symbol.open() as fd:
+        assert await fd.read() == b'x' * 2000
+
+    assert len(store.cache) == 0
+
+
+async def test_directory_is_not_a_symbol(tmp_path):
+    (tmp_path / 'sub.svg').mkdir()
+
+    assert await SymbolStore().get(str(tmp_path), 'sub.svg') is None
@@ -3,6 +3,8 @@
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
 import asyncio
+import gzip
+import xml.etree.ElementTree as ET
 
 import pytest
 import falcon
@@ -44,3 +46,188 @@ async def test_from_tags_unknown(wmt_call, symbol_dir):
                                params={'xx': 'foo'},
                                expect_success=False)
     assert status == falcon.HTTP_NOT_FOUND
+
+
+async def test_from_tags_cache_headers(wmt_call, symbol_dir):
+    tags = {'ref': '23', 'piste:type': 'nordic', 'color': 'red'}
+    _, resp = await wmt_call('/v1/symbols/from_tags/REG', params=tags,
+                             as_json=False, as_response=True)
+
+    etag = resp.headers['etag']
+    assert etag.startswith('W/"')
+    assert 'max-age=' in resp.headers['cache-control']
+
+    status, resp = await wmt_call('/v1/symbols/from_tags/REG', params=tags,
+                                  headers={'If-None-Match': etag},
+                                  expect_success=False, as_json=False, as_response=True)
+
+    assert status == falcon.HTTP_NOT_MODIFIED
+    assert resp.content == b''
+    assert resp.headers['etag'] == etag
+
+
+async def test_from_tags_compressed_etag(wmt_call, symbol_dir):
+    tags = {'ref': '23', 'piste:type': 'nordic', 'color': 'red'}
+    _, plain = await wmt_call('/v1/symbols/from_tags/REG', params=tags,
+                              as_json=False, as_response=True)
+    _, gzipped = await wmt_call('/v1/symbols/from_tags/REG', params=tags,
+                                headers={'Accept-Encoding': 'gzip'},
+                                as_json=False, as_response=True)
+
+    assert plain.headers['etag'] == gzipped.headers['etag']
+    assert plain.headers['etag'].startswith('W/"')
+
+
+async def test_from_tags_cached(wmt_call, symbol_dir, context):
+    tags = {'ref': '23', 'piste:type': 'nordic', 'color': 'red'}
+    _, first = await wmt_call('/v1/symbols/from_tags/REG', params=tags, as_json=False)
+
+    context.shield_factory = None # any further shield creation would fail
+
+    _, second = await wmt_call('/v1/symbols/from_tags/REG',
+                               params=dict(reversed(tags.items())), as_json=False)
+
+    assert first == second
+
+
+async def test_by_id_cache_headers(wmt_call, symbol_dir):
+    (symbol_dir / 'fg-435.svg').write_text('<svg></svg>')
+
+    _, resp = await wmt_call('/v1/symbols/id/fg-435', as_json=False, as_response=True)
+
+    assert 'immutable' in resp.headers['cache-control']
+    etag = resp.headers['etag']
+
+    status, resp = await wmt_call('/v1/symbols/id/fg-435', headers={'If-None-Match': etag},
+                                  expect_success=False, as_json=False, as_response=True)
+
+    assert status == falcon.HTTP_NOT_MODIFIED
+    assert resp.content == b''
+
+
+async def test_by_id_served_from_memory(wmt_call, symbol_dir):
+    svg = symbol_dir / 'fg-435.svg'
+    svg.write_text('<svg></svg>')
+
+    await wmt_call('/v1/symbols/id/fg-435', as_json=False)
+    svg.unlink()
+
+    _, data = await wmt_call('/v1/symbols/id/fg-435', as_json=False)
+    assert data == '<svg></svg>'
+
+
+@pytest.mark.parametrize('api_settings', [{'SYMBOL_STORE_SIZE': 1000}])
+@pytest.mark.parametrize('encoding', [None, 'gzip'])
+async def test_by_id_large_file(wmt_call, symbol_dir, encoding):
+    content = '<svg>' + ''.join(f'<path d="M {i} 0"/>' for i in range(1000)) + '</svg>'
+    (symbol_dir / 'large.svg').write_text(content)
+
+    headers = {} if encoding is None else {'Accept-Encoding': encoding}
+    _, resp = await wmt_call('/v1/symbols/id/large', headers=headers,
+                             as_json=False, as_response=True)
+
+    assert resp.headers.get('content-encoding') == encoding
+    if encoding is None:
+        assert resp.headers['content-length'] == str(len(content))
+        assert resp.text == content
+    else:
+        assert 'content-length' not in resp.headers
+        assert len(resp.content) < len(content)
+        assert gzip.decompress(resp.content).decode('utf-8') == content
+
+
+@pytest.mark.parametrize('api_settings', [{'SYMBOL_STORE_SIZE': 1000,
+                                           'SYMBOL_ACCEL_REDIRECT': '/internal/symbols/'}])
+async def test_by_id_large_file_accel_redirect(wmt_call, symbol_dir):
+    (symbol_dir / 'large.svg').write_text('<svg>' + ' ' * 2000 + '</svg>')
+    (symbol_dir / 'small.svg').write_text('<svg></svg>')
+
+    _, resp = await wmt_call('/v1/symbols/id/large', as_json=False, as_response=True)
+
+    assert resp.headers['x-accel-redirect'] == '/internal/symbols/large.svg'
+    assert 'immutable' in resp.headers['cache-control']
+    assert resp.content == b''
+
+    _, resp = await wmt_call('/v1/symbols/id/small', as_json=False, as_response=True)
+
+    assert 'x-accel-redirect' not in resp.headers
+    assert resp.text == '<svg></svg>'
+
+
+async def test_by_id_hidden_file(wmt_call, symbol_dir):
+    (symbol_dir / '.hidden.svg').write_text('<svg></svg>')
+
+    status, _ = await wmt_call('/v1/symbols/id/.hidden.svg', expect_success=False)
+    assert status == falcon.HTTP_NOT_FOUND
+
+
+async def test_bundle_json(wmt_call, symbol_dir):
+    (symbol_dir / 'fg-435.svg').write_text('<svg></svg>')
+
+    _, data = await wmt_call('/v1/symbols/bundle',
+                             params={'ids': 'fg-435,fg-999',
+                                     'tags': 'REG?ref=23&piste:type=nordic&color=red'})
+
+    assert data['fg-435'] == '<svg></svg>'
+    assert data['fg-999'] is None
+    assert data['REG?color=red&piste%3Atype=nordic&ref=23'].startswith('<svg')
+
+
+async def test_bundle_sprite(wmt_call, symbol_dir):
+    (symbol_dir / 'a.svg').write_text('<svg width="10" height="12"></svg>')
+    (symbol_dir / 'b.svg').write_text('<svg width="8" height="5"></svg>')
+
+    _, data = await wmt_call('/v1/symbols/bundle',
+                             params={'ids': 'b,a', 'format': 'sprite'}, as_json=False)
+    assert data.startswith('<svg')
+
+    _, data = await wmt_call('/v1/symbols/bundle',
+                             params={'ids': 'a,b', 'format': 'index'})
+    assert data == {'a': {'x': 0, 'y': 0, 'width': 10, 'height': 12},
+                    'b': {'x': 0, 'y': 12, 'width': 8, 'height': 5}}
+
+
+async def test_bundle_json_with_relative_size(wmt_call, symbol_dir):
+    svg = '<svg xmlns="http://www.w3.org/2000/svg" width="100%" height="2em"></svg>'
+    (symbol_dir / 'a.svg').write_text(svg)
+
+    _, data = await wmt_call('/v1/symbols/bundle', params={'ids': 'a'})
+    assert data == {'a': svg}
+
+
+async def test_bundle_sprite_from_shields(wmt_call, symbol_dir):
+    params = {'tags': ['REG?ref=23&piste:type=nordic&color=red',
+                       'REG?ref=5&piste:type=nordic&color=blue'],
+              'format': 'sprite'}
+    _, data = await wmt_call('/v1/symbols/bundle', params=params, as_bytes=True, as_json=False)
+
+    root = ET.fromstring(data)
+    assert len(root) == 2
+    assert all(float(sym.get('width')) > 0 and float(sym.get('height')) > 0 for sym in root)
+
+    ids = [el.get('id') for el in root.iter() if el.get('id') is not None]
+    assert len(set(ids)) == len(ids)
+
+    params['format'] = 'index'
+    _, index = await wmt_call('/v1/symbols/bundle', params=params)
+    first, second = index.values()
+    assert second['y'] == first['height']
+
+
+async def test_bundle_cached(wmt_call, symbol_dir):
+    (symbol_dir / 'a.svg').write_text('<svg></svg>')
+
+    _, resp = await wmt_call('/v1/symbols/bundle', params={'ids': 'a'}, as_response=True)
+    assert 'immutable' in resp.headers['cache-control']
+
+    status, _ = await wmt_call('/v1/symbols/bundle', params={'ids': 'a'},
+                               headers={'If-None-Match': resp.headers['etag']},
+                               expect_success=False, as_json=False)
+    assert status == falcon.HTTP_NOT_MODIFIED
+
+
+async def test_bundle_too_large(wmt_call, symbol_dir):
+    status, _ = await wmt_call('/v1/symbols/bundle',
+                               params={'ids': ','.join(str(i) for i in range(101))},
+                               expect_success=False)
+    assert status == falcon.HTTP_BAD_REQUEST
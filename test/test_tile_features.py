@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+import types
+
+import pytest
+import shapely
+
+from wmt_api.output.tile_features import TileFeatures, geometry_to_geojson
+
+CRS = '"crs":{"type":"name","properties":{"name":"EPSG:3857"}}'
+
+
+@pytest.mark.parametrize('wkt,coords', [
+    ('POINT(1 2)', '[1,2]'),
+    ('LINESTRING(0 0, 10.5 -3.25)', '[[0,0],[10.5,-3.25]]'),
+    ('LINESTRING(1113194.9079327357 -0.0000000000001, 0.1234567894 7.0000000001)',
+     '[[1113194.907932736,0],[0.123456789,7]]'),
+    ('MULTIPOINT(1 2, 3 4)', '[[1,2],[3,4]]'),
+    ('MULTILINESTRING((1 2, 3 4), (5 6, 7 8))', '[[[1,2],[3,4]],[[5,6],[7,8]]]')])
+def test_geometry_to_geojson(wkt, coords):
+    geom = shapely.from_wkt(wkt)
+
+    assert geometry_to_geojson(geom, 3857)\
+             == f'{{"type":"{geom.geom_type}",{CRS},"coordinates":{coords}}}'
+
+
+def test_geometry_to_geojson_wgs84():
+    assert geometry_to_geojson(shapely.from_wkt('POINT(8.5 47.25)'), 4326)\
+             == '{"type":"Point","coordinates":[8.5,47.25]}'
+
+
+def test_clipped_features_to_geojson():
+    features = TileFeatures(shapely.from_wkt(['LINESTRING(0 0, 100 100)',
+                                              'LINESTRING(200 200, 300 300)']),
+                            [{'id': 1, 'geometry': None, 'type': 'way'},
+                             {'id': 2, 'geometry': None, 'type': 'way'}])
+
+    bbox = types.SimpleNamespace(minx=0, miny=0, maxx=50, maxy=50)
+    data = json.loads(features.clip(bbox).to_geojson().as_bytes())
+
+    assert len(data['features']) == 1
+    assert data['features'][0]['geometry'] == {
+        'type': 'LineString',
+        'crs': {'type': 'name', 'properties': {'name': 'EPSG:3857'}},
+        'coordinates': [[0, 0], [50, 50]]}
+    assert data['features'][0]['id'] == 1
+    assert data['features'][0]['properties'] == {'type': 'way'}
@@ -0,0 +1,36 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import pytest
+
+from wmt_api.common.types import Tile, MetaTile
+
+
+@pytest.mark.parametrize('size', [2, 3, 4, 5, 8])
+@pytest.mark.parametrize('x,y', [(0, 0), (255, 255), (100, 254), (254, 3)])
+def test_metatile_stays_inside_map(size, x, y):
+    metatile = MetaTile(Tile(8, x, y), size)
+
+    tiles = metatile.tiles()
+
+    assert all(t.is_valid() for t in tiles)
+    assert any(t.x == x and t.y == y for t in tiles)
+    assert metatile.bbox.minx == pytest.approx(min(t.bbox.minx for t in tiles))
+    assert metatile.bbox.maxx == pytest.approx(max(t.bbox.maxx for t in tiles))
+    assert metatile.bbox.miny == pytest.approx(min(t.bbox.miny for t in tiles))
+    assert metatile.bbox.maxy == pytest.approx(max(t.bbox.maxy for t in tiles))
+
+
+def test_metatile_full_block():
+    metatile = MetaTile(Tile(12, 2049, 2046), 4)
+
+    assert (metatile.x, metatile.y) == (2048, 2044)
+    assert len(metatile.tiles()) == 16
+
+
+def test_metatile_cut_at_map_edge():
+    metatile = MetaTile(Tile(8, 255, 10), 3)
+
+    assert (metatile.x, metatile.y) == (255, 9)
+    assert sorted((t.x, t.y) for t in metatile.tiles()) == [(255, 9), (255, 10), (255, 11)]
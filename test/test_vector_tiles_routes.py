@@ -3,15 +3,20 @@
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
 import asyncio
+from datetime import datetime, timezone
 
 import pytest
+import falcon
 import shapely
+import sqlalchemy as sa
+
+from wmt_api.output.tile_features import geometry_to_geojson
 
 pytestmark = [pytest.mark.parametrize("mapname", ["hiking"], indirect=True),
               pytest.mark.asyncio]
 
 @pytest.fixture
-def simple_routes(conn, style_factory, guidepost_table):
+def simple_routes(conn, style_factory, guidepost_table, status_table):
     style_factory('LINESTRING(0 0, 100 100)')
     style_factory('LINESTRING(10 10, 50 50)')
     style_factory('LINESTRING(2000 2000, 2100 2100)')
@@ -34,3 +39,99 @@ async def test_full_tile(wmt_call, simple_routes):
         assert 'properties' in feat
         geom = shapely.geometry.shape(feat['geometry'])
         assert geom.geom_type == 'LineString'
+
+
+@pytest.mark.parametrize('suffix', ['pbf', 'mvt'])
+async def test_empty_tile_mvt(wmt_call, simple_routes, suffix):
+    _, data = await wmt_call(f'/v1/tiles/12/0/0.{suffix}', as_json=False, as_bytes=True)
+
+    assert data == b''
+
+
+async def test_full_tile_mvt(wmt_call, simple_routes):
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.pbf', as_json=False, as_bytes=True)
+    _, geojson = await wmt_call('/v1/tiles/12/2048/2047.json', as_json=False)
+
+    assert b'way' in data
+    assert len(data) < len(geojson)
+
+
+async def test_high_zoom_tile(wmt_call, simple_routes):
+    _, data = await wmt_call('/v1/tiles/14/8192/8191.json')
+
+    assert len(data['features']) == 3
+
+
+async def test_low_zoom_tile_drops_small_features(wmt_call, simple_routes):
+    _, data = await wmt_call('/v1/tiles/8/128/127.json')
+
+    assert len(data['features']) == 0
+
+
+@pytest.mark.parametrize('tile', ['8/256/0', '7/0/0', '17/0/0'])
+async def test_tile_out_of_range(wmt_call, simple_routes, tile):
+    status, _ = await wmt_call(f'/v1/tiles/{tile}.json', expect_success=False)
+
+    assert status == falcon.HTTP_NOT_FOUND
+
+
+@pytest.mark.parametrize('api_settings', [{'TILE_OVERZOOM': True}])
+@pytest.mark.parametrize('tile,num_features', [('14/8192/8191', 3),
+                                               ('16/32768/32767', 2),
+                                               ('13/4097/4095', 0)])
+async def test_overzoom_tile(wmt_call, simple_routes, tile, num_features):
+    _, data = await wmt_call(f'/v1/tiles/{tile}.json')
+
+    assert len(data['features']) == num_features
+
+    for feat in data['features']:
+        assert feat['properties']['type'] == 'way'
+        assert set(feat['properties']) == {'type', 'top_relations', 'child_relations',
+                                           'shields', 'style', 'class'}
+        geom = shapely.geometry.shape(feat['geometry'])
+        assert geom.geom_type == 'LineString'
+
+
+@pytest.mark.parametrize('wkt', ['LINESTRING(0.123456789012 1113194.9079327357, -10 10)',
+                                 'MULTILINESTRING((1 2, 3.5 4), (5 6, 7 8))',
+                                 'POINT(-0.0000000000001 20037508.342789244)'])
+async def test_overzoom_geometry_matches_database(conn, wkt):
+    expected = conn.scalar(sa.select(sa.func.ST_AsGeoJSON(sa.func.ST_GeomFromText(wkt, 3857))))
+
+    assert geometry_to_geojson(shapely.from_wkt(wkt), 3857) == expected
+
+
+@pytest.mark.parametrize('api_settings', [{'TILE_CACHE_CHECK_INTERVAL': 0}])
+async def test_tile_cache(wmt_call, conn, simple_routes, style_table, status_table):
+    status_table.set_status(conn, 'base', datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.json')
+    assert len(data['features']) == 3
+
+    conn.execute(style_table.data.delete())
+
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.json')
+    assert len(data['features']) == 3
+
+    status_table.set_status(conn, 'base', datetime(2025, 1, 2, tzinfo=timezone.utc), 2)
+
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.json')
+    assert len(data['features']) == 0
+
+
+@pytest.mark.parametrize('api_settings', [{'TILE_METATILE_SIZE': 4}])
+async def test_metatile(wmt_call, conn, simple_routes, style_table, status_table):
+    status_table.set_status(conn, 'base', datetime(2025, 1, 1, tzinfo=timezone.utc), 1)
+
+    _, data = await wmt_call('/v1/tiles/12/2049/2046.json')
+    assert len(data['features']) == 0
+
+    conn.execute(style_table.data.delete())
+
+    # computed together with the first tile
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.json')
+    assert len(data['features']) == 3
+
+    # different metatile
+    _, data = await wmt_call('/v1/tiles/12/2052/2047.json')
+    assert len(data['features']) == 0
@@ -11,7 +11,7 @@ pytestmark = [pytest.mark.parametrize("mapname", ["slopes"], indirect=True),
               pytest.mark.asyncio]
 
 @pytest.fixture
-def simple_routes(conn, style_factory, way_factory, joined_ways_table):
+def simple_routes(conn, style_factory, way_factory, joined_ways_table, status_table):
     style_factory('LINESTRING(0 0, 100 100)')
     style_factory('LINESTRING(10 10, 50 50)')
     style_factory('LINESTRING(2000 2000, 2100 2100)')
@@ -34,3 +34,18 @@ async def test_full_tile(wmt_call, simple_routes):
         assert 'properties' in feat
         geom = shapely.geometry.shape(feat['geometry'])
         assert geom.geom_type == 'LineString'
+
+
+@pytest.mark.parametrize('suffix', ['pbf', 'mvt'])
+async def test_empty_tile_mvt(wmt_call, simple_routes, suffix):
+    _, data = await wmt_call(f'/v1/tiles/12/0/0.{suffix}', as_json=False, as_bytes=True)
+
+    assert data == b''
+
+
+async def test_full_tile_mvt(wmt_call, simple_routes):
+    _, data = await wmt_call('/v1/tiles/12/2048/2047.pbf', as_json=False, as_bytes=True)
+    _, geojson = await wmt_call('/v1/tiles/12/2048/2047.json', as_json=False)
+
+    assert b'way' in data
+    assert len(data) < len(geojson)
@@ -0,0 +1,129 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import json
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+from wmt_api.common.wikipedia import WikipediaClient
+
+LANGLINKS = {('de', 'Wolke', 'en'): 'https://en.wikipedia.org/wiki/Cloud'}
+
+
+class StubWikipedia(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        lang = url.path.split('/')[1]
+        title = query['titles'][0]
+        self.server.requests.append((lang, title))
+
+        if title == 'Slow':
+            time.sleep(1)
+
+        page = {'pageid': 1, 'title': title}
+        link = LANGLINKS.get((lang, title, query['lllang'][0]))
+        if link is not None:
+            page['langlinks'] = [{'lang': query['lllang'][0], 'url': link}]
+
+        body = json.dumps({'query': {'pages': {'1': page}}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(('127.0.0.1', 0), StubWikipedia)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api_url(server):
+    return f'http://127.0.0.1:{server.server_port}/{{lang}}/api.php'
+
+
+@pytest.mark.asyncio
+async def test_langlink(server, api_url):
+    client = WikipediaClient(api_url=api_url)
+
+    assert await client.get_langlink('de', 'Wolke', 'en') == 'https://en.wikipedia.org/wiki/Cloud'
+    assert await client.get_langlink('de', 'Wolke', 'en') == 'https://en.wikipedia.org/wiki/Cloud'
+    assert server.requests == [('de', 'Wolke')]
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_missing_langlink_is_cached(server, api_url):
+    client = WikipediaClient(api_url=api_url)
+
+    assert await client.get_langlink('de', 'Wolke', 'fr') is None
+    assert await client.get_langlink('de', 'Wolke', 'fr') is None
+    assert server.requests == [('de', 'Wolke')]
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_persistent_cache(server, api_url, tmp_path):
+    cache_file = str(tmp_path / 'wikipedia.db')
+
+    client = WikipediaClient(api_url=api_url, cache_file=cache_file)
+    assert await client.get_langlink('de', 'Wolke', 'en') is not None
+    assert await client.get_langlink('de', 'Wolke', 'fr') is None
+    await client.close()
+
+    client = WikipediaClient(api_url=api_url, cache_file=cache_file)
+    assert await client.get_langlink('de', 'Wolke', 'en') == 'https://en.wikipedia.org/wiki/Cloud'
+    assert await client.get_langlink('de', 'Wolke', 'fr') is None
+    await client.close()
+
+    assert len(server.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_refreshed(server, api_url, tmp_path):
+    client = WikipediaClient(api_url=api_url, ttl=0, cache_file=str(tmp_path / 'wp.db'))
+
+    await client.get_langlink('de', 'Wolke', 'en')
+    await client.get_langlink('de', 'Wolke', 'en')
+    await client.close()
+
+    assert len(server.requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_timeout(server, api_url):
+    client = WikipediaClient(api_url=api_url, timeout=0.1)
+
+    assert await client.get_langlink('de', 'Slow', 'en') is None
+
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_server():
+    client = WikipediaClient(api_url='http://127.0.0.1:1/{lang}/api.php')
+
+    assert await client.get_langlink('de', 'Wolke', 'en') is None
+
+    await client.close()
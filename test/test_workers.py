@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import asyncio
+import math
+import threading
+
+import pytest
+
+from wmt_api.common.errors import APIError
+from wmt_api.common.workers import WorkerPool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_run_in_thread():
+    pool = WorkerPool()
+
+    assert await pool.run(threading.get_ident) != threading.get_ident()
+
+    pool.shutdown()
+
+
+async def test_run_in_process():
+    pool = WorkerPool(workers=1, processes=True)
+
+    assert await pool.run(math.factorial, 10) == 3628800
+
+    pool.shutdown()
+
+
+async def test_backpressure():
+    pool = WorkerPool(workers=1, queue_size=1)
+    event = threading.Event()
+
+    running = [asyncio.ensure_future(pool.run(event.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(APIError) as exc:
+        await pool.run(event.wait)
+    assert exc.value.status == 503
+
+    event.set()
+    await asyncio.gather(*running)
+
+    assert pool.pending == 0
+    assert await pool.run(event.wait)
+
+    pool.shutdown()
+
+
+async def test_cancelled_call_is_counted_until_done():
+    pool = WorkerPool(workers=1, queue_size=0)
+    event = threading.Event()
+    started = threading.Event()
+
+    def _work():
+        started.set()
+        event.wait()
+
+    task = asyncio.ensure_future(pool.run(_work))
+    await asyncio.to_thread(started.wait)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    try:
+        # The worker is still busy.
+        assert pool.pending == 1
+        with pytest.raises(APIError):
+            await pool.run(int)
+    finally:
+        event.set()
+
+    for _ in range(100):
+        if pool.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+
+    assert pool.pending == 0
+    assert await pool.run(event.wait)
+
+    pool.shutdown()
+
+
+async def test_cancelled_queued_call_is_released():
+    pool = WorkerPool(workers=1, queue_size=1)
+    event = threading.Event()
+
+    running = asyncio.ensure_future(pool.run(event.wait))
+    queued = asyncio.ensure_future(pool.run(event.wait))
+    await asyncio.sleep(0)
+    assert pool.pending == 2
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    await asyncio.sleep(0)
+
+    assert pool.pending == 1
+
+    event.set()
+    await running
+
+    pool.shutdown()
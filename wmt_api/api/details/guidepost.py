@@ -28,6 +28,7 @@ class APIDetailsGuidepost(Router):
                 .join(o, o.c.id == r.c.id)
 
         res = (await conn.execute(sql)).first()
+        await conn.release()
 
         if res is None:
             raise falcon.HTTPNotFound()
@@ -2,17 +2,21 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
+from functools import cached_property
+
 import falcon
 import sqlalchemy as sa
 
 from ...common import params
 from ...common.errors import APIError
 from ...common.json_writer import JsonWriter
-from ...common.router import Router, needs_db
+from ...common.metrics import measure
+from ...common.router import Router, needs_db, single_flight
 from ...output.wikilink import get_wikipedia_link
 from ...output.route_item import DetailedRouteItem, RouteItem
 from ...output.geometry import RouteGeometry
-from ...output.elevation import SegmentElevation, get_way_elevation_data
+from ...output.elevation import compute_elevation_profile, elevation_profile_to_response,\
+                                get_way_elevation_data
 
 class APIDetailsRelation(Router):
 
@@ -24,17 +28,12 @@ class APIDetailsRelation(Router):
         app.add_route(base + '/way-elevation', self, suffix='way_elevation')
 
 
+    @single_flight
     @needs_db
     async def on_get_info(self, conn, req, resp, oid):
         locale = params.get_locale(req)
 
-        r = self.context.db.tables.routes.data
-        h = self.context.db.tables.hierarchy.data
-
-        fields = DetailedRouteItem.make_selectables(r)
-
-        row = (await conn.execute(sa.select(*fields)
-                                    .where(r.c.id == oid))).first()
+        row = (await conn.execute(self.info_sql, {'oid': oid})).first()
 
         if row is None:
             raise falcon.HTTPNotFound()
@@ -43,21 +42,15 @@ class APIDetailsRelation(Router):
         res = DetailedRouteItem(writer, row, locale, objtype='relation')
 
         # add subroutes where applicable
-        w = sa.select(h.c.child).distinct()\
-              .where(h.c.parent == oid)
-
-        sections = await conn.execute(sa.select(*RouteItem.make_selectables(r))\
-                                        .where(r.c.id != oid).where(r.c.id.in_(w)))
+        sections = await conn.execute(self.subroutes_sql, {'oid': oid})
 
         if sections.rowcount > 0:
             res.add_extra_route_info('subroutes', sections, locale)
 
         # add superroutes where applicable
-        w = sa.select(h.c.parent).distinct()\
-              .where(h.c.child == oid).where(h.c.depth == 2)
+        sections = await conn.execute(self.superroutes_sql, {'oid': oid})
 
-        sections = await conn.execute(sa.select(*RouteItem.make_selectables(r))\
-                                        .where(r.c.id != oid).where(r.c.id.in_(w)))
+        await conn.release()
 
         if sections.rowcount > 0:
             res.add_extra_route_info('superroutes', sections, locale)
@@ -66,21 +59,55 @@ class APIDetailsRelation(Router):
         writer.to_response(resp)
 
 
+    @cached_property
+    def info_sql(self):
+        r = self.context.db.tables.routes.data
+
+        return sa.select(*DetailedRouteItem.make_selectables(r))\
+                 .where(r.c.id == sa.bindparam('oid'))
+
+
+    @cached_property
+    def subroutes_sql(self):
+        r = self.context.db.tables.routes.data
+        h = self.context.db.tables.hierarchy.data
+
+        w = sa.select(h.c.child).distinct()\
+              .where(h.c.parent == sa.bindparam('oid'))
+
+        return sa.select(*RouteItem.make_selectables(r))\
+                 .where(r.c.id != sa.bindparam('oid')).where(r.c.id.in_(w))
+
+
+    @cached_property
+    def superroutes_sql(self):
+        r = self.context.db.tables.routes.data
+        h = self.context.db.tables.hierarchy.data
+
+        w = sa.select(h.c.parent).distinct()\
+              .where(h.c.child == sa.bindparam('oid')).where(h.c.depth == 2)
+
+        return sa.select(*RouteItem.make_selectables(r))\
+                 .where(r.c.id != sa.bindparam('oid')).where(r.c.id.in_(w))
+
+
     @needs_db
     async def on_get_wikilink(self, conn, req, resp, oid):
         locale = params.get_locale(req)
 
         r = self.context.db.osmdata.relation.data
 
-        url = get_wikipedia_link(
-                 await conn.scalar(sa.select(r.c.tags).where(r.c.id == oid)),
-                 locale)
+        tags = await conn.scalar(sa.select(r.c.tags).where(r.c.id == oid))
+        await conn.release()
+
+        url = await get_wikipedia_link(tags, locale, self.context.wikipedia)
 
         if url is None:
             raise falcon.HTTPNotFound()
 
         raise falcon.HTTPSeeOther(url)
 
+    @single_flight
     @needs_db
     async def on_get_geometry(self, conn, req, resp, oid, geomtype):
         locale = params.get_locale(req)
@@ -102,12 +129,15 @@ class APIDetailsRelation(Router):
 
         obj = (await conn.execute(sa.select(*rows).where(r.c.id == oid))).first()
 
+        await conn.release()
+
         if obj is None:
             raise falcon.HTTPNotFound()
 
         RouteGeometry(obj, locales=locale, fmt=geomtype).to_response(req, resp)
 
 
+    @single_flight
     @needs_db
     async def on_get_way_elevation(self, conn, req, resp, oid):
         max_segment_len = params.as_int(req, 'simplify',  default=0, vmin=2)
@@ -127,11 +157,14 @@ class APIDetailsRelation(Router):
                                                   s.c.rels.overlap(sa.func.array(rels)),
                                                   step)
 
+        await conn.release()
+
         if not ways:
             raise falcon.HTTPNotFound()
 
-        ele = SegmentElevation(self.context.dem, bbox, max_segment_len=max_segment_len)
-        for w in ways:
-            ele.add_segment(step=step, **w)
+        with measure('elevation'):
+            profile = await self.context.workers.run(
+                          compute_elevation_profile, self.context.dem, bbox, ways, step,
+                          max_segment_len, self.context.dem_cache_size)
 
-        return ele.to_response(resp)
+        elevation_profile_to_response(profile, resp)
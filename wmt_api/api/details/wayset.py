@@ -12,13 +12,15 @@ from geoalchemy2 import Geography
 from shapely.geometry import Point, LineString
 
 from ...common import params
-from ...common.router import Router, needs_db
+from ...common.router import Router, needs_db, single_flight
 from ...common.errors import APIError
 from ...common.json_writer import JsonWriter
+from ...common.metrics import measure
 from ...output.route_item import DetailedRouteItem
 from ...output.wikilink import get_wikipedia_link
 from ...output.geometry import RouteGeometry
-from ...output.elevation import SegmentElevation, get_way_elevation_data
+from ...output.elevation import compute_elevation_profile, elevation_profile_to_response,\
+                                get_way_elevation_data
 
 class APIDetailsWayset(Router):
 
@@ -30,6 +32,7 @@ class APIDetailsWayset(Router):
         app.add_route(base + '/way-elevation', self, suffix='way_elevation')
 
 
+    @single_flight
     @needs_db
     async def on_get_info(self, conn, req, resp, oid):
         locale = params.get_locale(req)
@@ -86,6 +89,8 @@ class APIDetailsWayset(Router):
 
         row = (await conn.execute(sql)).first()
 
+        await conn.release()
+
         if row is None:
             raise falcon.HTTPNotFound()
 
@@ -111,9 +116,10 @@ class APIDetailsWayset(Router):
 
         r = self.context.db.osmdata.way.data
 
-        url = get_wikipedia_link(
-                 await conn.scalar(sa.select(r.c.tags).where(r.c.id == oid)),
-                 locale)
+        tags = await conn.scalar(sa.select(r.c.tags).where(r.c.id == oid))
+        await conn.release()
+
+        url = await get_wikipedia_link(tags, locale, self.context.wikipedia)
 
         if url is None:
             raise falcon.HTTPNotFound()
@@ -121,6 +127,7 @@ class APIDetailsWayset(Router):
         raise falcon.HTTPSeeOther(url)
 
 
+    @single_flight
     @needs_db
     async def on_get_geometry(self, conn, req, resp, oid, geomtype):
         locale = params.get_locale(req)
@@ -149,12 +156,15 @@ class APIDetailsWayset(Router):
 
         obj = (await conn.execute(sql)).first()
 
+        await conn.release()
+
         if obj is None:
             raise falcon.HTTPNotFound()
 
         RouteGeometry(obj, locales=locale, fmt=geomtype).to_response(req, resp)
 
 
+    @single_flight
     @needs_db
     async def on_get_way_elevation(self, conn, req, resp, oid):
         max_segment_len = params.as_int(req, 'simplify',  default=0, vmin=2)
@@ -171,11 +181,14 @@ class APIDetailsWayset(Router):
                                                           ws.c.id == oid),
                                                   step)
 
+        await conn.release()
+
         if not ways:
             raise falcon.HTTPNotFound()
 
-        ele = SegmentElevation(self.context.dem, bbox, max_segment_len=max_segment_len)
-        for way in ways:
-            ele.add_segment(step=step, **way)
+        with measure('elevation'):
+            profile = await self.context.workers.run(
+                          compute_elevation_profile, self.context.dem, bbox, ways, step,
+                          max_segment_len, self.context.dem_cache_size)
 
-        return ele.to_response(resp)
+        elevation_profile_to_response(profile, resp)
@@ -2,15 +2,18 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
+from functools import cached_property
+
 import falcon
 
 import sqlalchemy as sa
 
 from ...common.router import Router, needs_db
 from ...common import params
+from ...common.types import BboxParameter
 from ...output.route_list import RouteList
 from ...output.route_item import RouteItem
-from ...output.geojson import to_geojson_response
+from ...output.geojson import stream_geojson_response
 
 class APIListing(Router):
 
@@ -21,30 +24,36 @@ class APIListing(Router):
         app.add_route(base + '/segments', self, suffix='segments')
 
 
-    @needs_db
-    async def on_get_by_area(self, conn, req, resp):
-        bbox = params.as_bbox(req, 'bbox')
-        limit = params.as_int(req, 'limit', default=20, vmin=1, vmax=100)
-        locale = params.get_locale(req)
-
+    @cached_property
+    def by_area_sql(self):
         r = self.context.db.tables.routes.data
         s = self.context.db.tables.segments.data
         h = self.context.db.tables.hierarchy.data
 
         rels = sa.select(sa.func.unnest(s.c.rels).label('rel')).distinct()\
-                    .where(s.c.geom.ST_Intersects(bbox.as_sql()))
+                    .where(s.c.geom.ST_Intersects(BboxParameter().as_sql()))
 
-        sql = sa.select(*RouteItem.make_selectables(r))\
-                   .where(r.c.top)\
-                   .where(sa.or_(r.c.id.in_(sa.select(h.c.parent).distinct()
-                                       .where(h.c.child == rels.subquery().c.rel)),
-                                 r.c.id.in_(rels)
-                         ))\
-                   .limit(limit)\
-                   .order_by(sa.desc(r.c.level), r.c.name)
+        return sa.select(*RouteItem.make_selectables(r))\
+                 .where(r.c.top)\
+                 .where(sa.or_(r.c.id.in_(sa.select(h.c.parent).distinct()
+                                     .where(h.c.child == rels.subquery().c.rel)),
+                               r.c.id.in_(rels)
+                       ))\
+                 .limit(sa.bindparam('limit', type_=sa.Integer))\
+                 .order_by(sa.desc(r.c.level), r.c.name)
+
+
+    @needs_db
+    async def on_get_by_area(self, conn, req, resp):
+        bbox = params.as_bbox(req, 'bbox')
+        limit = params.as_int(req, 'limit', default=20, vmin=1, vmax=100)
+        locale = params.get_locale(req)
+
+        rows = await conn.execute(self.by_area_sql, {**bbox.as_params(), 'limit': limit})
+        await conn.release()
 
         res = RouteList(bbox=bbox)
-        res.add_items(await conn.execute(sql), locale)
+        res.add_items(rows, locale)
         res.to_response(resp)
 
 
@@ -59,8 +68,11 @@ class APIListing(Router):
                 .where(r.c.id.in_(relations))\
                 .order_by(sa.desc(r.c.level), r.c.name)
 
+        rows = await conn.execute(sql)
+        await conn.release()
+
         res = RouteList(relations=relations)
-        res.add_items(await conn.execute(sql), locale)
+        res.add_items(rows, locale)
         res.to_response(resp)
 
 
@@ -91,6 +103,7 @@ class APIListing(Router):
             sql = base.where(r.c.id == int(query))
             res.add_items(await conn.execute(sql), locale)
             if len(res) > 0:
+                await conn.release()
                 return res.to_response(resp)
 
         # Second try: fuzzy matching of text
@@ -128,11 +141,11 @@ class APIListing(Router):
                     break
                 res.add_item(o, locale)
 
+        await conn.release()
         res.to_response(resp)
 
 
-    @needs_db
-    async def on_get_segments(self, conn, req, resp):
+    async def on_get_segments(self, req, resp):
         bbox = params.as_bbox(req, 'bbox')
         relations = params.as_int_list(req, 'relations')
 
@@ -145,6 +158,7 @@ class APIListing(Router):
                         sql.c.id, sql.c.geometry.ST_AsGeoJSON().label('geometry'))\
                 .where(sa.not_(sa.func.ST_IsEmpty(sql.c.geometry)))
 
-        to_geojson_response(await conn.execute(sql), resp)
+        await stream_geojson_response(self.context, sql, resp,
+                                      self.context.statement_timeout(req.uri_template))
 
 
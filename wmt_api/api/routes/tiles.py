@@ -2,28 +2,16 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
-import falcon
-
 import sqlalchemy as sa
 
-from ...common.router import Router, needs_db
-from ...common.types import Bbox
-from ...output.geojson import to_geojson_response
-
-# constants for bbox computation for level 12
-MAPWIDTH = 20037508.34
-TILEWIDTH = MAPWIDTH/(2**11)
-
+from ..tiles import TileRouter
+from ...output.mvt import mvt_geometry, mvt_property, mvt_layer
 
-class APITiles(Router):
 
-    def add_routes(self, app, base):
-        app.add_route(base + '/12/{x:int(min=0, max=2**12)}/{y:int(min=0, max=2**12)}.json', self)
+class APITiles(TileRouter):
 
-    @needs_db
-    async def on_get(self, conn, req, resp, x, y):
-        b = Bbox(x * TILEWIDTH - MAPWIDTH, MAPWIDTH - (y + 1) * TILEWIDTH,
-                 (x + 1) * TILEWIDTH - MAPWIDTH, MAPWIDTH - y * TILEWIDTH)
+    def tile_queries(self, tile, geom_out):
+        b = tile.bbox
 
         # Route ways
         d = self.context.db.tables.style.data
@@ -31,29 +19,66 @@ class APITiles(Router):
                       d.c.cldrels.label('child_relations'),
                       d.c.inrshields.concat(d.c.lshields).label('shields'),
                       d.c.style, d.c['class'],
-                      d.c.geom.ST_Intersection(b.as_sql()).label('geometry'))\
+                      tile.geometry(d.c.geom, d.c.get('geom100'))
+                          .ST_Intersection(b.as_sql()).label('geometry'))\
               .where(d.c.geom.intersects(b.as_sql()))\
-              .order_by(d.c.id)\
-              .subquery()
+              .order_by(d.c.id)
+
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
+
+        q = q.subquery()
 
         q = sa.select(q.c.type, q.c.top_relations,
                       q.c.child_relations, q.c.shields,
                       q.c.style, q.c['class'],
-                      q.c.geometry.ST_AsGeoJSON().label('geometry'))\
+                      geom_out(q.c.geometry).label('geometry'))\
               .where(q.c.geometry.ST_GeometryType().in_(('ST_LineString', 'ST_MultiLineString')))\
               .where(sa.not_(q.c.geometry.ST_IsEmpty()))
 
-        elements = list(await conn.execute(q))
+        queries = [q]
 
         # Guideposts
-        if hasattr(self.context.db.tables, 'guideposts'):
+        if tile.is_detailed and hasattr(self.context.db.tables, 'guideposts'):
             d = self.context.db.tables.guideposts.data
             q = sa.select(sa.literal('guidepost').label('type'),
                           d.c.id.label('osm_id'), d.c.name, d.c.ele,
-                          d.c.geom.ST_AsGeoJSON().label('geometry'))\
+                          geom_out(d.c.geom).label('geometry'))\
+                    .where(d.c.geom.intersects(b.as_sql()))\
+                    .order_by(d.c.id)
+
+            queries.append(q)
+
+        return queries
+
+
+    def mvt_queries(self, tile):
+        b = tile.bbox
+
+        # Route ways
+        d = self.context.db.tables.style.data
+        q = sa.select(mvt_property(d.c.toprels).label('top_relations'),
+                      mvt_property(d.c.cldrels).label('child_relations'),
+                      mvt_property(d.c.inrshields.concat(d.c.lshields)).label('shields'),
+                      d.c.style, d.c['class'],
+                      mvt_geometry(tile.geometry(d.c.geom, d.c.get('geom100')), b)
+                          .label('geom'))\
+              .where(d.c.geom.intersects(b.as_sql()))\
+              .order_by(d.c.id)
+
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
+
+        layers = [mvt_layer('way', q)]
+
+        # Guideposts
+        if tile.is_detailed and hasattr(self.context.db.tables, 'guideposts'):
+            d = self.context.db.tables.guideposts.data
+            q = sa.select(d.c.id.label('osm_id'), d.c.name, d.c.ele,
+                          mvt_geometry(d.c.geom, b).label('geom'))\
                     .where(d.c.geom.intersects(b.as_sql()))\
                     .order_by(d.c.id)
 
-            elements.extend(await conn.execute(q))
+            layers.append(mvt_layer('guidepost', q))
 
-        to_geojson_response(elements, resp)
+        return layers
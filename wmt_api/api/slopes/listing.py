@@ -2,15 +2,18 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
+from functools import cached_property
+
 import falcon
 
 import sqlalchemy as sa
 
 from ...common.router import Router, needs_db
 from ...common import params
+from ...common.types import BboxParameter
 from ...output.route_list import RouteList
 from ...output.route_item import RouteItem
-from ...output.geojson import to_geojson_response
+from ...output.geojson import to_geojson_response, stream_geojson_response
 
 class APIListing(Router):
 
@@ -21,48 +24,60 @@ class APIListing(Router):
         app.add_route(base + '/segments', self, suffix='segments')
 
 
-    @needs_db
-    async def on_get_by_area(self, conn, req, resp):
-        bbox = params.as_bbox(req, 'bbox')
-        limit = params.as_int(req, 'limit', default=20, vmin=1, vmax=100)
-        locale = params.get_locale(req)
-
+    @cached_property
+    def by_area_routes_sql(self):
         r = self.context.db.tables.routes.data
         s = self.context.db.tables.segments.data
         h = self.context.db.tables.hierarchy.data
 
         rels = sa.select(sa.func.unnest(s.c.rels).label('rel')).distinct()\
-                    .where(s.c.geom.ST_Intersects(bbox.as_sql())).alias()
+                    .where(s.c.geom.ST_Intersects(BboxParameter().as_sql())).alias()
 
         sels = RouteItem.make_selectables(r)
         sels.append(sa.literal('relation').label('type'))
-        sql = sa.select(*sels)\
-                   .where(r.c.top)\
-                   .where(sa.or_(r.c.id.in_(sa.select(h.c.parent).distinct()
-                                       .where(h.c.child == rels.c.rel)),
-                                 r.c.id.in_(rels)
-                         ))\
-                   .limit(limit)\
-                   .order_by(sa.desc(r.c.piste), r.c.name)
+        return sa.select(*sels)\
+                 .where(r.c.top)\
+                 .where(sa.or_(r.c.id.in_(sa.select(h.c.parent).distinct()
+                                     .where(h.c.child == rels.c.rel)),
+                               r.c.id.in_(rels)
+                       ))\
+                 .limit(sa.bindparam('limit', type_=sa.Integer))\
+                 .order_by(sa.desc(r.c.piste), r.c.name)
+
+
+    @cached_property
+    def by_area_ways_sql(self):
+        w = self.context.db.tables.ways.data
+        ws = self.context.db.tables.joined_ways.data
+
+        return sa.select(sa.func.coalesce(ws.c.id, w.c.id).label('id'),
+                         sa.case((ws.c.id == None, 'way'), else_='wayset').label('type'),
+                         sa.case((ws.c.id == None, 'yes'), else_='no').label('linear'),
+                         w.c.name, w.c.intnames, w.c.symbol,
+                         w.c.piste).distinct()\
+                 .select_from(w.outerjoin(ws, w.c.id == ws.c.child))\
+                 .where(w.c.geom.ST_Intersects(BboxParameter().as_sql()))\
+                 .order_by(w.c.name)\
+                 .limit(sa.bindparam('limit', type_=sa.Integer))
+
+
+    @needs_db
+    async def on_get_by_area(self, conn, req, resp):
+        bbox = params.as_bbox(req, 'bbox')
+        limit = params.as_int(req, 'limit', default=20, vmin=1, vmax=100)
+        locale = params.get_locale(req)
 
         res = RouteList(bbox=bbox)
-        res.add_items(await conn.execute(sql), locale)
+        res.add_items(await conn.execute(self.by_area_routes_sql,
+                                         {**bbox.as_params(), 'limit': limit}),
+                      locale)
 
         if len(res) < limit:
-            w = self.context.db.tables.ways.data
-            ws = self.context.db.tables.joined_ways.data
-            sql = sa.select(sa.func.coalesce(ws.c.id, w.c.id).label('id'),
-                            sa.case((ws.c.id == None, 'way'), else_='wayset').label('type'),
-                            sa.case((ws.c.id == None, 'yes'), else_='no').label('linear'),
-                            w.c.name, w.c.intnames, w.c.symbol,
-                            w.c.piste).distinct()\
-                    .select_from(w.outerjoin(ws, w.c.id == ws.c.child))\
-                    .where(w.c.geom.ST_Intersects(bbox.as_sql()))\
-                    .order_by(w.c.name)\
-                    .limit(limit - len(res))
-
-            res.add_items(await conn.execute(sql), locale)
+            res.add_items(await conn.execute(self.by_area_ways_sql,
+                                             {**bbox.as_params(), 'limit': limit - len(res)}),
+                          locale)
 
+        await conn.release()
         res.to_response(resp)
 
 
@@ -105,6 +120,7 @@ class APIListing(Router):
 
             res.add_items(await conn.execute(sql), locale, linear='no')
 
+        await conn.release()
         res.to_response(resp)
 
 
@@ -149,6 +165,7 @@ class APIListing(Router):
                 objs.add_items(await conn.execute(idmatch), locale)
 
             if objs:
+                await conn.release()
                 return objs.to_response(resp)
 
         # Second try: fuzzy matching of text
@@ -172,57 +189,49 @@ class APIListing(Router):
                         break
                     objs.add_item(r, locale)
 
+        await conn.release()
         objs.to_response(resp)
 
 
-    @needs_db
-    async def on_get_segments(self, conn, req, resp):
+    async def on_get_segments(self, req, resp):
         bbox = params.as_bbox(req, 'bbox')
         relations = params.as_int_list(req, 'relations', default='')
         ways = params.as_int_list(req, 'ways', default='')
         waysets = params.as_int_list(req, 'waysets', default='')
 
-        objs = []
-
-        if relations:
-            r = self.context.db.tables.routes.data
-            sql = sa.select(sa.literal("relation").label('type'), r.c.id,
-                            r.c.geom.ST_Intersection(bbox.as_sql()).label('geometry'))\
-                    .where(r.c.id.in_(relations)).alias()
+        r = self.context.db.tables.routes.data
+        w = self.context.db.tables.ways.data
+        ws = self.context.db.tables.joined_ways.data
 
-            sql = sa.select(sql.c.type, sql.c.id, sql.c.geometry.ST_AsGeoJSON().label('geometry'))\
-                    .where(sa.not_(sa.func.ST_IsEmpty(sql.c.geometry)))
+        parts = []
 
-            for x in await conn.execute(sql):
-                objs.append(x)
+        if relations:
+            parts.append(sa.select(sa.literal("relation").label('type'), r.c.id,
+                                   r.c.geom.ST_Intersection(bbox.as_sql()).label('geometry'))
+                           .where(r.c.id.in_(relations)))
 
         if ways:
-            w = self.context.db.tables.ways.data
-            sql = sa.select(sa.literal("way").label('type'), w.c.id,
-                            w.c.geom.ST_Intersection(bbox.as_sql()).label('geometry'))\
-                    .where(w.c.id.in_(ways)).alias()
-
-            sql = sa.select(sql.c.type, sql.c.id, sql.c.geometry.ST_AsGeoJSON().label('geometry'))\
-                    .where(sa.not_(sa.func.ST_IsEmpty(sql.c.geometry)))
-
-            for x in await conn.execute(sql):
-                objs.append(x)
+            parts.append(sa.select(sa.literal("way").label('type'), w.c.id,
+                                   w.c.geom.ST_Intersection(bbox.as_sql()).label('geometry'))
+                           .where(w.c.id.in_(ways)))
 
         if waysets:
-            ws = self.context.db.tables.joined_ways.data
-            sql = sa.select(sa.literal("wayset").label('type'),
-                            ws.c.id.label('id'),
-                            sa.func.ST_CollectionHomogenize(
-                                 sa.func.ST_Collect(w.c.geom.ST_Intersection(bbox.as_sql()))).label('geometry')
-                           )\
-                    .select_from(w.join(ws, w.c.id == ws.c.child))\
-                    .where(ws.c.id.in_(waysets)).group_by(ws.c.id).alias()
+            parts.append(sa.select(sa.literal("wayset").label('type'),
+                                   ws.c.id.label('id'),
+                                   sa.func.ST_CollectionHomogenize(
+                                        sa.func.ST_Collect(w.c.geom.ST_Intersection(bbox.as_sql())))
+                                     .label('geometry'))
+                           .select_from(w.join(ws, w.c.id == ws.c.child))
+                           .where(ws.c.id.in_(waysets)).group_by(ws.c.id))
 
-            sql = sa.select(sql.c.type, sql.c.id, sql.c.geometry.ST_AsGeoJSON().label('geometry'))\
-                    .where(sa.not_(sa.func.ST_IsEmpty(sql.c.geometry)))
+        if not parts:
+            to_geojson_response([], resp)
+            return
 
-            for x in await conn.execute(sql):
-                objs.append(x)
+        sql = sa.union_all(*parts).subquery()
 
-        to_geojson_response(objs, resp)
+        sql = sa.select(sql.c.type, sql.c.id, sql.c.geometry.ST_AsGeoJSON().label('geometry'))\
+                .where(sa.not_(sa.func.ST_IsEmpty(sql.c.geometry)))
 
+        await stream_geojson_response(self.context, sql, resp,
+                                      self.context.statement_timeout(req.uri_template))
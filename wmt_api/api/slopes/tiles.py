@@ -2,27 +2,15 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
-import falcon
-
 import sqlalchemy as sa
 
-from ...common.router import Router, needs_db
-from ...common.types import Bbox
-from ...output.geojson import to_geojson_response
-
-# constants for bbox computation for level 12
-MAPWIDTH = 20037508.34
-TILEWIDTH = MAPWIDTH/(2**11)
+from ..tiles import TileRouter
+from ...output.mvt import mvt_geometry, mvt_property, mvt_layer
 
-class APITiles(Router):
+class APITiles(TileRouter):
 
-    def add_routes(self, app, base):
-        app.add_route(base + '/12/{x:int(min=0, max=2**12)}/{y:int(min=0, max=2**12)}.json', self)
-
-    @needs_db
-    async def on_get(self, conn, req, resp, x, y):
-        b = Bbox(x * TILEWIDTH - MAPWIDTH, MAPWIDTH - (y + 1) * TILEWIDTH,
-                 (x + 1) * TILEWIDTH - MAPWIDTH, MAPWIDTH - y * TILEWIDTH)
+    def tile_queries(self, tile, geom_out):
+        b = tile.bbox
 
         # Route ways
         d = self.context.db.tables.style.data
@@ -32,12 +20,15 @@ class APITiles(Router):
                       d.c.novice, d.c.easy, d.c.intermediate, d.c.advanced,
                       d.c.expert, d.c.extreme, d.c.freeride, d.c.downhill,
                       d.c.nordic, d.c.skitour, d.c.sled, d.c.hike, d.c.sleigh,
-                      d.c.geom.ST_Intersection(b.as_sql()).ST_AsGeoJSON().label('geometry'))\
+                      geom_out(tile.geometry(d.c.geom, d.c.get('geom100'))
+                                   .ST_Intersection(b.as_sql())).label('geometry'))\
               .where(d.c.geom.intersects(b.as_sql()))\
               .order_by(d.c.id)
 
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
 
-        elements = list(await conn.execute(q))
+        queries = [q]
 
         # Joined ways
         d = self.context.db.tables.ways.data
@@ -50,10 +41,56 @@ class APITiles(Router):
                       wayset_id.label('wayset_ids'),
                       d.c.symbol.label('shield'),
                       d.c.difficulty, d.c.piste, # TODO: take apart
-                      d.c.geom.ST_Intersection(b.as_sql()).ST_AsGeoJSON().label('geometry'))\
+                      geom_out(tile.geometry(d.c.geom)
+                                   .ST_Intersection(b.as_sql())).label('geometry'))\
               .where(d.c.geom.intersects(b.as_sql()))\
               .order_by(d.c.id)
 
-        elements.extend(await conn.execute(q))
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
+
+        queries.append(q)
+
+        return queries
+
+
+    def mvt_queries(self, tile):
+        b = tile.bbox
+
+        # Route ways
+        d = self.context.db.tables.style.data
+        q = sa.select(mvt_property(d.c.sources).label('top_relations'),
+                      mvt_property(d.c.symbol).label('shields'),
+                      d.c.novice, d.c.easy, d.c.intermediate, d.c.advanced,
+                      d.c.expert, d.c.extreme, d.c.freeride, d.c.downhill,
+                      d.c.nordic, d.c.skitour, d.c.sled, d.c.hike, d.c.sleigh,
+                      mvt_geometry(tile.geometry(d.c.geom, d.c.get('geom100')), b)
+                          .label('geom'))\
+              .where(d.c.geom.intersects(b.as_sql()))\
+              .order_by(d.c.id)
+
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
+
+        layers = [mvt_layer('way', q)]
+
+        # Joined ways
+        d = self.context.db.tables.ways.data
+        ws = self.context.db.tables.joined_ways.data
+
+        wayset_id = sa.select(sa.func.array_agg(ws.c.id).label('ids')).where(ws.c.child == d.c.id).scalar_subquery()
+
+        q = sa.select(d.c.id.label('way_id'),
+                      mvt_property(wayset_id).label('wayset_ids'),
+                      d.c.symbol.label('shield'),
+                      d.c.difficulty, d.c.piste,
+                      mvt_geometry(tile.geometry(d.c.geom), b).label('geom'))\
+              .where(d.c.geom.intersects(b.as_sql()))\
+              .order_by(d.c.id)
+
+        if not tile.is_detailed:
+            q = q.where(d.c.geom.ST_Length() >= tile.pixel_size)
+
+        layers.append(mvt_layer('wayset', q))
 
-        to_geojson_response(elements, resp)
+        return layers
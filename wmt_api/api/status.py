@@ -5,13 +5,20 @@
 
 import sqlalchemy as sa
 
+from ..common.access import InternalAccess
 from ..common.json_writer import JsonWriter
 from ..common.router import Router, needs_db
 
 class APIStatus(Router):
 
+    def __init__(self, context):
+        super().__init__(context)
+        self.access = InternalAccess.from_context(context)
+
+
     def add_routes(self, app, base):
         app.add_route(base, self)
+        app.add_route(base + '/pool', self, suffix='pool')
 
 
     @needs_db
@@ -20,6 +27,7 @@ class APIStatus(Router):
 
         res = await conn.scalar(sa.select(status.c.date)
                                   .where(status.c.part == 'base'))
+        await conn.release()
 
         out = JsonWriter().start_object()
 
@@ -29,3 +37,8 @@ class APIStatus(Router):
         out.end_object()
 
         out.to_response(resp)
+
+
+    async def on_get_pool(self, req, resp):
+        self.access.check(req)
+        JsonWriter().value(self.context.pool_statistics).to_response(resp)
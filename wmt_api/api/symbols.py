@@ -2,43 +2,211 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2020-2023 Sarah Hoffmann
-from pathlib import Path
+import hashlib
+from urllib.parse import parse_qsl, quote, urlencode
 
-import aiofiles
 import falcon
 
+from ..common.cache import LRUCache
+from ..common.errors import APIError
 from ..common.router import Router
+from ..common.symbol_store import SymbolStore
+from ..output.symbol_bundle import symbols_to_json, symbols_to_sprite
+
+# Symbol files never change, so they may be cached forever.
+IMMUTABLE = ['public', 'max-age=31536000', 'immutable']
+
+# Maximum number of symbols that can be requested in a bundle.
+MAX_BUNDLE_SIZE = 100
 
 
 class APISymbols(Router):
 
+    def __init__(self, context):
+        super().__init__(context)
+        self.max_age = context.get_setting('SYMBOL_MAX_AGE', 7 * 24 * 3600)
+        # Rendered shields with their ETag. Unknown shields are saved as None.
+        self.shields = LRUCache(context.get_setting('SYMBOL_CACHE_SIZE', 16 * 1024 * 1024),
+                                sizeof=lambda v: 1 if v is None else len(v[0]))
+        self.symbols = SymbolStore(
+                         max_size=context.get_setting('SYMBOL_STORE_SIZE', 32 * 1024 * 1024),
+                         negative_ttl=context.get_setting('SYMBOL_NEGATIVE_TTL', 60))
+        # Location of the symbol directory in the reverse proxy. When set,
+        # files too large for the store are sent by the proxy.
+        self.accel_redirect = context.get_setting('SYMBOL_ACCEL_REDIRECT')
+        # Rendered bundles with ETag and cache control settings.
+        self.bundles = LRUCache(context.get_setting('SYMBOL_BUNDLE_CACHE_SIZE', 16 * 1024 * 1024),
+                                sizeof=lambda v: len(v[0]))
+
+
     def add_routes(self, app, base):
         app.add_route(base + '/from_tags/{style}', self, suffix='from_tags')
         app.add_route(base + '/id/{symbol}', self, suffix='by_uuid')
+        app.add_route(base + '/bundle', self, suffix='bundle')
 
 
     async def on_get_from_tags(self, req, resp, style):
         """ Create a route shield from a set of OSM tags. The tag list must be
             given as keyword parameters."""
-        sym = self.context.shield_factory.create(req.params, '', style=style)
-        if sym is None:
+        shield = self.get_shield(style, req.params)
+
+        if shield is None:
             raise falcon.HTTPNotFound()
 
-        resp.text = sym.create_image('svg')
+        svg, etag = shield
+        resp.cache_control = ['public', f'max-age={self.max_age}']
         resp.content_type = 'image/svg+xml'
+        if not _not_modified(req, resp, etag):
+            resp.data = svg
+            resp.context.cache_key = ('symbol', etag)
 
 
     async def on_get_by_uuid(self, req, resp, symbol):
         """ Retrive a symbol SVG by its ID. These are the IDs returned by the API
             for the routes."""
+        sym = await self.get_symbol(symbol)
+        if sym is None:
+            raise falcon.HTTPNotFound()
+
+        resp.cache_control = IMMUTABLE
+        resp.content_type = 'image/svg+xml'
+        if _not_modified(req, resp, sym.etag):
+            return
+
+        if sym.data is not None:
+            resp.data = sym.data
+            resp.context.cache_key = ('symbol-id', sym.etag)
+        elif self.accel_redirect is not None:
+            resp.set_header('X-Accel-Redirect',
+                            self.accel_redirect.rstrip('/') + '/' + quote(sym.name))
+        else:
+            resp.set_stream(await sym.open(), sym.size)
+
+
+    async def on_get_bundle(self, req, resp):
+        """ Return multiple symbols in one response. 'ids' is a comma-separated
+            list of symbol IDs. Each 'tags' parameter describes a shield
+            created from tags in the form '<style>?<tag>=<value>&...'.
+
+            With 'format=json' (the default), a JSON object is returned that
+            maps the IDs and the normalised tag descriptions to the SVG or
+            null for unknown symbols. 'format=sprite' returns all known
+            symbols stacked into one SVG image, 'format=index' a JSON object
+            with the position and size of each symbol in the sprite.
+        """
+        fmt = req.get_param('format', default='json')
+        if fmt not in ('json', 'sprite', 'index'):
+            raise APIError("Supported formats are: json, sprite, index")
+
+        ids = sorted(set(req.get_param_as_list('ids', default=[])))
+        tags = req.params.get('tags', [])
+        tags = sorted({_normalize_tags(t) for t in ([tags] if isinstance(tags, str) else tags)})
+
+        if len(ids) + len(tags) > MAX_BUNDLE_SIZE:
+            raise APIError(f"A bundle can contain at most {MAX_BUNDLE_SIZE} symbols.")
+
+        bundle = self.bundles.get((fmt, tuple(ids), tuple(tags)))
+        if bundle is None:
+            bundle = await self.make_bundle(fmt, ids, tags)
+
+        data, etag, cache_control = bundle
+        resp.cache_control = cache_control
+        resp.content_type = 'image/svg+xml' if fmt == 'sprite' else falcon.MEDIA_JSON
+        if not _not_modified(req, resp, etag):
+            resp.data = data
+            resp.context.cache_key = ('symbol-bundle', etag)
+
+
+    def get_shield(self, style, tags):
+        """ Return the SVG and ETag of the shield for the given tags or
+            None, when the tags do not result in a shield.
+        """
+        key = (style, tuple(sorted((k, tuple(v) if isinstance(v, list) else v)
+                                   for k, v in tags.items())))
+        shield = self.shields.get(key, False)
+
+        if shield is False:
+            sym = self.context.shield_factory.create(tags, '', style=style)
+            if sym is None:
+                shield = None
+            else:
+                svg = sym.create_image('svg')
+                if isinstance(svg, str):
+                    svg = svg.encode('utf-8')
+                shield = (svg, _make_etag(svg))
+            self.shields.put(key, shield)
+
+        return shield
+
+
+    async def get_symbol(self, symbol):
+        """ Return the symbol file for the given ID or None if it doesn't exist.
+        """
+        if symbol.startswith('.') or '/' in symbol or '\\' in symbol:
+            return None
         if not '.' in symbol:
             symbol += '.svg'
-        filename = Path(self.context.config.ROUTES.symbol_datadir) / symbol
 
-        if not filename.exists():
-            raise falcon.HTTPNotFound()
+        return await self.symbols.get(self.context.config.ROUTES.symbol_datadir, symbol)
 
-        async with aiofiles.open(filename, 'rb') as output:
-            resp.data = await output.read()
 
-        resp.content_type = 'image/svg+xml'
+    async def make_bundle(self, fmt, ids, tags):
+        """ Create the bundle in the given format for the given symbol IDs
+            and normalised tag descriptions and add it to the cache.
+            The sprite and its index are always created together.
+        """
+        symbols = []
+        complete = True
+        for symbol in ids:
+            sym = await self.get_symbol(symbol)
+            if sym is None:
+                complete = False
+                symbols.append((symbol, None))
+            elif sym.data is None:
+                async with sym.open() as fd:
+                    symbols.append((symbol, await fd.read()))
+            else:
+                symbols.append((symbol, sym.data))
+
+        for desc in tags:
+            style, _, query = desc.partition('?')
+            shield = self.get_shield(style, dict(parse_qsl(query)))
+            symbols.append((desc, None if shield is None else shield[0]))
+
+        # Symbol files never change but unknown ones may appear later.
+        cache_control = IMMUTABLE if complete and not tags\
+                        else ['public', f'max-age={self.max_age}']
+
+        if fmt == 'json':
+            outputs = (('json', symbols_to_json(symbols)),)
+        else:
+            outputs = zip(('sprite', 'index'), symbols_to_sprite(symbols))
+
+        bundles = {}
+        for name, data in outputs:
+            bundles[name] = (data, _make_etag(data), cache_control)
+            self.bundles.put((name, tuple(ids), tuple(tags)), bundles[name])
+
+        return bundles[fmt]
+
+
+def _normalize_tags(desc):
+    style, _, query = desc.partition('?')
+    return f'{style}?{urlencode(sorted(parse_qsl(query)))}'
+
+
+def _make_etag(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _not_modified(req, resp, etag):
+    """ Set the ETag of the response. Return True and set the status
+        to 304, when the client already has the current version.
+    """
+    resp.etag = etag
+    if_none_match = req.if_none_match or ()
+    if etag in if_none_match or '*' in if_none_match:
+        resp.status = falcon.HTTP_NOT_MODIFIED
+        return True
+
+    return False
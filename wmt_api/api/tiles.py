@@ -0,0 +1,197 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+import falcon
+
+from ..common import params
+from ..common.cache import LRUCache
+from ..common.router import Router, SingleFlight, needs_db, single_flight
+from ..common.tile_cache import TileCache
+from ..common.types import MIN_TILE_ZOOM, MAX_TILE_ZOOM, DETAIL_TILE_ZOOM,\
+                           Tile, MetaTile, BboxParameter
+from ..output.geojson import features_to_geojson
+from ..output.mvt import MEDIA_MVT
+from ..output.tile_features import TileFeatures
+
+TILE_MEDIA_TYPES = {'json': falcon.MEDIA_JSON, 'mvt': MEDIA_MVT}
+
+# Conversion of the geometry column for the different outputs of tile_queries().
+GEOMETRY_OUTPUT = {'json': lambda g: g.ST_AsGeoJSON(),
+                   'wkb': lambda g: g.ST_AsBinary()}
+
+
+class TileRouter(Router):
+    """ Base class for the tile API of the different map types.
+
+        Map types need to implement the functions tile_queries() and
+        mvt_queries(), which return the SQL statements for the content
+        of a single tile. The statements are created only once per zoom
+        level and reused with the bounding box of the tile as parameters.
+    """
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.cache = TileCache(context)
+        self.overzoom = context.get_setting('TILE_OVERZOOM', False)
+        self.detail_features = LRUCache(
+                    context.get_setting('TILE_OVERZOOM_CACHE_SIZE', 100 * 1024 * 1024),
+                    sizeof=TileFeatures.memory_size,
+                    ttl=context.get_setting('TILE_OVERZOOM_CACHE_TTL', 300))
+        self.metatile_size = context.get_setting('TILE_METATILE_SIZE', 1)
+        self.metatiles = SingleFlight()
+        self.statements = {}
+
+
+    def add_routes(self, app, base):
+        tile = base + f'/{{zoom:int(min={MIN_TILE_ZOOM}, max={MAX_TILE_ZOOM})}}'\
+                      '/{x:int(min=0)}/{y:int(min=0)}'
+        app.add_route(tile + '.json', self)
+        app.add_route(tile + '.pbf', self, suffix='mvt')
+        app.add_route(tile + '.mvt', self, suffix='mvt')
+
+
+    def tile_queries(self, tile, geom_out):
+        """ Return a list of SQL statements that select the features
+            of the given tile. 'geom_out' is a function that converts the
+            geometry column into the output format. The geometry must be
+            returned in a column named 'geometry'. The bounding box of
+            the tile must only be used via tile.bbox.as_sql().
+        """
+        raise NotImplementedError
+
+
+    def mvt_queries(self, tile):
+        """ Return a list of SQL statements that each return a layer
+            of the vector tile for the given tile. The same restrictions
+            as for tile_queries() apply.
+        """
+        raise NotImplementedError
+
+
+    @single_flight
+    async def on_get(self, req, resp, zoom, x, y):
+        await self.tile_response(resp, params.as_tile(zoom, x, y), 'json')
+
+
+    @single_flight
+    async def on_get_mvt(self, req, resp, zoom, x, y):
+        await self.tile_response(resp, params.as_tile(zoom, x, y), 'mvt')
+
+
+    async def tile_response(self, resp, tile, fmt):
+        """ Write the content of the tile in the given format into the
+            response. The tile is taken from the cache where possible.
+        """
+        data = await self.cache.get(tile, fmt)
+
+        if data is None:
+            if self.use_metatile(tile, fmt):
+                metatile = MetaTile(tile, self.metatile_size)
+                # Neighbouring tiles may be requested at the same time.
+                tiles = await self.metatiles.run((metatile.zoom, metatile.x, metatile.y),
+                                                 lambda: self.render_metatile(metatile))
+                data = next(d for t, d in tiles if t.x == tile.x and t.y == tile.y)
+            else:
+                data = await self.render_tile(tile, fmt)
+                await self.cache.put([(tile, data)], fmt)
+
+        version = await self.cache.version()
+        if version is not None:
+            resp.context.cache_key = (self.context.mapname, version,
+                                      fmt, tile.zoom, tile.x, tile.y)
+
+        resp.status = 200
+        resp.content_type = TILE_MEDIA_TYPES[fmt]
+        resp.data = data
+
+
+    async def render_tile(self, tile, fmt):
+        """ Compute the content of the tile in the given format.
+            Returns the tile as bytes.
+        """
+        if fmt == 'mvt':
+            return await self.query_mvt(tile)
+
+        if self.overzoom and tile.zoom > DETAIL_TILE_ZOOM:
+            features = await self.get_detail_features(tile.parent(DETAIL_TILE_ZOOM))
+            return features.clip(tile.bbox).to_geojson().as_bytes()
+
+        rows = await self.query_tile(tile, 'json')
+
+        return features_to_geojson((r.geometry, r._mapping) for r in rows).as_bytes()
+
+
+    def use_metatile(self, tile, fmt):
+        """ Check if the tile should be computed together with its
+            neighbours as part of a metatile.
+        """
+        return self.metatile_size > 1 and fmt == 'json'\
+               and not (self.overzoom and tile.zoom > DETAIL_TILE_ZOOM)
+
+
+    async def render_metatile(self, metatile):
+        """ Compute the GeoJSON content of all tiles of the metatile.
+            The features are fetched from the database for the full
+            metatile area at once and then split up into the single tiles.
+            All tiles are added to the cache. Returns a list of pairs of
+            tile and tile content.
+        """
+        features = TileFeatures.from_rows(await self.query_tile(metatile, 'wkb'))
+
+        tiles = [(tile, features.clip(tile.bbox).to_geojson().as_bytes())
+                 for tile in metatile.tiles()]
+        await self.cache.put(tiles, 'json')
+
+        return tiles
+
+
+    async def get_detail_features(self, tile):
+        """ Return the features of the given tile as a TileFeatures
+            collection. Results are cached, so that the features can
+            be used to compute higher zoom tiles without going back to
+            the database.
+        """
+        version = await self.cache.version()
+        features = self.detail_features.get((version, tile.zoom, tile.x, tile.y))
+
+        if features is None:
+            features = TileFeatures.from_rows(await self.query_tile(tile, 'wkb'))
+            self.detail_features.put((version, tile.zoom, tile.x, tile.y), features)
+
+        return features
+
+
+    def get_statements(self, kind, zoom):
+        """ Return the SQL statements for tiles of the given zoom level.
+            'kind' is 'mvt' for vector tiles or the geometry output format
+            for tile_queries(). The statements expect the bounding box of
+            the tile as parameters.
+        """
+        key = (kind, zoom)
+        if key not in self.statements:
+            template = Tile(zoom, 0, 0)
+            template.bbox = BboxParameter()
+            if kind == 'mvt':
+                self.statements[key] = self.mvt_queries(template)
+            else:
+                self.statements[key] = self.tile_queries(template, GEOMETRY_OUTPUT[kind])
+
+        return self.statements[key]
+
+
+    @needs_db
+    async def query_tile(self, conn, tile, output):
+        params = tile.bbox.as_params()
+        elements = []
+        for sql in self.get_statements(output, tile.zoom):
+            elements.extend(await conn.execute(sql, params))
+
+        return elements
+
+
+    @needs_db
+    async def query_mvt(self, conn, tile):
+        params = tile.bbox.as_params()
+        return b''.join([bytes(await conn.scalar(sql, params) or b'')
+                         for sql in self.get_statements('mvt', tile.zoom)])
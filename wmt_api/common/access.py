@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Access control for endpoints with internal information.
+"""
+import hmac
+import ipaddress
+
+import falcon
+
+DEFAULT_INTERNAL_NETWORKS = ('127.0.0.0/8', '::1/128')
+
+
+class InternalAccess:
+    """ Restricts access to endpoints that publish internal information
+        about the server, like statistics about the connection pool.
+
+        Clients are allowed when their address is in one of the
+        IP 'networks' or when they send the 'token' as a bearer token
+        in the Authorization header.
+    """
+
+    def __init__(self, networks=DEFAULT_INTERNAL_NETWORKS, token=None):
+        self.networks = [ipaddress.ip_network(n) for n in networks]
+        self.token = token
+
+
+    @staticmethod
+    def from_context(context):
+        return InternalAccess(
+                 networks=context.get_setting('INTERNAL_NETWORKS', DEFAULT_INTERNAL_NETWORKS),
+                 token=context.get_setting('INTERNAL_TOKEN'))
+
+
+    def check(self, req):
+        """ Raise a '403 Forbidden' error, when the client of the
+            request is not allowed.
+        """
+        if self.token is not None:
+            auth = req.get_header('Authorization') or ''
+            if hmac.compare_digest(auth.encode('utf-8'), f'Bearer {self.token}'.encode('utf-8')):
+                return
+
+        try:
+            addr = ipaddress.ip_address(req.remote_addr)
+        except ValueError:
+            addr = None
+        else:
+            if addr.version == 6 and addr.ipv4_mapped is not None:
+                addr = addr.ipv4_mapped
+
+        if addr is None or not any(addr in net for net in self.networks):
+            raise falcon.HTTPForbidden()
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+In-memory caches for rendered results.
+"""
+from typing import Any, Callable, Optional, Hashable
+from collections import OrderedDict
+import time
+
+
+class LRUCache:
+    """ A simple least-recently-used cache with an upper bound on the
+        total size of the cached values.
+
+        The size of a value is computed with the 'sizeof' function.
+        When it is not given, each entry has the size 1 and 'max_size' is
+        the maximum number of entries. When 'ttl' is set, entries expire
+        after the given number of seconds.
+    """
+
+    def __init__(self, max_size: int, sizeof: Optional[Callable[[Any], int]] = None,
+                 ttl: Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda _: 1)
+        self.ttl = ttl
+        self.size = 0
+        self.data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Return the value for the given key or 'default' if the key
+            is not in the cache.
+        """
+        entry = self.data.get(key)
+        if entry is None:
+            return default
+
+        value, _, expires = entry
+        if expires is not None and expires < time.monotonic():
+            self.remove(key)
+            return default
+
+        self.data.move_to_end(key)
+        return value
+
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """ Add the value to the cache, evicting the least recently used
+            entries if necessary. Values that are larger than the
+            cache itself are not added.
+        """
+        self.remove(key)
+
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self.data[key] = (value, size, expires)
+        self.size += size
+
+        while self.size > self.max_size:
+            _, (_, oldsize, _) = self.data.popitem(last=False)
+            self.size -= oldsize
+
+
+    def remove(self, key: Hashable) -> None:
+        """ Remove the given key from the cache, if it exists.
+        """
+        entry = self.data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+    def clear(self) -> None:
+        """ Remove all entries from the cache.
+        """
+        self.data.clear()
+        self.size = 0
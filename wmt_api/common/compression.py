@@ -0,0 +1,201 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Compression of response bodies.
+"""
+import asyncio
+import zlib
+
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    zstandard = None
+
+from .cache import LRUCache
+
+# Media types of responses that are worth compressing.
+COMPRESSIBLE_TYPES = {'application/json', 'application/gpx+xml',
+                      'application/vnd.google-earth.kml+xml', 'image/svg+xml',
+                      'application/vnd.mapbox-vector-tile'}
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self):
+        self.obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.obj.compress(data) + self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        return self.obj.compress(data) + self.obj.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self):
+        self.obj = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self.obj.process(data) + self.obj.flush()
+
+    def finish(self, data=b''):
+        return self.obj.process(data) + self.obj.finish()
+
+
+class ZstdEncoder:
+    name = 'zstd'
+
+    def __init__(self):
+        self.obj = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self.obj.compress(data) + self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data=b''):
+        return self.obj.compress(data) + self.obj.flush()
+
+
+# Available encoders in the order of preference.
+ENCODERS = [enc for enc, available in ((ZstdEncoder, zstandard is not None),
+                                       (BrotliEncoder, brotli is not None),
+                                       (GzipEncoder, True))
+            if available]
+
+
+def choose_encoder(accept_encoding, encoders=ENCODERS):
+    """ Return the preferred encoder class that is acceptable according
+        to the given Accept-Encoding header or None, if the response
+        should not be compressed.
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, *params = part.strip().split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best = None
+    for enc in encoders:
+        quality = accepted.get(enc.name, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, enc)
+
+    return None if best is None else best[1]
+
+
+class CompressedStream:
+    """ Wraps the asynchronous iterator of a streamed response and
+        compresses the chunks on the fly.
+
+        Asynchronous file objects are read in blocks of 'chunk_size'
+        bytes. Iterating over them would return lines and each line
+        would end up in its own flushed block of compressed data.
+    """
+
+    def __init__(self, stream, encoder, chunk_size=64 * 1024):
+        self.stream = stream
+        self.encoder = encoder
+        self.chunk_size = chunk_size
+
+
+    async def __aiter__(self):
+        async for chunk in self._chunks():
+            if chunk:
+                yield await asyncio.to_thread(self.encoder.compress, chunk)
+
+        yield self.encoder.finish()
+
+
+    async def _chunks(self):
+        if hasattr(self.stream, 'read'):
+            while chunk := await self.stream.read(self.chunk_size):
+                yield chunk
+        else:
+            async for chunk in self.stream:
+                yield chunk
+
+
+    async def close(self):
+        if hasattr(self.stream, 'close'):
+            await self.stream.close()
+
+
+class CompressionMiddleware:
+    """ Falcon middleware that compresses the response body according
+        to the Accept-Encoding header of the request. Supports gzip and,
+        when the Python packages are installed, brotli and zstd.
+
+        Bodies smaller than 'min_size' bytes are sent uncompressed.
+        Compression runs in a separate thread.
+
+        Responders that serve their content from a cache may set
+        'cache_key' in the response context to a key that uniquely
+        identifies the content. The compressed body is then kept in an
+        LRU cache of 'cache_size' bytes and reused.
+
+        A strong ETag set by the responder is turned into a weak one
+        because the bytes sent differ between the content encodings.
+    """
+
+    def __init__(self, min_size=1024, cache_size=64 * 1024 * 1024):
+        self.min_size = min_size
+        self.cache = LRUCache(cache_size, sizeof=len)
+
+
+    async def process_response(self, req, resp, resource, req_succeeded):
+        content_type = (resp.content_type or 'application/json').split(';')[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES and not content_type.startswith('text/'):
+            return
+
+        if resp.get_header('Content-Encoding') is not None:
+            return
+
+        resp.append_header('Vary', 'Accept-Encoding')
+
+        etag = resp.etag
+        if etag is not None and not etag.startswith('W/'):
+            resp.etag = 'W/' + etag
+
+        encoder = choose_encoder(req.get_header('Accept-Encoding'))
+        if encoder is None:
+            return
+
+        if resp.stream is not None:
+            resp.stream = CompressedStream(resp.stream, encoder())
+        else:
+            body = await resp.render_body()
+            if body is None or len(body) < self.min_size:
+                return
+
+            key = resp.context.get('cache_key')
+            data = None if key is None else self.cache.get((key, encoder.name))
+            if data is None:
+                data = await asyncio.to_thread(encoder().finish, body)
+                if key is not None:
+                    self.cache.put((key, encoder.name), data)
+
+            resp.text = None
+            resp.data = data
+
+        # The length of the compressed body is not known in advance.
+        resp.content_length = None
+        resp.set_header('Content-Encoding', encoder.name)
@@ -4,22 +4,45 @@
 # Copyright (C) 2023 Sarah Hoffmann
 import importlib
 import logging
+import time
+from functools import cached_property
 from pathlib import Path
 
+import sqlalchemy as sa
 import sqlalchemy.ext.asyncio as sa_asyncio
 from sqlalchemy.engine.url import URL
 
 from wmt_shields import ShieldFactory
 
+from .metrics import PoolStatistics, track_queries
+from .replicas import ReplicaSet
+from .wikipedia import WikipediaClient
+from .workers import WorkerPool
+
 log = logging.getLogger(__name__)
 
+class SharedEngine:
+    """ A database engine that may be used by multiple contexts together
+        with the statistics about its connection pool.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.pool_statistics = PoolStatistics(engine)
+
+
 class Context:
     """ Provide global settings and the DB engine for the
         Waymarkedtrails API.
+
+        Contexts of different maps may share their database engines.
+        To that end, pass the same dictionary as 'engines' to all contexts.
+        Engines are then reused for identical database URLs and settings.
     """
 
-    def __init__(self, mapname, url=None):
+    def __init__(self, mapname, url=None, replicas=None, engines=None):
         self.mapname = mapname
+        self.engines = {} if engines is None else engines
 
         try:
             self.config = importlib.import_module(f'wmt_db.config.{mapname}')
@@ -28,29 +51,228 @@ class Context:
             raise
 
         try:
-            api_config = importlib.import_module('wmt_local_config.api')
-            self.dem = Path(api_config.DEM_FILE)
+            self.api_config = importlib.import_module('wmt_local_config.api')
         except ModuleNotFoundError:
             log.warning("Cannot find API config. Elevation profiles not available.")
-            self.dem = None
+            self.api_config = None
 
-        self.shield_factory = ShieldFactory(self.config.ROUTES.symbols, self.config.SYMBOLS)
+        dem_file = self.get_setting('DEM_FILE')
+        self.dem = None if dem_file is None else Path(dem_file)
+        self.dem_cache_size = self.get_setting('DEM_CACHE_SIZE', 128 * 1024 * 1024)
 
         try:
-            mapdb_pkg = importlib.import_module(
-                          f'wmt_db.maptype.{self.config.MAPTYPE}')
+            self.mapdb_pkg = importlib.import_module(
+                               f'wmt_db.maptype.{self.config.MAPTYPE}')
         except ModuleNotFoundError:
             log.error("Unknown map type '%s'.", self.config.MAPTYPE)
             raise
 
-        class Options:
-            no_engine = True
-
-        self.db = mapdb_pkg.create_mapdb(self.config, Options())
-
         if url is None:
             url = URL.create('postgresql+psycopg',
                                  database=self.config.DB_NAME,
                                  username=self.config.DB_USER,
                                  password=self.config.DB_PASSWORD)
-        self.engine = sa_asyncio.create_async_engine(url, echo=False)
+        shared = self._shared_engine(url)
+        self.engine = shared.engine
+        self.pool_statistics = shared.pool_statistics
+
+        if replicas is None:
+            replicas = self.get_setting('DB_REPLICAS', [])
+        self.replicas = None if not replicas else\
+                        ReplicaSet(self, replicas,
+                                   max_lag=self.get_setting('DB_REPLICA_MAX_LAG', 300),
+                                   check_interval=self.get_setting('DB_REPLICA_CHECK_INTERVAL', 30),
+                                   connect_timeout=self.get_setting('DB_REPLICA_CONNECT_TIMEOUT', 5))
+
+
+    @cached_property
+    def db(self):
+        """ Table definitions of the map database.
+        """
+        class Options:
+            no_engine = True
+
+        return self.mapdb_pkg.create_mapdb(self.config, Options())
+
+
+    @cached_property
+    def shield_factory(self):
+        return ShieldFactory(self.config.ROUTES.symbols, self.config.SYMBOLS)
+
+
+    @cached_property
+    def workers(self):
+        """ Pool for computations that would block the event loop.
+        """
+        return WorkerPool(workers=self.get_setting('WORKERS', 2),
+                          queue_size=self.get_setting('WORKER_QUEUE_SIZE', 8),
+                          processes=self.get_setting('WORKER_PROCESSES', False))
+
+
+    @cached_property
+    def wikipedia(self):
+        """ Client for looking up Wikipedia articles in other languages.
+        """
+        return WikipediaClient(timeout=self.get_setting('WIKIPEDIA_TIMEOUT', 2.0),
+                               ttl=self.get_setting('WIKIPEDIA_CACHE_TTL', 7 * 24 * 3600),
+                               cache_file=self.get_setting('WIKIPEDIA_CACHE_FILE'))
+
+
+    def create_engine(self, url, connect_timeout=None):
+        """ Return a database engine for the given URL with the
+            configured pool settings. An existing engine is reused
+            when it has been created for the same URL and settings before.
+            'connect_timeout' limits the time in seconds for opening
+            a new connection.
+        """
+        return self._shared_engine(url, connect_timeout).engine
+
+
+    def _shared_engine(self, url, connect_timeout=None):
+        if isinstance(url, str):
+            url = sa.engine.make_url(url)
+
+        connect_args = {'prepare_threshold': self.get_setting('DB_PREPARE_THRESHOLD', 5)}
+        timeout = self.get_setting('STATEMENT_TIMEOUT')
+        if timeout is not None:
+            connect_args['options'] = f'-c statement_timeout={int(timeout * 1000)}'
+        if connect_timeout is not None:
+            connect_args['connect_timeout'] = max(1, int(connect_timeout))
+
+        options = {'pool_size': self.get_setting('DB_POOL_SIZE', 5),
+                   'max_overflow': self.get_setting('DB_MAX_OVERFLOW', 10),
+                   'pool_recycle': self.get_setting('DB_POOL_RECYCLE', -1),
+                   'pool_pre_ping': self.get_setting('DB_POOL_PRE_PING', False),
+                   'pool_timeout': self.get_setting('DB_POOL_TIMEOUT', 30)}
+
+        # The tables of a map are qualified with the schema of the map,
+        # so that maps in the same database can use the same connections
+        # without selecting a schema. Pool size and connection parameters
+        # belong to the engine, so maps with different settings for the
+        # same database still need separate engines.
+        key = (url.render_as_string(hide_password=False),
+               tuple(sorted(options.items())), tuple(sorted(connect_args.items())))
+
+        if key not in self.engines:
+            engine = sa_asyncio.create_async_engine(url, echo=False,
+                                                    connect_args=connect_args, **options)
+            track_queries(engine)
+            sa.event.listen(engine.sync_engine, 'reset', _reset_statement_timeout)
+            self.engines[key] = SharedEngine(engine)
+
+        return self.engines[key]
+
+
+    async def connect(self, read_only=False, statement_timeout=None, autocommit=False):
+        """ Get a connection from the connection pool. The caller is
+            responsible for closing the connection again.
+
+            Read-only connections are taken from one of the replicas,
+            when replicas are configured and usable. The primary database
+            serves as fallback.
+
+            'statement_timeout' overwrites the configured STATEMENT_TIMEOUT
+            for the connection until it is returned to the pool.
+            With 'autocommit', the connection runs without transactions.
+        """
+        conn = None
+        if read_only and self.replicas is not None:
+            for engine in await self.replicas.engines():
+                try:
+                    conn = await self._connect(engine)
+                    break
+                except (sa.exc.DBAPIError, OSError) as exc:
+                    log.warning("Cannot connect to replica %s: %s", engine.url, exc)
+                    self.replicas.mark_failed(engine)
+
+        if conn is None:
+            conn = await self._connect(self.engine)
+
+        try:
+            # The isolation level can only be changed before the first
+            # statement opens a transaction.
+            if autocommit:
+                conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+
+            if statement_timeout is not None:
+                await conn.exec_driver_sql(
+                    f'SET statement_timeout = {int(statement_timeout * 1000)}')
+                (await conn.get_raw_connection()).info['statement_timeout'] = True
+        except BaseException:
+            await conn.close()
+            raise
+
+        return conn
+
+
+    def statement_timeout(self, uri_template):
+        """ Return the statement timeout in seconds configured in
+            STATEMENT_TIMEOUTS for the route with the given URI template
+            or None, when the general STATEMENT_TIMEOUT applies.
+        """
+        for route, timeout in self.get_setting('STATEMENT_TIMEOUTS', {}).items():
+            if uri_template is not None and uri_template.endswith(route):
+                return timeout
+
+        return None
+
+
+    async def dispose(self):
+        """ Close all database connections, including the ones of
+            other contexts sharing the engines, the Wikipedia client and
+            the worker pool. Stops running checks of the replicas.
+        """
+        if self.replicas is not None:
+            await self.replicas.close()
+
+        for shared in self.engines.values():
+            await shared.engine.dispose()
+
+        if 'wikipedia' in vars(self):
+            await self.wikipedia.close()
+            del self.wikipedia
+
+        if 'workers' in vars(self):
+            self.workers.shutdown()
+            del self.workers
+
+
+    async def _connect(self, engine):
+        start = time.monotonic()
+        try:
+            conn = await engine.connect()
+        except sa.exc.TimeoutError:
+            self.pool_statistics.timeouts += 1
+            raise
+        self.pool_statistics.wait_time.observe(time.monotonic() - start)
+
+        return conn
+
+
+    def get_setting(self, name, default=None):
+        """ Return the value of the setting 'name' from the API configuration.
+            Settings in SITE_SETTINGS[<mapname>] take precedence over
+            global settings. Returns 'default', if the setting is not configured.
+        """
+        site_settings = getattr(self.api_config, 'SITE_SETTINGS', {}).get(self.mapname, {})
+        if name in site_settings:
+            return site_settings[name]
+
+        return getattr(self.api_config, name, default)
+
+
+def _reset_statement_timeout(dbapi_connection, connection_record, reset_state):
+    """ Reset the statement timeout when a connection with a
+        changed timeout is returned to the pool.
+    """
+    if connection_record.info.pop('statement_timeout', False)\
+       and not reset_state.terminate_only:
+        # A timeout in a transaction leaves the transaction aborted.
+        dbapi_connection.rollback()
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('RESET statement_timeout')
+        finally:
+            cursor.close()
+        # Do not leave the transaction opened by RESET behind.
+        dbapi_connection.commit()
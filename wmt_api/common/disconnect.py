@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Cancellation of requests when the client goes away.
+"""
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class CancelOnDisconnect:
+    """ ASGI wrapper that cancels the processing of an HTTP request
+        when the client disconnects before the response is complete.
+
+        Once the request body has been read, the wrapper listens for the
+        disconnect event of the ASGI server. Cancelling the request task
+        interrupts running queries, which makes psycopg send a cancel
+        request to the database server.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+
+    def __getattr__(self, name):
+        return getattr(self.app, name)
+
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_read = asyncio.Event()
+        response_sent = False
+
+        async def _receive():
+            event = await receive()
+            if event['type'] != 'http.request' or not event.get('more_body', False):
+                request_read.set()
+            return event
+
+        async def _send(event):
+            nonlocal response_sent
+            if event['type'] == 'http.response.body' and not event.get('more_body', False):
+                response_sent = True
+            await send(event)
+
+        app_task = asyncio.ensure_future(self.app(scope, _receive, _send))
+
+        async def _watch():
+            await request_read.wait()
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            if not response_sent and not app_task.done():
+                log.info("Client disconnected. Cancelling request for %s.",
+                         scope.get('path'))
+                app_task.cancel()
+
+        watcher = asyncio.create_task(_watch())
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not app_task.cancelled() or asyncio.current_task().cancelling():
+                raise
+        finally:
+            watcher.cancel()
@@ -2,6 +2,12 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2023 Sarah Hoffmann
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+# SQLSTATE of queries cancelled by timeout or cancel request.
+QUERY_CANCELED = '57014'
 
 
 class APIError(Exception):
@@ -10,3 +16,19 @@ class APIError(Exception):
     def __init__(self, msg, status=400):
         self.msg = msg
         self.status = status
+
+
+@contextmanager
+def translate_db_errors():
+    """ Turn timeouts of the database into API errors: a timeout while
+        waiting for a free connection results in '503 Service Unavailable',
+        a cancelled query in '504 Gateway Timeout'.
+    """
+    try:
+        yield
+    except sa.exc.TimeoutError as exc:
+        raise APIError("Server busy. Please try again later.", status=503) from exc
+    except sa.exc.DBAPIError as exc:
+        if getattr(exc.orig, 'sqlstate', None) == QUERY_CANCELED:
+            raise APIError("Query took too long.", status=504) from exc
+        raise
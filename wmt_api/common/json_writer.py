@@ -6,18 +6,70 @@
 """
 Streaming JSON encoder.
 """
-from typing import Any, TypeVar, Optional, Callable
-import io
+from typing import Any, TypeVar, Optional, Callable, Union
+from decimal import Decimal
+from functools import lru_cache
+import json
+import math
+
+T = TypeVar('T') # pylint: disable=invalid-name
+
+def _default(value: Any) -> Any:
+    # Numeric columns are returned as Decimal by the database driver.
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _has_nonfinite(value: Any) -> bool:
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(_has_nonfinite(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_nonfinite(v) for v in value)
+    return False
+
+
 try:
-    import ujson as json
+    import ujson
+
+    def _dumps_json(value: Any) -> bytes:
+        return ujson.dumps(value, ensure_ascii=False).encode('utf-8')
 except ModuleNotFoundError:
-    import json # type: ignore[no-redef]
+    def _dumps_json(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_default).encode('utf-8')
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> bytes:
+        """ Encode the value as UTF-8 encoded JSON.
+        """
+        try:
+            out = orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # Types that orjson does not know, e.g. dicts with integer keys.
+            return _dumps_json(value)
+
+        # orjson writes NaN and infinity as null. Keep the output of
+        # the other encoders.
+        if b'null' in out and _has_nonfinite(value):
+            return _dumps_json(value)
+
+        return out
+except ModuleNotFoundError:
+    dumps = _dumps_json
+
+
+@lru_cache(maxsize=1024)
+def _encode_key(name: str) -> bytes:
+    return dumps(name) + b':'
 
-T = TypeVar('T') # pylint: disable=invalid-name
 
 class JsonWriter:
     """ JSON encoder that renders the output directly into an output
-        stream. This is a very simple writer which produces JSON in a
+        buffer. This is a very simple writer which produces JSON in a
         compact as possible form.
 
         The writer does not check for syntactic correctness. It is the
@@ -26,46 +78,67 @@ class JsonWriter:
 
         All functions return the writer object itself so that function
         calls can be chained.
+
+        The content is kept as UTF-8 encoded bytes. Values are encoded with
+        orjson or ujson when available.
     """
 
     def __init__(self) -> None:
-        self.data = io.StringIO()
-        self.pending = ''
+        self.data = bytearray()
+        self.pending = b''
 
 
     def __call__(self) -> str:
         """ Return the rendered JSON content as a string.
             The writer remains usable after calling this function.
         """
+        return self.as_bytes().decode('utf-8')
+
+
+    def as_bytes(self) -> bytes:
+        """ Return the rendered JSON content as UTF-8 encoded bytes.
+            The writer remains usable after calling this function.
+        """
         if self.pending:
-            assert self.pending in (']', '}')
-            self.data.write(self.pending)
-            self.pending = ''
-        return self.data.getvalue()
+            assert self.pending in (b']', b'}')
+            self.data += self.pending
+            self.pending = b''
+        return bytes(self.data)
+
+
+    def flush(self) -> bytes:
+        """ Return the JSON content rendered so far and remove it from
+            the writer. A pending closing bracket or delimiter stays
+            in the writer. Use this function to send out larger
+            results in chunks.
+        """
+        content = bytes(self.data)
+        self.data.clear()
+        return content
 
 
     def to_response(self, response):
         response.status = 200
-        response.text = self()
+        response.data = self.as_bytes()
 
 
     def start_object(self) -> 'JsonWriter':
         """ Write the open bracket of a JSON object.
         """
         if self.pending:
-            self.data.write(self.pending)
-        self.pending = '{'
+            self.data += self.pending
+        self.pending = b'{'
         return self
 
 
     def end_object(self) -> 'JsonWriter':
         """ Write the closing bracket of a JSON object.
         """
-        if self.pending in ('{', ']', '}'):
-            self.data.write(self.pending)
+        if self.pending in (b'{', b']', b'}'):
+            self.data += self.pending
         else:
-            assert self.pending in (',', '')
-        self.pending = '}'
+            assert self.pending in (b',', b'')
+        self.pending = b'}'
         return self
 
 
@@ -73,18 +146,18 @@ class JsonWriter:
         """ Write the opening bracket of a JSON array.
         """
         if self.pending:
-            self.data.write(self.pending)
-        self.pending = '['
+            self.data += self.pending
+        self.pending = b'['
         return self
 
 
     def end_array(self) -> 'JsonWriter':
         """ Write the closing bracket of a JSON array.
         """
-        assert self.pending in (',', '[', '')
-        if self.pending == '[':
-            self.data.write(self.pending)
-        self.pending = ']'
+        assert self.pending in (b',', b'[', b'')
+        if self.pending == b'[':
+            self.data += self.pending
+        self.pending = b']'
         return self
 
 
@@ -92,25 +165,25 @@ class JsonWriter:
         """ Write the key string of a JSON object.
         """
         assert self.pending
-        self.data.write(self.pending)
-        self.data.write(json.dumps(name, ensure_ascii=False))
-        self.pending = ':'
+        self.data += self.pending
+        self.data += _encode_key(name)
+        self.pending = b''
         return self
 
 
     def value(self, value: Any) -> 'JsonWriter':
-        """ Write out a value as JSON. The function uses the json.dumps()
-            function for encoding the JSON. Thus any value that can be
-            encoded by that function is permissible here.
+        """ Write out a value as JSON. The function uses the dumps()
+            function of the JSON backend for encoding. Thus any value
+            that can be encoded by that function is permissible here.
         """
         if hasattr(value, 'write_json'):
             if self.pending:
-                self.data.write(self.pending)
-                self.pending = ''
+                self.data += self.pending
+                self.pending = b''
             value.write_json(self)
             return self
 
-        return self.raw(json.dumps(value, ensure_ascii=False))
+        return self.raw(dumps(value))
 
 
     def float(self, value: float, precision: int) -> 'JsonWriter':
@@ -122,19 +195,19 @@ class JsonWriter:
         """ Write out a delimiter comma between JSON object or array elements.
         """
         if self.pending:
-            self.data.write(self.pending)
-        self.pending = ','
+            self.data += self.pending
+        self.pending = b','
         return self
 
 
-    def raw(self, raw_json: str) -> 'JsonWriter':
+    def raw(self, raw_json: Union[str, bytes]) -> 'JsonWriter':
         """ Write out the given value as is. This function is useful if
             a value is already available in JSON format.
         """
         if self.pending:
-            self.data.write(self.pending)
-            self.pending = ''
-        self.data.write(raw_json)
+            self.data += self.pending
+            self.pending = b''
+        self.data += raw_json.encode('utf-8') if isinstance(raw_json, str) else raw_json
         return self
 
 
@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Storage of rendered tiles in an MBTiles file.
+"""
+from typing import Optional, Iterable, List, Tuple
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class MBTiles:
+    """ Tile storage in an SQLite file following the MBTiles specification.
+
+        The store is versioned: the metadata entry 'version' records
+        the state of the data the tiles were rendered from. Tiles are only
+        returned and saved, when the version requested by the caller
+        matches the version of the store. Saving tiles with a newer version
+        deletes all tiles of the older version.
+
+        All functions are blocking and may be called from different threads.
+    """
+
+    def __init__(self, filename: Path, name: str, fmt: str) -> None:
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(filename), timeout=30,
+                                    check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS metadata
+                             (name TEXT PRIMARY KEY, value TEXT)""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS tiles
+                             (zoom_level INTEGER, tile_column INTEGER,
+                              tile_row INTEGER, tile_data BLOB,
+                              PRIMARY KEY (zoom_level, tile_column, tile_row))""")
+        self.conn.execute("INSERT OR IGNORE INTO metadata VALUES ('name', ?)", (name, ))
+        self.conn.execute("INSERT OR IGNORE INTO metadata VALUES ('format', ?)", (fmt, ))
+
+
+    def close(self) -> None:
+        """ Close the underlying database.
+        """
+        with self.lock:
+            self.conn.close()
+
+
+    def get_version(self) -> Optional[str]:
+        """ Return the version of the tiles currently in the store.
+        """
+        with self.lock:
+            return self._get_version()
+
+
+    def get(self, version: str, zoom: int, x: int, y: int) -> Optional[bytes]:
+        """ Return the tile data for the given tile or None if the tile
+            is not available in the given version.
+        """
+        with self.lock:
+            if self._get_version() != version:
+                return None
+
+            row = self.conn.execute("""SELECT tile_data FROM tiles
+                                       WHERE zoom_level = ? AND tile_column = ?
+                                             AND tile_row = ?""",
+                                    (zoom, x, _tms_row(zoom, y))).fetchone()
+
+        return None if row is None else row[0]
+
+
+    def put(self, version: str, tiles: Iterable[Tuple[int, int, int, bytes]]) -> bool:
+        """ Save the given list of (zoom, x, y, data) tuples. Returns False,
+            when the store already contains data of a newer version and the
+            tiles were not saved.
+        """
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = self._get_version()
+                if current is not None and current > version:
+                    self.conn.execute('ROLLBACK')
+                    return False
+
+                if current != version:
+                    self.conn.execute('DELETE FROM tiles')
+                    self.conn.execute("""INSERT OR REPLACE INTO metadata
+                                         VALUES ('version', ?)""", (version, ))
+
+                self.conn.executemany("""INSERT OR REPLACE INTO tiles
+                                         VALUES (?, ?, ?, ?)""",
+                                      ((z, x, _tms_row(z, y), data)
+                                       for z, x, y, data in tiles))
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+            self.conn.execute('COMMIT')
+
+        return True
+
+
+    def contains(self, version: str, zoom: int, x: int, y: int) -> bool:
+        """ Check if the given tile is available in the given version.
+        """
+        with self.lock:
+            if self._get_version() != version:
+                return False
+
+            return self.conn.execute("""SELECT 1 FROM tiles
+                                        WHERE zoom_level = ? AND tile_column = ?
+                                              AND tile_row = ?""",
+                                     (zoom, x, _tms_row(zoom, y))).fetchone() is not None
+
+
+    def missing(self, version: str,
+                tiles: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        """ Return the (zoom, x, y) tuples of the given tiles that are
+            not available in the given version.
+        """
+        with self.lock:
+            if self._get_version() != version:
+                return list(tiles)
+
+            return [(z, x, y) for z, x, y in tiles
+                    if self.conn.execute("""SELECT 1 FROM tiles
+                                            WHERE zoom_level = ? AND tile_column = ?
+                                                  AND tile_row = ?""",
+                                         (z, x, _tms_row(z, y))).fetchone() is None]
+
+
+    def _get_version(self) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM metadata WHERE name = 'version'")\
+                       .fetchone()
+        return None if row is None else row[0]
+
+
+def _tms_row(zoom: int, y: int) -> int:
+    """ MBTiles uses the TMS scheme, where rows are counted from the south.
+    """
+    return (1 << zoom) - 1 - y
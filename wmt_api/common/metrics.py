@@ -0,0 +1,266 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Collection of runtime statistics.
+"""
+import contextvars
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+from .access import InternalAccess
+
+# Default bucket boundaries for timings in seconds.
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bucket boundaries for the number of queries per request.
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+# Bucket boundaries for the number of rows fetched per request.
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+# Bucket boundaries for response sizes in bytes.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Timings of the request currently processed.
+_current_request = contextvars.ContextVar('wmt_current_request', default=None)
+
+
+class Histogram:
+    """ Counts observed values in buckets with the given upper bounds.
+        Values larger than the last bound are only counted in the total.
+    """
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def cumulative(self):
+        """ Return a list of pairs of upper bound and number of values
+            smaller or equal to the bound. The last bound is infinity.
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+    def write_json(self, out):
+        out.start_object()\
+           .key('buckets').start_object()
+        for bound, count in self.cumulative():
+            out.keyval(str(bound), count)
+        out.end_object().next()\
+           .keyval('sum', self.sum)\
+           .keyval('count', self.count)\
+           .end_object()
+
+
+    def write_prometheus(self, lines, name, labels):
+        """ Append the histogram in Prometheus text format to 'lines'.
+            'labels' must be a preformatted, possibly empty label list.
+        """
+        sep = ',' if labels else ''
+        for bound, count in self.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum!r}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+
+
+class PoolStatistics:
+    """ Statistics about the use of the connection pool of an engine.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.wait_time = Histogram()
+        self.overflow_events = 0
+        self.timeouts = 0
+
+        sa.event.listen(engine.sync_engine, 'connect', self._on_connect)
+
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if getattr(self.engine.sync_engine.pool, 'overflow', lambda: 0)() > 0:
+            self.overflow_events += 1
+
+
+    def write_json(self, out):
+        pool = self.engine.sync_engine.pool
+        out.start_object()
+        for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+            func = getattr(pool, name, None)
+            out.keyval(name, None if func is None else func())
+        out.keyval('overflow_events', self.overflow_events)\
+           .keyval('timeouts', self.timeouts)\
+           .keyval('wait_time', self.wait_time)\
+           .end_object()
+
+
+class RequestTimings:
+    """ Measurements collected while processing a single request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.phases = {}
+
+
+def track_queries(engine):
+    """ Install event handlers that add the time spent in SQL queries
+        on the given engine to the timings of the current request.
+    """
+    sa.event.listen(engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+    sa.event.listen(engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('wmt_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['wmt_query_start'].pop()
+    timings = _current_request.get()
+    if timings is not None:
+        timings.db_time += time.perf_counter() - start
+        timings.queries += 1
+        timings.rows += max(cursor.rowcount or 0, 0)
+
+
+@contextmanager
+def measure(name):
+    """ Measure the time spent in the block as a phase of the current
+        request. Phases are reported in the Server-Timing header.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_request.get()
+        if timings is not None:
+            timings.phases[name] = timings.phases.get(name, 0.0)\
+                                   + time.perf_counter() - start
+
+
+class EndpointStatistics:
+    """ Histograms for all requests to a single route.
+    """
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_time = Histogram()
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.rows = Histogram(ROW_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+
+
+class MetricsMiddleware:
+    """ Falcon middleware that collects timing statistics per route
+        template and adds a Server-Timing header to each response.
+
+        The middleware must come first in the middleware list, so that
+        it sees the final response body. The statistics are available in
+        Prometheus text format through the on_get() responder.
+
+        Requests with streamed responses are counted until the response
+        headers are sent. Their size and the rows fetched while streaming
+        are not recorded.
+
+        Only clients permitted by 'access' may read the statistics.
+        Defaults to clients on the local host.
+    """
+    METRICS = (('duration', 'wmt_request_duration_seconds',
+                'Time until the response is ready.'),
+               ('db_time', 'wmt_request_db_seconds',
+                'Time spent in database queries.'),
+               ('queries', 'wmt_request_queries',
+                'Number of database queries run.'),
+               ('rows', 'wmt_request_rows',
+                'Number of rows fetched from the database.'),
+               ('response_size', 'wmt_response_size_bytes',
+                'Size of the response body as sent.'))
+
+    def __init__(self, contexts=(), access=None):
+        self.endpoints = {}
+        self.contexts = list(contexts)
+        self.access = InternalAccess() if access is None else access
+
+
+    async def process_request(self, req, resp):
+        req.context.timings = RequestTimings()
+        _current_request.set(req.context.timings)
+
+
+    async def process_response(self, req, resp, resource, req_succeeded):
+        timings = req.context.get('timings')
+        if timings is None:
+            return
+
+        duration = time.perf_counter() - timings.start
+        route = req.uri_template or ''
+        stats = self.endpoints.get(route)
+        if stats is None:
+            stats = self.endpoints[route] = EndpointStatistics()
+
+        stats.duration.observe(duration)
+        stats.db_time.observe(timings.db_time)
+        stats.queries.observe(timings.queries)
+        stats.rows.observe(timings.rows)
+        if resp.stream is None:
+            body = await resp.render_body()
+            stats.response_size.observe(0 if body is None else len(body))
+
+        server_timing = [f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"']
+        for name, value in timings.phases.items():
+            server_timing.append(f'{name};dur={value * 1000:.1f}')
+        server_timing.append(f'total;dur={duration * 1000:.1f}')
+        resp.append_header('Server-Timing', ', '.join(server_timing))
+
+
+    async def on_get(self, req, resp):
+        self.access.check(req)
+
+        lines = []
+
+        for attr, name, description in self.METRICS:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for route, stats in self.endpoints.items():
+                getattr(stats, attr).write_prometheus(lines, name,
+                                                      f'route="{_escape(route)}"')
+
+        if self.contexts:
+            lines.append('# HELP wmt_pool_wait_seconds Time spent waiting for a database connection.')
+            lines.append('# TYPE wmt_pool_wait_seconds histogram')
+            # Maps may share a pool, report each pool only once.
+            pools = {}
+            for context in self.contexts:
+                pools.setdefault(id(context.pool_statistics),
+                                 (context.pool_statistics, []))[1].append(context.mapname)
+            for pool, mapnames in pools.values():
+                pool.wait_time.write_prometheus(
+                    lines, 'wmt_pool_wait_seconds', f'maps="{_escape(",".join(mapnames))}"')
+
+        resp.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        resp.text = '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
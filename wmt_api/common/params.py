@@ -7,8 +7,10 @@ Functions for parameter conversion.
 """
 from math import isnan
 
+import falcon
+
 from ..common.errors import APIError
-from ..common.types import Bbox
+from ..common.types import Bbox, Tile
 
 
 def as_str(req, name, default=None):
@@ -65,6 +67,15 @@ def as_bbox(req, name):
     return Bbox(*coords)
 
 
+def as_tile(zoom, x, y):
+    tile = Tile(zoom, x, y)
+
+    if not tile.is_valid():
+        raise falcon.HTTPNotFound()
+
+    return tile
+
+
 def as_int_list(req, name, default=None):
     values = as_str(req, name, default=default).split(',')
     try:
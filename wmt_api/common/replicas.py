@@ -0,0 +1,123 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Load balancing of read-only requests over database replicas.
+"""
+import asyncio
+import datetime as dt
+import logging
+import time
+
+import sqlalchemy as sa
+
+log = logging.getLogger(__name__)
+
+
+class Replica:
+    """ State of a single replica database.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.usable = False
+
+    def outstanding(self):
+        """ Return the number of connections currently in use.
+        """
+        return getattr(self.engine.sync_engine.pool, 'checkedout', lambda: 0)()
+
+
+class ReplicaSet:
+    """ A set of read-only replicas of the primary database of the context.
+
+        Replicas are checked every 'check_interval' seconds in a background
+        task. A replica is only used, when it can be reached and its data
+        is not older than 'max_lag' seconds compared to the primary database.
+        The age is determined from the update date in the status table.
+        Connections to replicas and the check of a single database give up
+        after 'connect_timeout' seconds.
+    """
+
+    def __init__(self, context, urls, max_lag=300, check_interval=30, connect_timeout=5):
+        self.context = context
+        self.replicas = [Replica(context.create_engine(url, connect_timeout=connect_timeout))
+                         for url in urls]
+        self.max_lag = dt.timedelta(seconds=max_lag)
+        self.check_interval = check_interval
+        self.connect_timeout = connect_timeout
+        self.next_check = 0
+        self.task = None
+        self.checked = False
+
+
+    async def engines(self):
+        """ Return the engines of all usable replicas. The engine with
+            the least connections in use comes first.
+
+            Starts a check of the replicas when it is due. Only the first
+            call waits for the result, later calls use the state of the
+            last finished check.
+        """
+        if self.task is None or self.task.done()\
+           and (self.next_check <= time.monotonic() or not self.checked):
+            self.next_check = time.monotonic() + self.check_interval
+            self.task = asyncio.create_task(self.check())
+
+        if not self.checked:
+            await asyncio.shield(self.task)
+
+        return [r.engine for r in sorted((r for r in self.replicas if r.usable),
+                                         key=Replica.outstanding)]
+
+
+    def mark_failed(self, engine):
+        """ Exclude the replica with the given engine until the next check.
+        """
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.usable = False
+
+
+    async def check(self):
+        """ Update the state of all replicas. When the primary database
+            cannot be read, the replicas keep their last known state.
+        """
+        try:
+            primary = await self._read_date(self.context.engine)
+        except Exception as exc: # pylint: disable=broad-exception-caught
+            log.warning("Cannot read status of primary database: %s", exc)
+        else:
+            dates = await asyncio.gather(*(self._read_date(r.engine) for r in self.replicas),
+                                         return_exceptions=True)
+
+            for replica, date in zip(self.replicas, dates):
+                if isinstance(date, Exception):
+                    log.warning("Replica %s not reachable: %s", replica.engine.url, date)
+                    replica.usable = False
+                else:
+                    replica.usable = date is not None\
+                                     and (primary is None or date >= primary - self.max_lag)
+
+        self.checked = True
+
+
+    async def close(self):
+        """ Stop a running check.
+        """
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+    async def _read_date(self, engine):
+        status = self.context.db.status.table
+
+        async with asyncio.timeout(self.connect_timeout):
+            async with engine.connect() as conn:
+                return await conn.scalar(sa.select(status.c.date)
+                                           .where(status.c.part == 'base'))
@@ -2,15 +2,149 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2023 Sarah Hoffmann
+import asyncio
+
+import falcon
+
+from .errors import translate_db_errors
 
 def needs_db(func):
+    """ Pass a read-only database connection to the decorated function.
+
+        The connection is a ReadOnlyConnection, which only takes a
+        connection from the pool when the first query is run. Functions
+        should call its release() function after their last query, so that
+        the connection is free for other requests while the response is
+        rendered. It is released at the latest when the function returns.
+
+        Queries are subject to the statement timeout configured for the
+        route, when the function is a responder. Timeouts are reported to
+        the client as API errors.
+    """
     async def _impl(self, *method_args, **method_kwargs):
-        async with self.context.engine.begin() as conn:
-            await func(self, conn, *method_args, **method_kwargs)
+        timeout = None
+        if method_args and isinstance(method_args[0], falcon.Request):
+            timeout = self.context.statement_timeout(method_args[0].uri_template)
+
+        conn = ReadOnlyConnection(self.context, timeout)
+        try:
+            with translate_db_errors():
+                return await func(self, conn, *method_args, **method_kwargs)
+        finally:
+            await conn.release()
+
+    return _impl
+
+
+class ReadOnlyConnection:
+    """ Database connection for requests that only read data.
+
+        Queries run in autocommit mode, so no explicit transaction is
+        opened. The connection is taken from the pool on first use and
+        can be given back early with release(). Results of execute() are
+        fully buffered and stay usable after the release.
+    """
+
+    def __init__(self, context, statement_timeout=None):
+        self.context = context
+        self.statement_timeout = statement_timeout
+        self.conn = None
+
+
+    async def execute(self, *args, **kwargs):
+        return await (await self._connection()).execute(*args, **kwargs)
+
+
+    async def scalar(self, *args, **kwargs):
+        return await (await self._connection()).scalar(*args, **kwargs)
+
+
+    async def release(self):
+        """ Return the connection to the pool. A new connection is
+            acquired, when another query is run afterwards.
+        """
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            await conn.close()
+
+
+    async def _connection(self):
+        if self.conn is None:
+            self.conn = await self.context.connect(read_only=True, autocommit=True,
+                                                   statement_timeout=self.statement_timeout)
+
+        return self.conn
+
+
+def single_flight(func):
+    """ Coalesce concurrent requests for the same URL.
+
+        Only the first request runs the responder. Requests for the same
+        URL and language that come in while the computation is still
+        running wait for its result and get a copy of the response.
+        Must be applied on top of needs_db, so that only the computing
+        request takes a database connection.
+    """
+    async def _impl(self, req, resp, *method_args, **method_kwargs):
+        async def _render():
+            await func(self, req, resp, *method_args, **method_kwargs)
+            return resp.status, resp.headers, dict(resp.context.items()),\
+                   await resp.render_body()
+
+        key = (req.relative_uri, req.get_header('Accept-Language'))
+        status, headers, context, body = await self.in_flight.run(key, _render)
+
+        resp.status = status
+        resp.set_headers(headers)
+        resp.context.update(context)
+        resp.data = body
 
     return _impl
 
+
+class SingleFlight:
+    """ Runs a computation only once for concurrent callers asking
+        for the same key. All callers get the same result or exception.
+    """
+
+    def __init__(self):
+        self.futures = {}
+
+
+    async def run(self, key, func):
+        """ Return the result of the coroutine function 'func' or, if
+            a computation for 'key' is already on the way, wait for
+            the result of that computation.
+        """
+        while (future := self.futures.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # When the computing task was cancelled, take over.
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.futures[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception() # avoid warnings when nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self.futures[key]
+
+        return result
+
+
 class Router:
 
     def __init__(self, context):
         self.context = context
+        self.in_flight = SingleFlight()
@@ -0,0 +1,95 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+In-memory store for the symbol files created by the backend.
+"""
+import asyncio
+import os
+
+import aiofiles
+
+from .cache import LRUCache
+from .router import SingleFlight
+
+
+class Symbol:
+    """ A symbol file. 'data' contains the content of the file, when it
+        is small enough to be kept in memory, otherwise it is None and
+        the file needs to be streamed from 'path'.
+    """
+
+    def __init__(self, name, path, size, data=None):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.data = data
+
+
+    @property
+    def etag(self):
+        # Symbol files are content-addressed, the name identifies the content.
+        return self.name
+
+
+    def open(self):
+        """ Return an asynchronous file object for streaming the content.
+        """
+        return aiofiles.open(self.path, 'rb')
+
+
+class SymbolStore:
+    """ Keeps the content of symbol files in memory.
+
+        Symbol files are never changed once they have been written, so
+        that cached content never needs to be revalidated. Up to
+        'max_size' bytes are kept in an LRU cache. Files larger than
+        'max_file_size' are not cached and need to be streamed.
+
+        Lookups of missing files are cached as well for 'negative_ttl'
+        seconds. Files for new routes may appear later.
+    """
+
+    def __init__(self, max_size=32 * 1024 * 1024, max_file_size=1024 * 1024,
+                 negative_ttl=60, negative_size=10000):
+        self.max_file_size = min(max_size, max_file_size)
+        self.cache = LRUCache(max_size, sizeof=lambda s: s.size)
+        self.missing = LRUCache(negative_size, ttl=negative_ttl)
+        self.in_flight = SingleFlight()
+
+
+    async def get(self, directory, name):
+        """ Return the Symbol with the given file name in the given
+            directory or None, if no such file exists.
+        """
+        symbol = self.cache.get(name)
+        if symbol is not None:
+            return symbol
+
+        if self.missing.get(name, False):
+            return None
+
+        return await self.in_flight.run(name, lambda: self._load(directory, name))
+
+
+    async def _load(self, directory, name):
+        symbol = await asyncio.to_thread(self._read_file, os.path.join(directory, name), name)
+
+        if symbol is None:
+            self.missing.put(name, True)
+        elif symbol.data is not None:
+            self.cache.put(name, symbol)
+
+        return symbol
+
+
+    def _read_file(self, path, name):
+        try:
+            with open(path, 'rb') as fd:
+                size = os.fstat(fd.fileno()).st_size
+                if size > self.max_file_size:
+                    return Symbol(name, path, size)
+                return Symbol(name, path, size, fd.read())
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
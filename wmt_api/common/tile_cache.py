@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Caching of rendered tiles.
+"""
+import asyncio
+import time
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from .cache import LRUCache
+from .mbtiles import MBTiles
+from .router import SingleFlight, needs_db
+
+# Format names of tiles as used in MBTiles files.
+MBTILES_FORMATS = {'json': 'json', 'mvt': 'pbf'}
+
+
+class DataVersion:
+    """ Provides the version of the data in the database.
+
+        The version is the date of the last update of the base data
+        as saved in the status table. The status table is checked at most
+        every 'interval' seconds.
+    """
+
+    def __init__(self, context, interval=60):
+        self.context = context
+        self.interval = interval
+        self.version = None
+        self.next_check = 0
+
+
+    async def get(self):
+        """ Return the current version as a string or None, when no
+            data is available.
+        """
+        if self.next_check <= time.monotonic():
+            self.version = await self._read_version()
+            self.next_check = time.monotonic() + self.interval
+
+        return self.version
+
+
+    @needs_db
+    async def _read_version(self, conn):
+        status = self.context.db.status.table
+
+        date = await conn.scalar(sa.select(status.c.date)
+                                   .where(status.c.part == 'base'))
+
+        return None if date is None else date.isoformat()
+
+
+class TileCache:
+    """ Two-level cache for rendered tiles: an in-memory LRU cache
+        and, if a directory is configured, one MBTiles file for each
+        tile format.
+
+        All cached tiles are invalidated when the version of the data
+        in the database changes.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.data_version = DataVersion(
+                              context, context.get_setting('TILE_CACHE_CHECK_INTERVAL', 60))
+        self.memory = LRUCache(context.get_setting('TILE_CACHE_SIZE', 128 * 1024 * 1024),
+                               sizeof=len)
+        self.memory_version = None
+
+        cache_dir = context.get_setting('TILE_CACHE_DIR')
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.stores = {}
+        self.opening = SingleFlight()
+
+
+    async def get_store(self, fmt):
+        """ Return the MBTiles store for the given format or None if no
+            persistent cache is configured. The file is opened and
+            initialised in a thread the first time it is needed.
+        """
+        if self.cache_dir is None:
+            return None
+
+        if fmt not in self.stores:
+            self.stores[fmt] = await self.opening.run(fmt, lambda: self._open_store(fmt))
+
+        return self.stores[fmt]
+
+
+    async def _open_store(self, fmt):
+        store = self.stores.get(fmt)
+        if store is None:
+            store = await asyncio.to_thread(
+                        MBTiles, self.cache_dir / f'{self.context.mapname}-{fmt}.mbtiles',
+                        self.context.mapname, MBTILES_FORMATS[fmt])
+
+        return store
+
+
+    async def version(self):
+        """ Return the version of the data the cache is valid for.
+            None means that nothing should be cached.
+        """
+        version = await self.data_version.get()
+
+        if version != self.memory_version:
+            self.memory.clear()
+            self.memory_version = version
+
+        return version
+
+
+    async def get(self, tile, fmt):
+        """ Return the content of the tile in the given format or None
+            if it is not in the cache.
+        """
+        version = await self.version()
+        if version is None:
+            return None
+
+        key = (fmt, tile.zoom, tile.x, tile.y)
+        data = self.memory.get(key)
+
+        if data is None:
+            store = await self.get_store(fmt)
+            if store is not None:
+                data = await asyncio.to_thread(store.get, version,
+                                               tile.zoom, tile.x, tile.y)
+                if data is not None:
+                    self.memory.put(key, data)
+
+        return data
+
+
+    async def put(self, tiles, fmt):
+        """ Add rendered tiles to the cache. 'tiles' must be a list
+            of pairs of tile and the tile content.
+        """
+        version = await self.version()
+        if version is None:
+            return
+
+        for tile, data in tiles:
+            self.memory.put((fmt, tile.zoom, tile.x, tile.y), data)
+
+        store = await self.get_store(fmt)
+        if store is not None:
+            await asyncio.to_thread(store.put, version,
+                                    [(t.zoom, t.x, t.y, d) for t, d in tiles])
@@ -2,10 +2,20 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
+from math import floor, ceil
 
 import sqlalchemy as sa
 from geoalchemy2 import Geometry
 
+# Half of the width of the world map in EPSG:3857
+MAPWIDTH = 20037508.34
+
+# Zoom levels for which tiles are available
+MIN_TILE_ZOOM = 8
+MAX_TILE_ZOOM = 16
+# Zoom level from which on geometries are delivered in full detail
+DETAIL_TILE_ZOOM = 12
+
 class Bbox:
 
     def __init__(self, x1, y1, x2, y2):
@@ -16,11 +26,131 @@ class Bbox:
 
 
     def as_sql(self):
-        return sa.type_coerce('SRID=3857;POLYGON(({0} {1},{0} {3},{2} {3},{2} {1},{0} {1}))'
-                               .format(self.minx, self.miny, self.maxx, self.maxy),
-                              Geometry)
+        return sa.func.ST_MakeEnvelope(float(self.minx), float(self.miny),
+                                       float(self.maxx), float(self.maxy),
+                                       3857, type_=Geometry)
+
+
+    def as_params(self):
+        """ Return the coordinates as parameters for statements that use
+            a BboxParameter.
+        """
+        return {'bbox_minx': self.minx, 'bbox_miny': self.miny,
+                'bbox_maxx': self.maxx, 'bbox_maxy': self.maxy}
+
+
+    def tiles(self, zoom):
+        """ Return an iterator over all tiles of the given zoom level
+            that intersect with the bounding box.
+        """
+        width = 2 * MAPWIDTH / (2**zoom)
+        maxtile = 2**zoom - 1
+
+        def _tile_range(start, end):
+            first = floor((start + MAPWIDTH) / width)
+            last = max(first, ceil((end + MAPWIDTH) / width) - 1)
+            return range(max(0, first), min(maxtile, last) + 1)
+
+        for x in _tile_range(self.minx, self.maxx):
+            for y in _tile_range(-self.maxy, -self.miny):
+                yield Tile(zoom, x, y)
 
 
     def write_json(self, writer):
         writer.start_array().float(self.minx, 8).next().float(self.miny, 8).next()
         writer.float(self.maxx, 8).next().float(self.maxy, 8).end_array()
+
+
+class BboxParameter:
+    """ Placeholder for a bounding box in prepared SQL statements.
+        The coordinates need to be given as parameters when executing
+        the statement. Use Bbox.as_params() to create them.
+    """
+
+    def as_sql(self):
+        return sa.func.ST_MakeEnvelope(sa.bindparam('bbox_minx', type_=sa.Float),
+                                       sa.bindparam('bbox_miny', type_=sa.Float),
+                                       sa.bindparam('bbox_maxx', type_=sa.Float),
+                                       sa.bindparam('bbox_maxy', type_=sa.Float),
+                                       3857, type_=Geometry)
+
+
+class Tile:
+    """ A tile in the standard web mercator tiling scheme.
+    """
+
+    def __init__(self, zoom, x, y):
+        self.zoom = zoom
+        self.x = x
+        self.y = y
+        self.width = 2 * MAPWIDTH / (2**zoom)
+        self.bbox = Bbox(x * self.width - MAPWIDTH, MAPWIDTH - (y + 1) * self.width,
+                         (x + 1) * self.width - MAPWIDTH, MAPWIDTH - y * self.width)
+
+
+    def parent(self, zoom):
+        """ Return the tile at the given lower zoom level that contains
+            this tile.
+        """
+        shift = self.zoom - zoom
+        return Tile(zoom, self.x >> shift, self.y >> shift)
+
+
+    def is_valid(self):
+        """ Check that the tile coordinates are inside the map.
+        """
+        return 0 <= self.x < 2**self.zoom and 0 <= self.y < 2**self.zoom
+
+
+    @property
+    def pixel_size(self):
+        """ Size of a pixel in a 256x256 pixel rendering of the tile.
+        """
+        return self.width / 256
+
+
+    @property
+    def is_detailed(self):
+        """ True, when geometries should be delivered in full detail.
+        """
+        return self.zoom >= DETAIL_TILE_ZOOM
+
+
+    def geometry(self, geom, geom_lowres=None):
+        """ Return an SQL expression for the given geometry column
+            in a resolution appropriate for the tile. On low zoom levels,
+            the geometry is simplified to pixel size. 'geom_lowres' may
+            point to a column with a precomputed geometry that is simplified
+            to 100m. It is used instead of the full geometry, when pixels
+            are large enough.
+        """
+        if self.is_detailed:
+            return geom
+
+        if geom_lowres is not None and self.pixel_size >= 100:
+            geom = geom_lowres
+
+        return geom.ST_Simplify(self.pixel_size)
+
+
+class MetaTile(Tile):
+    """ A block of size x size neighbouring tiles of the same zoom level,
+        which are computed together. The metatile has the position of its
+        upper left tile and the bounding box of the whole block. Blocks
+        at the right and lower edge of the map are cut, when the size
+        is not a power of two.
+    """
+
+    def __init__(self, tile, size):
+        super().__init__(tile.zoom, tile.x - tile.x % size, tile.y - tile.y % size)
+        self.xsize = min(size, 2**tile.zoom - self.x)
+        self.ysize = min(size, 2**tile.zoom - self.y)
+        self.bbox = Bbox(self.bbox.minx, self.bbox.maxy - self.ysize * self.width,
+                         self.bbox.minx + self.xsize * self.width, self.bbox.maxy)
+
+
+    def tiles(self):
+        """ Return the list of tiles that make up the metatile.
+        """
+        return [Tile(self.zoom, self.x + i, self.y + j)
+                for i in range(self.xsize) for j in range(self.ysize)]
@@ -0,0 +1,131 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Asynchronous access to the Wikipedia API with caching of the answers.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from .cache import LRUCache
+from .router import SingleFlight
+
+log = logging.getLogger(__name__)
+
+WIKIPEDIA_API_URL = 'https://{lang}.wikipedia.org/w/api.php'
+
+
+class LanglinkStore:
+    """ Persistent store for language links in an SQLite database.
+        Entries expire after 'ttl' seconds.
+    """
+
+    def __init__(self, filename, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS langlinks
+                               (lang TEXT, title TEXT, target TEXT, url TEXT,
+                                expires REAL, PRIMARY KEY (lang, title, target))""")
+
+
+    def get(self, key):
+        """ Return a pair of a flag if the key was found and the URL.
+            The URL is None for cached negative answers.
+        """
+        with self.lock:
+            row = self.db.execute("""SELECT url FROM langlinks
+                                     WHERE lang = ? AND title = ? AND target = ?
+                                           AND expires > ?""",
+                                  (*key, time.time())).fetchone()
+
+        return (False, None) if row is None else (True, row[0])
+
+
+    def put(self, key, url):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO langlinks VALUES (?, ?, ?, ?, ?)",
+                            (*key, url, time.time() + self.ttl))
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class WikipediaClient:
+    """ Looks up language links of Wikipedia articles.
+
+        Requests are sent with an asynchronous HTTP client and abort
+        after 'timeout' seconds. Answers are cached for 'ttl' seconds,
+        including the information that an article has no link to the
+        requested language. The most recent 'cache_size' answers are
+        kept in memory. When 'cache_file' is given, answers are also
+        saved in an SQLite database, so that they survive a restart.
+        Failed requests are not cached.
+    """
+
+    def __init__(self, timeout=2.0, ttl=7 * 24 * 3600, cache_size=10000,
+                 cache_file=None, api_url=WIKIPEDIA_API_URL):
+        self.api_url = api_url
+        self.client = httpx.AsyncClient(timeout=timeout,
+                                        headers={'User-Agent': 'waymarkedtrails.org'})
+        self.cache = LRUCache(cache_size, ttl=ttl)
+        self.store = None if cache_file is None else LanglinkStore(cache_file, ttl)
+        self.in_flight = SingleFlight()
+
+
+    async def get_langlink(self, lang, title, target):
+        """ Return the URL of the article in language 'target' that
+            corresponds to the article 'title' in the Wikipedia of 'lang'.
+            Returns None when there is no such article or Wikipedia
+            cannot be reached.
+        """
+        key = (lang, title, target)
+        found, url = self.cache.get(key, (False, None))
+        if found:
+            return url
+
+        return await self.in_flight.run(key, lambda: self._lookup(key))
+
+
+    async def close(self):
+        await self.client.aclose()
+        if self.store is not None:
+            self.store.close()
+
+
+    async def _lookup(self, key):
+        if self.store is not None:
+            found, url = await asyncio.to_thread(self.store.get, key)
+            if found:
+                self.cache.put(key, (True, url))
+                return url
+
+        lang, title, target = key
+        try:
+            response = await self.client.get(
+                           self.api_url.format(lang=lang),
+                           params={'action': 'query', 'prop': 'langlinks',
+                                   'titles': title, 'llprop': 'url',
+                                   'lllang': target, 'format': 'json'})
+            response.raise_for_status()
+            _, page = response.json()['query']['pages'].popitem()
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            log.warning("Wikipedia lookup for %s:%s failed: %s", lang, title, exc)
+            return None
+
+        url = page['langlinks'][0]['url'] if page.get('langlinks') else None
+
+        self.cache.put(key, (True, url))
+        if self.store is not None:
+            await asyncio.to_thread(self.store.put, key, url)
+
+        return url
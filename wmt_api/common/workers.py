@@ -0,0 +1,66 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Pool for running CPU-heavy computations outside the event loop.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .errors import APIError
+
+
+class WorkerPool:
+    """ Runs functions in a pool of 'workers' threads or, when 'processes'
+        is set, processes.
+
+        At most 'queue_size' calls wait for a free worker. Further calls
+        are rejected with an API error '503 Service Unavailable', so that
+        clients back off instead of piling up work that will finish long
+        after they have given up.
+    """
+
+    def __init__(self, workers=2, queue_size=8, processes=False):
+        self.limit = workers + queue_size
+        self.pending = 0
+        if processes:
+            self.executor = ProcessPoolExecutor(
+                                max_workers=workers,
+                                mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix='wmt-worker')
+
+
+    async def run(self, func, *args):
+        """ Run 'func' with the given arguments in the pool and return
+            the result. With a process pool, function, arguments and
+            result must be picklable.
+        """
+        if self.pending >= self.limit:
+            raise APIError("Server busy. Please try again later.", status=503)
+
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(func, *args)
+        self.pending += 1
+        # A call that is already running continues when the caller is
+        # cancelled, so it must be counted until the worker is done.
+        future.add_done_callback(lambda _: self._call_done(loop))
+
+        return await asyncio.wrap_future(future, loop=loop)
+
+
+    def _call_done(self, loop):
+        def _release():
+            self.pending -= 1
+
+        try:
+            loop.call_soon_threadsafe(_release)
+        except RuntimeError:
+            pass # event loop already closed
+
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Convert an elevation model into a file that can be memory-mapped.
+
+Usage: python -m wmt_api.convert_dem [options] <input file> <output file>
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+import numpy
+
+from .output.elevation import MAPPED_DEM_SUFFIX
+
+log = logging.getLogger(__name__)
+
+# Number of raster rows converted at once
+ROWS_PER_CHUNK = 1024
+
+
+def convert(src, dest, band=1):
+    """ Write the given band of the GDAL raster 'src' into the numpy
+        array file 'dest' and the geo transform and nodata value into
+        a JSON file next to it.
+    """
+    from osgeo import gdal # pylint: disable=import-outside-toplevel
+
+    source = gdal.Open(str(src))
+    if source is None:
+        raise RuntimeError(f"Cannot open elevation model '{src}'.")
+
+    raster = source.GetRasterBand(band)
+    first = raster.ReadAsArray(0, 0, 1, 1)
+
+    out = numpy.lib.format.open_memmap(str(dest), mode='w+', dtype=first.dtype,
+                                       shape=(source.RasterYSize, source.RasterXSize))
+    for row in range(0, source.RasterYSize, ROWS_PER_CHUNK):
+        rows = min(ROWS_PER_CHUNK, source.RasterYSize - row)
+        out[row:row + rows, :] = raster.ReadAsArray(0, row, source.RasterXSize, rows)
+        log.info("Converted %d of %d rows.", row + rows, source.RasterYSize)
+    out.flush()
+    del out
+
+    with open(Path(dest).with_suffix('.json'), 'w', encoding='utf-8') as fd:
+        json.dump({'transform': list(source.GetGeoTransform()),
+                   'nodata': raster.GetNoDataValue()}, fd)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='python -m wmt_api.convert_dem',
+                                     description=__doc__.strip().split('\n')[0])
+    parser.add_argument('input', help='Elevation model in a format readable by GDAL')
+    parser.add_argument('output', type=Path,
+                        help=f'File to write to, must have the suffix {MAPPED_DEM_SUFFIX}')
+    parser.add_argument('--band', type=int, default=1,
+                        help='Raster band with the elevation (default: 1)')
+
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    args = get_parser().parse_args(argv)
+
+    if args.output.suffix != MAPPED_DEM_SUFFIX:
+        log.error("Output file must have the suffix %s.", MAPPED_DEM_SUFFIX)
+        return 1
+
+    try:
+        convert(args.input, args.output, band=args.band)
+    except RuntimeError as exc:
+        log.error("%s", exc)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
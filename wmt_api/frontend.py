@@ -8,7 +8,11 @@ import traceback
 
 import falcon.asgi
 
+from .common.access import InternalAccess
+from .common.compression import CompressionMiddleware
 from .common.context import Context
+from .common.disconnect import CancelOnDisconnect
+from .common.metrics import MetricsMiddleware
 from .common.errors import APIError
 from .api.status import APIStatus
 from .api.symbols import APISymbols
@@ -37,20 +41,47 @@ def add_flavour(app, prefix, context):
     map_type.APIDetails(context).add_routes(app, prefix + '/v1/details')
 
 def create_app(context=None):
-    app = falcon.asgi.App(cors_enable=True, media_type=falcon.MEDIA_JSON)
-    app.add_error_handler(APIError, api_error_handler)
-    if 'WMT_DEBUG' in os.environ:
-        app.add_error_handler(Exception, print_traceback)
-
     if context is not None:
-        add_flavour(app, '', context)
+        flavours = [('', context)]
     else:
         sites = os.environ.get('WMT_CONFIG', '') or 'hiking'
         if ',' in sites:
-            for site in sites.split(','):
-                add_flavour(app, '/' + site, Context(site))
+            # Maps in the same database share the connection pool.
+            engines = {}
+            flavours = [('/' + site, Context(site, engines=engines))
+                        for site in sites.split(',')]
         else:
-            add_flavour(app, '', Context(sites))
+            flavours = [('', Context(sites))]
+
+    # The API configuration is the same for all flavours.
+    settings = flavours[0][1]
+
+    middleware = []
+    metrics = None
+    if settings.get_setting('METRICS', True):
+        # Must come first to see the final response.
+        metrics = MetricsMiddleware([c for _, c in flavours],
+                                    access=InternalAccess.from_context(settings))
+        middleware.append(metrics)
+    if settings.get_setting('COMPRESSION', True):
+        middleware.append(CompressionMiddleware(
+                 min_size=settings.get_setting('COMPRESSION_MIN_SIZE', 1024),
+                 cache_size=settings.get_setting('COMPRESSION_CACHE_SIZE', 64 * 1024 * 1024)))
+
+    app = falcon.asgi.App(cors_enable=True, media_type=falcon.MEDIA_JSON,
+                          middleware=middleware)
+    app.add_error_handler(APIError, api_error_handler)
+    if 'WMT_DEBUG' in os.environ:
+        app.add_error_handler(Exception, print_traceback)
+
+    for prefix, flavour_context in flavours:
+        add_flavour(app, prefix, flavour_context)
+
+    if metrics is not None:
+        app.add_route('/metrics', metrics)
+
+    if settings.get_setting('CANCEL_ON_DISCONNECT', True):
+        app = CancelOnDisconnect(app)
 
     return app
 
@@ -6,8 +6,13 @@
 import json
 from math import ceil, fabs
 from collections import OrderedDict
+from pathlib import Path
+import threading
 
-from osgeo import gdal
+try:
+    from osgeo import gdal
+except ModuleNotFoundError:
+    gdal = None
 import numpy
 import falcon
 from scipy.ndimage import map_coordinates
@@ -17,6 +22,13 @@ from geoalchemy2.shape import to_shape
 from geoalchemy2 import Geography
 from shapely.geometry import Point, LineString
 
+from ..common.cache import LRUCache
+
+# Minimum edge length in pixels of cached raster blocks.
+MIN_BLOCK_EDGE = 256
+# Minimum number of rows in cached blocks of striped files.
+MIN_STRIPE_ROWS = 64
+
 class Bbox:
     def __init__(self):
         self.minx = 30000000
@@ -64,6 +76,67 @@ def smooth_and_fill_list(x, window_len=7, window='hanning'):
     return y[window_len:-window_len+1]
 
 
+def simplify_profile(eles, max_deviation, max_steps):
+    """ Return the indices of the points of the elevation profile 'eles'
+        that need to be kept, so that the profile deviates at most
+        'max_deviation' from the line between two consecutive kept points
+        and these are at most 'max_steps' points apart. The first and
+        the last point are always kept.
+    """
+    eles = numpy.asarray(eles, dtype=float)
+    last = len(eles) - 1
+    max_steps = max(1, max_steps)
+
+    keep = [0]
+    while keep[-1] < last:
+        start = keep[-1]
+        keep.append(start + _next_profile_point(eles[start:min(start + max_steps, last) + 1],
+                                                max_deviation))
+
+    return keep
+
+
+def _next_profile_point(span, max_deviation):
+    """ Return the index of the first point in 'span' where the line from
+        the first point deviates too much from the points in between.
+        Returns the last index, when there is no such point.
+
+        Candidates are checked in blocks of increasing size, so that the
+        work stays proportional to the distance to the point found.
+        The deviations of all candidates of a block are computed at once.
+    """
+    end = len(span) - 1
+    lo = 1
+    while lo < end:
+        hi = min(max(16, 4 * lo), end)
+        ends = numpy.arange(lo, hi + 1)[:, None]
+        pts = numpy.arange(hi + 1)[None, :]
+        lines = pts * ((span[lo:hi + 1, None] - span[0]) / ends) + span[0]
+        deviation = numpy.where(pts < ends, numpy.abs(lines - span[:hi + 1]), 0)
+        exceeded = (deviation > max_deviation).any(axis=1)
+        if exceeded.any():
+            return lo + int(exceeded.argmax())
+        lo = hi + 1
+
+    return end
+
+
+
+def _touches_value(band, yi, xi, value):
+    """ Return a mask of the points at the given fractional pixel
+        positions where bilinear interpolation uses a pixel with
+        the given value.
+    """
+    ny, nx = band.shape
+    y0 = numpy.clip(numpy.floor(yi).astype(int), 0, ny - 1)
+    x0 = numpy.clip(numpy.floor(xi).astype(int), 0, nx - 1)
+    y1 = numpy.minimum(y0 + 1, ny - 1)
+    x1 = numpy.minimum(x0 + 1, nx - 1)
+
+    return (band[y0, x0] == value) | (band[y0, x1] == value)\
+           | (band[y1, x0] == value) | (band[y1, x1] == value)
+
+
 async def get_way_elevation_data(conn, id_col, geom_col, where, step):
     sql = sa.select(id_col,
                     geom_col.ST_PointN(1).label('first'),
@@ -105,21 +178,88 @@ async def get_way_elevation_data(conn, id_col, geom_col, where, step):
     return ways, bbox.bounds()
 
 
-class Dem:
+# Suffix of preconverted elevation models that are memory-mapped.
+MAPPED_DEM_SUFFIX = '.npy'
 
-    def __init__(self, src):
-        self.source = gdal.Open(src)
-        self.transform = self.source.GetGeoTransform()
+_open_dems = {}
+_open_dems_lock = threading.Lock()
+
+def open_dem(src, cache_size=128 * 1024 * 1024):
+    """ Return the elevation model in the given file. The file stays open
+        for the lifetime of the process and is shared by all requests.
+        Files with the suffix '.npy' are memory-mapped models created with
+        wmt_api.convert_dem, all other files are read with GDAL.
+        'cache_size' is only used when the file is opened for the first time.
+    """
+    src = str(src)
+    with _open_dems_lock:
+        if src not in _open_dems:
+            if src.endswith(MAPPED_DEM_SUFFIX):
+                _open_dems[src] = MappedDem(src)
+            else:
+                _open_dems[src] = Dem(src, cache_size)
+
+        return _open_dems[src]
+
+
+def compute_elevation_profile(dem_file, bounds, ways, step, max_segment_len=500,
+                              cache_size=128 * 1024 * 1024):
+    """ Compute the elevation profile for the ways returned by
+        get_way_elevation_data(). Returns the profile as a dictionary
+        for elevation_profile_to_response().
+
+        This function is run in a worker pool and must not touch any
+        state of the event loop.
+    """
+    ele = SegmentElevation(dem_file, bounds, max_segment_len=max_segment_len,
+                           cache_size=cache_size)
+    for way in ways:
+        ele.add_segment(step=step, **way)
+
+    return ele.profile()
+
+
+def elevation_profile_to_response(profile, response):
+    response.status = 200
+    response.content_type = falcon.MEDIA_JSON
+    response.text = json.dumps(profile)
+
+
+class DemBase:
+    """ Common functions of digital elevation models. Subclasses need
+        to set the geo transform, the raster size and the nodata value
+        and implement read_window().
+    """
+    transform = (0, 1, 0, 0, 0, -1)
+    xsize = 0
+    ysize = 0
+    nodata = None
 
     def raster_array(self, bbox):
+        """ Return the raster for the given bounding box together with
+            its true boundaries. When the bounding box lies within the
+            elevation model, the raster is returned as read by
+            read_window(). Otherwise it is copied into a float array
+            where pixels outside the model and pixels without data are NaN.
+        """
         # Calculate pixel coordinates (rounding always toward the outside)
         ulx, uly = (int(x) for x in self.geo_to_pixel(bbox[0], bbox[3]))
         lrx, lry = (int(ceil(x)) for x in self.geo_to_pixel(bbox[2], bbox[1]))
 
         # Get rasterarray
-        band_array = self.source.GetRasterBand(1).ReadAsArray(ulx, uly,
-                                                              lrx - ulx + 1,
-                                                              lry - uly + 1)
+        if ulx >= 0 and uly >= 0 and lrx < self.xsize and lry < self.ysize:
+            band_array = self.read_window(ulx, uly, lrx - ulx + 1, lry - uly + 1)
+        else:
+            band_array = numpy.full((lry - uly + 1, lrx - ulx + 1), numpy.nan,
+                                    dtype=numpy.float32)
+            x0, y0 = max(ulx, 0), max(uly, 0)
+            x1, y1 = min(lrx + 1, self.xsize), min(lry + 1, self.ysize)
+            if x1 > x0 and y1 > y0:
+                window = self.read_window(x0, y0, x1 - x0, y1 - y0)
+                inside = band_array[y0 - uly:y1 - uly, x0 - ulx:x1 - ulx]
+                inside[:] = window
+                if self.nodata is not None:
+                    inside[window == self.nodata] = numpy.nan
 
         # compute true boundaries (after rounding) of raster array
         xmax, ymax = self.pixel_to_geo(ulx, uly)
@@ -127,6 +267,22 @@ class Dem:
 
         return band_array, xmin, ymin, xmax, ymax
 
+    def read_window(self, xoff, yoff, width, height):
+        """ Return the raster values of the given pixel window. Pixels
+            outside the raster are set to the nodata value.
+        """
+        raise NotImplementedError()
+
+    def _empty_window(self, width, height, dtype):
+        if self.nodata is not None:
+            fill = self.nodata
+        elif numpy.issubdtype(dtype, numpy.floating):
+            fill = numpy.nan
+        else:
+            fill = 0
+
+        return numpy.full((height, width), fill, dtype=dtype)
+
     def geo_to_pixel(self, x, y):
         g0, g1, g2, g3, g4, g5 = self.transform
 
@@ -154,52 +310,135 @@ class Dem:
         return xout, yout
 
 
+class Dem(DemBase):
+    """ A digital elevation model read with GDAL. The raster is read in
+        blocks that are aligned to the internal tiling of the file.
+        Decoded blocks are kept in an LRU cache of 'cache_size' bytes.
+        GDAL datasets must not be used concurrently, so reading blocks is
+        serialized between threads.
+    """
+
+    def __init__(self, src, cache_size=128 * 1024 * 1024):
+        if gdal is None:
+            raise RuntimeError("GDAL is needed for reading elevation model " + src)
+        self.source = gdal.Open(src)
+        self.transform = self.source.GetGeoTransform()
+        self.xsize = self.source.RasterXSize
+        self.ysize = self.source.RasterYSize
+        self.band = self.source.GetRasterBand(1)
+        self.nodata = self.band.GetNoDataValue()
+        self.blocks = LRUCache(cache_size, sizeof=lambda a: a.nbytes)
+        self.lock = threading.Lock()
+
+        # Combine small blocks and stripes to blocks of reasonable size.
+        bx, by = self.band.GetBlockSize()
+        if bx >= self.xsize:
+            by *= ceil(MIN_STRIPE_ROWS / by)
+        else:
+            bx *= ceil(MIN_BLOCK_EDGE / bx)
+            by *= ceil(MIN_BLOCK_EDGE / by)
+        self.block_size = (bx, by)
+
+    def read_window(self, xoff, yoff, width, height):
+        bx, by = self.block_size
+        xend = min(xoff + width, self.xsize)
+        yend = min(yoff + height, self.ysize)
+
+        if xend <= max(xoff, 0) or yend <= max(yoff, 0):
+            # window completely outside the raster
+            return self._empty_window(width, height, numpy.float64)
+
+        out = None
+        for row in range(max(yoff, 0) // by, (yend - 1) // by + 1):
+            for col in range(max(xoff, 0) // bx, (xend - 1) // bx + 1):
+                block = self.get_block(col, row)
+                if out is None:
+                    out = self._empty_window(width, height, block.dtype)
+                x0, y0 = max(col * bx, xoff), max(row * by, yoff)
+                x1, y1 = min(col * bx + block.shape[1], xend), min(row * by + block.shape[0], yend)
+                out[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff] = \
+                    block[y0 - row * by:y1 - row * by, x0 - col * bx:x1 - col * bx]
+
+        return out
+
+    def get_block(self, col, row):
+        """ Return the decoded raster block in the given column and row.
+        """
+        with self.lock:
+            block = self.blocks.get((col, row))
+            if block is None:
+                bx, by = self.block_size
+                block = self.band.ReadAsArray(col * bx, row * by,
+                                              min(bx, self.xsize - col * bx),
+                                              min(by, self.ysize - row * by))
+                block.flags.writeable = False
+                self.blocks.put((col, row), block)
+
+        return block
+
+
+class MappedDem(DemBase):
+    """ A digital elevation model in an uncompressed numpy array file,
+        which is memory-mapped. The geo transform and the nodata value
+        are read from a JSON file with the same name and the suffix
+        '.json'. Use wmt_api.convert_dem to create the files.
+
+        Windows within the raster are views into the mapped file, so
+        that no data is copied. Only windows that reach beyond the edge
+        of the raster need a copy. The operating system keeps the file in
+        the page cache, which is shared between all worker processes.
+    """
+
+    def __init__(self, src):
+        self.data = numpy.load(src, mmap_mode='r')
+        with open(str(Path(src).with_suffix('.json')), 'r', encoding='utf-8') as fd:
+            meta = json.load(fd)
+        self.transform = tuple(meta['transform'])
+        self.nodata = meta.get('nodata')
+        self.ysize, self.xsize = self.data.shape
+
+    def read_window(self, xoff, yoff, width, height):
+        if xoff >= 0 and yoff >= 0 and xoff + width <= self.xsize\
+           and yoff + height <= self.ysize:
+            return self.data[yoff:yoff + height, xoff:xoff + width]
+
+        out = self._empty_window(width, height, self.data.dtype)
+        x0, y0 = max(xoff, 0), max(yoff, 0)
+        x1, y1 = min(xoff + width, self.xsize), min(yoff + height, self.ysize)
+        if x1 > x0 and y1 > y0:
+            out[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff] = self.data[y0:y1, x0:x1]
+
+        return out
+
+
 class SegmentElevation:
     """ Collect and format the elevation profile for a single route.
     """
     MAX_DEVIATION = 5
 
-    def __init__(self, dem_file, bounds, max_segment_len=500):
+    def __init__(self, dem_file, bounds, max_segment_len=500,
+                 cache_size=128 * 1024 * 1024):
         self.max_segment_len = max_segment_len
         self.min_ele = None
         self.max_ele = None
         self.segments = {}
-        dem = Dem(str(dem_file.resolve()))
+        dem = open_dem(dem_file.resolve(), cache_size)
+        self.nodata = dem.nodata
         self.band_array, self.xmax, self.ymin, self.xmin, self.ymax = \
                                                     dem.raster_array(bounds)
 
+    def profile(self):
+        """ Return the profile. Segments without any elevation data are
+            left out. Minimum and maximum elevation are None, when there
+            is no data at all.
+        """
+        return {'min_elevation': None if self.min_ele is None else int(self.min_ele),
+                'max_elevation': None if self.max_ele is None else int(self.max_ele),
+                'segments': self.segments}
+
     def to_response(self, response):
-        response.status = 200
-        response.content_type = falcon.MEDIA_JSON
-        response.text = json.dumps({'min_elevation': int(self.min_ele),
-                                    'max_elevation': int(self.max_ele),
-                                    'segments': self.segments})
-
-
-    def _sum_and_filter(self, xs, ys, eles, step, total):
-        max_steps = int(self.max_segment_len/step)
-        start = None
-        start_ele = None
-
-        for i, x, y, ele in zip(range(len(xs)), xs, ys, eles):
-            ele = float(ele)
-            if ele < (self.min_ele or 10000):
-                self.min_ele = ele
-            if ele > (self.max_ele or -10000):
-                self.max_ele = ele
-
-            if start is None:
-                start = 0
-                start_ele = ele
-                yield x, y, start_ele, 0
-            else:
-                is_last = i == len(xs) - 1
-                if is_last or i >= start + max_steps or \
-                   numpy.max(numpy.abs(numpy.linspace(start_ele, ele, i - start + 1)
-                                        - eles[start:i + 1])) > self.MAX_DEVIATION:
-                    start = i
-                    start_ele = ele
-                    yield x, y, start_ele, total if is_last else i * step
+        elevation_profile_to_response(self.profile(), response)
+
 
     def add_segment(self, sid, x, y, length, step):
         """ Add a continuous piece of route to the elevation outout.
@@ -216,23 +455,44 @@ class SegmentElevation:
 
         # We need to convert these to (float) indicies
         #   (xi should range from 0 to (nx - 1), etc)
+        #   A raster with a single row or column has no extent.
         ny, nx = self.band_array.shape
-        xi = (nx - 1) * (xi - self.xmin) / (self.xmax - self.xmin)
-        yi = -(ny - 1) * (yi - self.ymax) / (self.ymax - self.ymin)
+        if self.xmax > self.xmin:
+            xi = (nx - 1) * (xi - self.xmin) / (self.xmax - self.xmin)
+        else:
+            xi = numpy.zeros_like(xi)
+        if self.ymax > self.ymin:
+            yi = -(ny - 1) * (yi - self.ymax) / (self.ymax - self.ymin)
+        else:
+            yi = numpy.zeros_like(yi)
 
         # Interpolate elevation values
         # map_coordinates does cubic interpolation by default, 
         # use "order=1" to preform bilinear interpolation
-        elev = smooth_and_fill_list(map_coordinates(self.band_array, [yi, xi], order=1))
-
-        elepoints = []
-        for x, y, ele, p in self._sum_and_filter(x, y, elev, step, length):
-            elepoints.append({'x': round(x, 2), 'y': round(y, 2),
-                              'ele': int(ele), 'pos': round(p, 2)})
-            if ele < (self.min_ele or 10000):
-                self.min_ele = ele
-            if ele > (self.max_ele or -10000):
-                self.max_ele = ele
-
-        self.segments[str(sid)] = {'elevation' : elepoints}
+        # Points interpolated from pixels without data are set to NaN
+        # and filled in from the neighbouring points.
+        elev = map_coordinates(self.band_array, [yi, xi], order=1,
+                               output=float, cval=numpy.nan)
+        if self.nodata is not None:
+            elev[_touches_value(self.band_array, yi, xi, self.nodata)] = numpy.nan
+        if numpy.isnan(elev).all():
+            # no elevation data for this segment
+            return
+        elev = smooth_and_fill_list(elev)
+
+        min_ele = float(elev.min())
+        max_ele = float(elev.max())
+        if self.min_ele is None or min_ele < self.min_ele:
+            self.min_ele = min_ele
+        if self.max_ele is None or max_ele > self.max_ele:
+            self.max_ele = max_ele
+
+        last = len(elev) - 1
+        keep = simplify_profile(elev, self.MAX_DEVIATION,
+                                int(self.max_segment_len/step))
+
+        self.segments[str(sid)] = {'elevation': [
+            {'x': round(x[i], 2), 'y': round(y[i], 2), 'ele': int(elev[i]),
+             'pos': round(length if i == last else i * step, 2) if i > 0 else 0}
+            for i in keep]}
 
@@ -2,32 +2,140 @@
 #
 # This file is part of the Waymarked Trails Map Project
 # Copyright (C) 2024 Sarah Hoffmann
+import falcon
 
+from ..common.errors import translate_db_errors
 from ..common.json_writer import JsonWriter
 
+# Number of database rows that are sent together in a streamed response.
+STREAM_CHUNK_SIZE = 500
+
 def to_geojson_response(objs, response):
-    out = JsonWriter().start_object()\
-                      .keyval('type', 'FeatureCollection')
+    """ Write a feature collection with the given database rows into
+        the response. Each row needs to have a 'geometry' column with
+        the geometry in GeoJSON format. An 'id' column is used as the
+        feature ID, all other columns are written out as properties.
+    """
+    features_to_geojson_response(((obj.geometry, obj._mapping) for obj in objs),
+                                 response)
+
+
+def features_to_geojson_response(features, response):
+    """ Write a feature collection into the response. 'features' must be
+        an iterable of pairs of a GeoJSON geometry string and a mapping
+        of feature properties in the form produced by database rows.
+    """
+    features_to_geojson(features).to_response(response)
+
+
+def features_to_geojson(features):
+    """ Render a feature collection with the given features and return
+        the JsonWriter with the result. See features_to_geojson_response()
+        for the format of 'features'.
+    """
+    out = _start_collection(JsonWriter())
+
+    for geometry, props in features:
+        _write_feature(out, geometry, props)
+
+    return out.end_array().end_object()
+
+
+async def stream_geojson_response(context, sql, response, statement_timeout=None,
+                                  chunk_size=STREAM_CHUNK_SIZE):
+    """ Stream a feature collection with the results of the given SQL
+        query into the response. The rows must be in the format described
+        in to_geojson_response().
+
+        The query is run on a separate connection using a server-side
+        cursor. Features are rendered and sent while the rows come in.
+        The connection is released once the response has been sent.
+        'statement_timeout' overwrites the configured default timeout.
+
+        The first rows are fetched before the response is started, so
+        that database errors and timeouts of the query still result in
+        a proper error response. Once the response has started, an error
+        can no longer be reported to the client. It then aborts the
+        connection instead of finishing the response, so that clients
+        see a failed transfer and not a truncated feature collection.
+    """
+    with translate_db_errors():
+        conn = await context.connect(read_only=True, statement_timeout=statement_timeout)
+        try:
+            result = await conn.stream(sql)
+            partitions = result.partitions(chunk_size)
+            first = await anext(partitions, None)
+        except BaseException:
+            await conn.close()
+            raise
+
+    response.status = 200
+    response.content_type = falcon.MEDIA_JSON
+    response.stream = GeoJSONStream(conn, first, partitions)
+
+
+class GeoJSONStream:
+    """ Asynchronous iterator over the chunks of a feature collection
+        rendered from a streamed database result. 'first' are the rows
+        already fetched, 'partitions' the iterator over the remaining ones.
+        Falcon calls close() when the response is finished or the request
+        was aborted.
+    """
+
+    def __init__(self, conn, first, partitions):
+        self.conn = conn
+        self.partitions = partitions
+        self.chunks = self._render(first, partitions)
+
+
+    def __aiter__(self):
+        return self.chunks
+
+
+    async def close(self):
+        try:
+            await self.chunks.aclose()
+            await self.partitions.aclose()
+        finally:
+            await self.conn.close()
+
+
+    @staticmethod
+    async def _render(first, partitions):
+        out = _start_collection(JsonWriter())
+
+        if first is not None:
+            for row in first:
+                _write_feature(out, row.geometry, row._mapping)
+            yield out.flush()
+
+            async for rows in partitions:
+                for row in rows:
+                    _write_feature(out, row.geometry, row._mapping)
+                yield out.flush()
+
+        yield out.end_array().end_object().as_bytes()
+
 
+def _start_collection(out):
+    out.start_object().keyval('type', 'FeatureCollection')
     out.key('crs').raw('{"type": "name", "properties": {"name": "EPSG:3857"}}').next()
-    out.key('features').start_array()
+    return out.key('features').start_array()
 
-    for obj in objs:
-        out.start_object()\
-           .keyval('type', 'Feature')\
-           .key('geometry').raw(obj.geometry).next()
 
-        if 'id' in obj._fields:
-            out.keyval('id', obj.id)
+def _write_feature(out, geometry, props):
+    out.start_object()\
+       .keyval('type', 'Feature')\
+       .key('geometry').raw(geometry).next()
 
-        if len(obj._fields) > 2:
-            out.key('properties').start_object()
-            for k, v in obj._mapping.items():
-                if k not in ('id', 'geometry'):
-                    out.keyval(k, v)
-            out.end_object()
+    if 'id' in props:
+        out.keyval('id', props['id'])
 
-        out.end_object().next()
+    if len(props) > 2:
+        out.key('properties').start_object()
+        for k, v in props.items():
+            if k not in ('id', 'geometry'):
+                out.keyval(k, v)
+        out.end_object()
 
-    out.end_array().end_object()
-    out.to_response(response)
+    out.end_object().next()
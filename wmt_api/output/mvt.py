@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Helper functions for creating Mapbox vector tiles with PostGIS.
+"""
+import sqlalchemy as sa
+
+MEDIA_MVT = 'application/vnd.mapbox-vector-tile'
+
+# Extent and buffer size of the tile in tile coordinates
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+
+def mvt_geometry(geom, bbox):
+    """ Return an SQL expression that transforms the given geometry column
+        into tile coordinates of the tile with the given bounding box.
+        The geometry is clipped to the tile including the buffer.
+    """
+    return sa.func.ST_AsMVTGeom(geom, sa.func.Box2D(bbox.as_sql()),
+                                MVT_EXTENT, MVT_BUFFER, True)
+
+
+def mvt_property(column):
+    """ Return an SQL expression that makes the given column usable as
+        a feature property in a vector tile. Vector tiles only support
+        scalar values, so arrays are encoded as JSON strings, the same
+        way they would appear in the GeoJSON output.
+    """
+    return sa.cast(sa.func.to_json(column), sa.Text)
+
+
+def mvt_layer(name, sql):
+    """ Return an SQL statement that renders a single vector tile layer
+        from the rows of the given select statement. The statement must
+        contain a column 'geom' with the geometry in tile coordinates
+        as created by mvt_geometry(). All other columns are added as
+        feature properties.
+    """
+    rows = sql.subquery(f'mvt_{name}')
+
+    return sa.select(sa.func.ST_AsMVT(sa.literal_column(rows.name), name,
+                                      MVT_EXTENT, 'geom'))\
+             .select_from(rows)\
+             .where(rows.c.geom.is_not(None))
+
@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Output of multiple symbols in a single response.
+"""
+import re
+import xml.etree.ElementTree as ET
+
+from ..common.json_writer import JsonWriter
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', XLINK_NS)
+
+HREF_ATTRIBUTES = ('href', f'{{{XLINK_NS}}}href')
+
+# Size of the absolute units in pixels. Relative units like '%' or 'em'
+# cannot be resolved and the size is taken from the viewBox instead.
+UNITS = {'': 1.0, 'px': 1.0, 'pt': 4 / 3, 'pc': 16.0,
+         'mm': 96 / 25.4, 'cm': 96 / 2.54, 'in': 96.0}
+
+LENGTH = re.compile(r'\s*([-+0-9.eE]+)\s*([a-zA-Z%]*)\s*$')
+URL_REFERENCE = re.compile(r'url\(\s*([\'"]?)#([^\'")\s]+)\1\s*\)')
+
+
+def symbols_to_json(symbols):
+    """ Return a JSON object mapping symbol IDs to SVG strings.
+        'symbols' is a list of pairs of ID and SVG bytes. The SVG is
+        None for unknown symbols.
+    """
+    out = JsonWriter().start_object()
+    for name, svg in symbols:
+        out.keyval(name, None if svg is None else svg.decode('utf-8'))
+    return out.end_object().as_bytes()
+
+
+def symbols_to_sprite(symbols):
+    """ Stack the given symbols vertically into a single SVG image.
+        Returns the SVG and a JSON object with the position and size
+        of each symbol in the image. Unknown symbols and symbols that
+        are not valid SVG or have no size are left out.
+        See symbols_to_json() for the format of 'symbols'.
+    """
+    parts = []
+    index = JsonWriter().start_object()
+    offset = 0.0
+    max_width = 0.0
+
+    for name, svg in symbols:
+        if svg is None:
+            continue
+        try:
+            root = ET.fromstring(svg)
+        except ET.ParseError:
+            continue
+        size = _svg_size(root)
+        if size is None:
+            continue
+        width, height = size
+
+        # IDs must be unique in the sprite. Cairo uses the same IDs
+        # like 'surface1' or 'glyph0-1' for every image.
+        _prefix_ids(root, f's{len(parts)}-')
+        # Nested SVGs without an explicit size would fill the complete sprite.
+        root.set('x', '0')
+        root.set('y', _fmt(offset))
+        root.set('width', _fmt(width))
+        root.set('height', _fmt(height))
+        parts.append(ET.tostring(root, encoding='utf-8'))
+
+        index.key(name).start_object()\
+             .keyval('x', 0)\
+             .keyval('y', offset)\
+             .keyval('width', width)\
+             .keyval('height', height)\
+             .end_object().next()
+
+        offset = round(offset + height, 2)
+        max_width = max(max_width, width)
+
+    sprite = b'<svg xmlns="http://www.w3.org/2000/svg" width="%s" height="%s">%s</svg>'\
+             % (_fmt(max_width).encode('ascii'), _fmt(offset).encode('ascii'), b''.join(parts))
+
+    return sprite, index.end_object().as_bytes()
+
+
+def _svg_size(root):
+    """ Return the width and height in pixels of the SVG with the given
+        root element or None, if the size cannot be determined.
+    """
+    width = _length(root.get('width'))
+    height = _length(root.get('height'))
+
+    if width is None or height is None:
+        viewbox = _viewbox_size(root.get('viewBox'))
+        if viewbox is None:
+            return None
+        if width is not None:
+            height = width * viewbox[1] / viewbox[0]
+        elif height is not None:
+            width = height * viewbox[0] / viewbox[1]
+        else:
+            width, height = viewbox
+
+    return round(width, 2), round(height, 2)
+
+
+def _length(value):
+    if value is None:
+        return None
+
+    match = LENGTH.match(value)
+    if match is None or match[2].lower() not in UNITS:
+        return None
+
+    try:
+        return float(match[1]) * UNITS[match[2].lower()]
+    except ValueError:
+        return None
+
+
+def _viewbox_size(value):
+    try:
+        _, _, width, height = (float(v) for v in (value or '').replace(',', ' ').split())
+    except ValueError:
+        return None
+
+    return (width, height) if width > 0 and height > 0 else None
+
+
+def _prefix_ids(root, prefix):
+    """ Add the prefix to all IDs in the SVG and to the references to them.
+    """
+    ids = {el.get('id') for el in root.iter() if el.get('id') is not None}
+    if not ids:
+        return
+
+    def _replace(match):
+        if match[2] not in ids:
+            return match[0]
+        return f'url({match[1]}#{prefix}{match[2]}{match[1]})'
+
+    for el in root.iter():
+        for key, value in el.items():
+            if key == 'id':
+                el.set(key, prefix + value)
+            elif key in HREF_ATTRIBUTES:
+                if value.startswith('#') and value[1:] in ids:
+                    el.set(key, '#' + prefix + value[1:])
+            elif 'url(' in value:
+                el.set(key, URL_REFERENCE.sub(_replace, value))
+        if el.tag == f'{{{SVG_NS}}}style' and el.text and 'url(' in el.text:
+            el.text = URL_REFERENCE.sub(_replace, el.text)
+
+
+def _fmt(num):
+    return f'{num:.10g}'
@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Feature sets of vector tiles that can be cut into smaller tiles.
+"""
+from math import floor, log10
+
+import numpy
+import shapely
+
+from .geojson import features_to_geojson
+
+# Geometry types that may appear in a tile: points and lines
+_TILE_GEOMETRY_TYPES = [int(t) for t in (shapely.GeometryType.POINT,
+                                          shapely.GeometryType.LINESTRING,
+                                          shapely.GeometryType.MULTIPOINT,
+                                          shapely.GeometryType.MULTILINESTRING)]
+
+# Number of decimal digits and of significant digits in coordinates written
+# by ST_AsGeoJSON() with its default settings.
+_GEOJSON_DECIMALS = 9
+_GEOJSON_MAX_DIGITS = 17
+
+
+class TileFeatures:
+    """ Features of a tile with the geometries kept as shapely objects.
+
+        The properties of each feature are kept in the form of the
+        database row mapping they originate from, so that the GeoJSON output
+        is the same as the one produced by to_geojson_response().
+    """
+
+    def __init__(self, geoms, properties, srid=3857):
+        self.geoms = geoms
+        self.properties = properties
+        self.srid = srid
+
+
+    @staticmethod
+    def from_rows(rows, srid=3857):
+        """ Create a feature set from database rows. The geometry
+            must be in a column 'geometry' in WKB format and in the
+            projection 'srid'.
+        """
+        wkbs = []
+        properties = []
+        for row in rows:
+            wkbs.append(row.geometry)
+            props = dict(row._mapping)
+            props['geometry'] = None
+            properties.append(props)
+
+        return TileFeatures(shapely.from_wkb(wkbs), properties, srid)
+
+
+    def __len__(self):
+        return len(self.properties)
+
+
+    def memory_size(self):
+        """ Return the approximate memory used by the geometries in bytes.
+        """
+        return int(shapely.get_num_coordinates(self.geoms).sum()) * 16 \
+               + len(self.properties) * 200
+
+
+    def clip(self, bbox):
+        """ Return a new feature set with all features clipped to the
+            given bounding box. Features that are not inside the box
+            or only touch it with a lower-dimensional geometry are removed.
+        """
+        clipped = shapely.clip_by_rect(self.geoms, bbox.minx, bbox.miny,
+                                       bbox.maxx, bbox.maxy)
+
+        keep = ~shapely.is_empty(clipped)\
+               & (shapely.get_dimensions(clipped) == shapely.get_dimensions(self.geoms))\
+               & numpy.isin(shapely.get_type_id(clipped), _TILE_GEOMETRY_TYPES)
+
+        return TileFeatures(clipped[keep],
+                            [p for p, k in zip(self.properties, keep) if k],
+                            self.srid)
+
+
+    def to_geojson(self):
+        """ Render the features as a GeoJSON feature collection and
+            return the JsonWriter with the result.
+        """
+        return features_to_geojson((geometry_to_geojson(g, self.srid), p)
+                                   for g, p in zip(self.geoms, self.properties))
+
+
+def geometry_to_geojson(geom, srid):
+    """ Return the GeoJSON of a point or line geometry in the format
+        of ST_AsGeoJSON() with its default options: the CRS is included
+        unless it is EPSG:4326, coordinates are rounded to 9 decimal digits
+        and written without trailing zeros.
+    """
+    out = ['{"type":"', geom.geom_type, '"']
+    if srid != 4326:
+        out.append(f',"crs":{{"type":"name","properties":{{"name":"EPSG:{srid}"}}}}')
+    out.append(',"coordinates":')
+
+    if geom.geom_type == 'Point':
+        out.append(_geojson_coordinates(geom)[1:-1])
+    elif geom.geom_type == 'MultiLineString':
+        out.append('[')
+        out.append(','.join(_geojson_coordinates(g) for g in geom.geoms))
+        out.append(']')
+    else:
+        out.append(_geojson_coordinates(geom))
+    out.append('}')
+
+    return ''.join(out)
+
+
+def _geojson_coordinates(geom):
+    return '[' + ','.join(f'[{_geojson_number(x)},{_geojson_number(y)}]'
+                          for x, y in shapely.get_coordinates(geom).tolist()) + ']'
+
+
+def _geojson_number(num):
+    absnum = abs(num)
+    if absnum <= 1e-12:
+        return '0'
+
+    decimals = _GEOJSON_DECIMALS
+    if absnum >= 1:
+        decimals = min(decimals, _GEOJSON_MAX_DIGITS - (floor(log10(absnum)) + 1))
+
+    out = f'{num:.{max(decimals, 0)}f}'
+    if '.' in out:
+        out = out.rstrip('0').rstrip('.')
+
+    return out
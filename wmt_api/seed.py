@@ -0,0 +1,244 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# This file is part of the Waymarked Trails Map Project
+# Copyright (C) 2025 Sarah Hoffmann
+"""
+Pre-render tiles of an area into an MBTiles file.
+
+Usage: python -m wmt_api.seed [options] <map name>
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import logging
+import math
+import sys
+import time
+from pathlib import Path
+
+import sqlalchemy as sa
+
+from .common.context import Context
+from .common.mbtiles import MBTiles
+from .common.tile_cache import DataVersion, TileCache, MBTILES_FORMATS
+from .common.types import Bbox, MAPWIDTH, MIN_TILE_ZOOM, MAX_TILE_ZOOM
+
+log = logging.getLogger(__name__)
+
+# Number of tiles to save to the MBTiles file in one transaction
+WRITE_BATCH_SIZE = 100
+# Number of tiles to look up in the MBTiles file at once
+CHECK_BATCH_SIZE = 1000
+# Interval in seconds in which progress is reported
+REPORT_INTERVAL = 10
+
+
+def bbox_from_lonlat(minlon, minlat, maxlon, maxlat):
+    """ Create a bounding box in EPSG:3857 from WGS84 coordinates.
+    """
+    def _y(lat):
+        lat = max(-85.0511, min(85.0511, lat))
+        return math.log(math.tan((90 + lat) * math.pi / 360)) * MAPWIDTH / math.pi
+
+    return Bbox(minlon * MAPWIDTH / 180, _y(minlat), maxlon * MAPWIDTH / 180, _y(maxlat))
+
+
+async def get_country_bbox(context, country):
+    """ Return the bounding box over all routes in the given country.
+    """
+    r = context.db.tables.routes.data
+    if 'country' not in r.c:
+        raise RuntimeError(f"Map '{context.mapname}' has no country information.")
+
+    extent = sa.select(sa.func.ST_Extent(r.c.geom).label('ext'))\
+               .where(r.c.country == country.lower())\
+               .subquery()
+
+    async with context.engine.begin() as conn:
+        row = (await conn.execute(sa.select(sa.func.ST_XMin(extent.c.ext).label('minx'),
+                                            sa.func.ST_YMin(extent.c.ext).label('miny'),
+                                            sa.func.ST_XMax(extent.c.ext).label('maxx'),
+                                            sa.func.ST_YMax(extent.c.ext).label('maxy'))))\
+                .first()
+
+    if row is None or row.minx is None:
+        raise RuntimeError(f"No routes found for country '{country}'.")
+
+    return Bbox(row.minx, row.miny, row.maxx, row.maxy)
+
+
+def _check_workers(workers):
+    """ Raise the error of the first worker task that has failed.
+    """
+    for worker in workers:
+        if worker.done():
+            worker.result()
+
+
+class Seeder:
+    """ Renders a list of tiles with a given number of parallel
+        database connections and saves them in an MBTiles file.
+    """
+
+    def __init__(self, api, store, fmt, version):
+        self.api = api
+        self.store = store
+        self.fmt = fmt
+        self.version = version
+        self.done = 0
+        self.skipped = 0
+        self.pending = []
+        self.start = None
+
+
+    async def run(self, tiles, jobs):
+        self.start = time.monotonic()
+        queue = asyncio.Queue(maxsize=jobs * 4)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(jobs)]
+        reporter = asyncio.create_task(self._reporter())
+
+        try:
+            tiles = iter(tiles)
+            while batch := list(itertools.islice(tiles, CHECK_BATCH_SIZE)):
+                missing = set(await asyncio.to_thread(self.store.missing, self.version,
+                                                      [(t.zoom, t.x, t.y) for t in batch]))
+                for tile in batch:
+                    if (tile.zoom, tile.x, tile.y) in missing:
+                        await self._put(queue, tile, workers)
+                    else:
+                        self.skipped += 1
+
+            for _ in workers:
+                await self._put(queue, None, workers)
+
+            await asyncio.gather(*workers)
+        finally:
+            reporter.cancel()
+            for worker in workers:
+                worker.cancel()
+
+        await self._flush()
+        self._report()
+
+
+    async def _put(self, queue, item, workers):
+        """ Add the item to the queue. Raises the error of a worker, when
+            one has died, so that seeding does not wait forever for a
+            free place in the queue.
+        """
+        if not queue.full():
+            queue.put_nowait(item)
+        else:
+            put = asyncio.ensure_future(queue.put(item))
+            try:
+                while not put.done():
+                    await asyncio.wait([put, *(w for w in workers if not w.done())],
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    _check_workers(workers)
+            finally:
+                put.cancel()
+
+        _check_workers(workers)
+
+
+    async def _worker(self, queue):
+        while (tile := await queue.get()) is not None:
+            self.pending.append((tile.zoom, tile.x, tile.y,
+                                 await self.api.render_tile(tile, self.fmt)))
+            self.done += 1
+            if len(self.pending) >= WRITE_BATCH_SIZE:
+                await self._flush()
+
+
+    async def _flush(self):
+        tiles, self.pending = self.pending, []
+        if tiles and not await asyncio.to_thread(self.store.put, self.version, tiles):
+            raise RuntimeError("MBTiles file contains newer data. Seeding aborted.")
+
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            self._report()
+
+
+    def _report(self):
+        duration = time.monotonic() - self.start
+        log.info("%d tiles rendered (%.1f tiles/s), %d tiles already done.",
+                 self.done, self.done / duration if duration > 0 else 0, self.skipped)
+
+
+async def seed(args):
+    context = Context(args.mapname)
+
+    try:
+        if args.country:
+            bbox = await get_country_bbox(context, args.country)
+        else:
+            try:
+                bbox = bbox_from_lonlat(*(float(c) for c in args.bbox.split(',')))
+            except (TypeError, ValueError):
+                raise RuntimeError("Bounding box needs four comma-separated numbers.")
+
+        version = await DataVersion(context).get()
+        if version is None:
+            raise RuntimeError("Database has no update date. Is the database set up?")
+
+        if args.output:
+            store = await asyncio.to_thread(MBTiles, Path(args.output), context.mapname,
+                                            MBTILES_FORMATS[args.format])
+        else:
+            store = await TileCache(context).get_store(args.format)
+            if store is None:
+                raise RuntimeError("No output file given and no TILE_CACHE_DIR configured.")
+
+        map_type = importlib.import_module(f'wmt_api.api.{context.config.MAPTYPE}')
+        api = map_type.APITiles(context)
+
+        log.info("Seeding zoom %d tiles for version %s.", args.zoom, version)
+        await Seeder(api, store, args.format, version).run(bbox.tiles(args.zoom), args.jobs)
+
+        store.close()
+    finally:
+        await context.dispose()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='python -m wmt_api.seed',
+                                     description=__doc__.strip().split('\n')[0])
+    parser.add_argument('mapname', help='Name of the map to create tiles for, e.g. hiking')
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument('--bbox', help='Area to render as minlon,minlat,maxlon,maxlat')
+    area.add_argument('--country',
+                      help='Render the area covered by the routes of the given country code')
+    parser.add_argument('--zoom', type=int, default=12,
+                        choices=range(MIN_TILE_ZOOM, MAX_TILE_ZOOM + 1),
+                        help='Zoom level of the tiles (default: 12)')
+    parser.add_argument('--format', default='json', choices=MBTILES_FORMATS.keys(),
+                        help='Format of the tiles (default: json)')
+    parser.add_argument('--output',
+                        help='MBTiles file to write to. Defaults to the file of the'
+                             ' tile cache, when TILE_CACHE_DIR is configured.')
+    parser.add_argument('-j', '--jobs', type=int, default=4,
+                        help='Number of parallel database connections (default: 4)')
+
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    args = get_parser().parse_args(argv)
+
+    try:
+        asyncio.run(seed(args))
+    except RuntimeError as exc:
+        log.error("%s", exc)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())